@@ -9,8 +9,12 @@ from app.schemas import (
     TokenRefreshResponse,
     Setup2FAResponse,
     Verify2FARequest,
+    ChangePasswordRequest,
 )
 from app.services import AuthService
+from app.core.rate_limit import rate_limit
+from app.core.token_cache import CurrentUser
+from app.api.deps import get_current_user
 
 router = APIRouter()
 
@@ -34,7 +38,7 @@ async def check_init_status(db: Session = Depends(get_db)):
     return InitStatusResponse(initialized=True, message="系统已初始化")
 
 
-@router.post("/register", response_model=LoginResponse)
+@router.post("/register", response_model=LoginResponse, dependencies=[Depends(rate_limit())])
 async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     """注册用户（仅当系统未初始化时可用）"""
     # 检查是否已有用户
@@ -60,7 +64,7 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     
     # 创建用户
     auth_service = AuthService(db)
-    auth_service.create_user(request.username, request.password)
+    await auth_service.create_user(request.username, request.password)
     
     # 返回需要设置 2FA
     return LoginResponse(
@@ -70,11 +74,11 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     )
 
 
-@router.post("/login", response_model=LoginResponse)
+@router.post("/login", response_model=LoginResponse, dependencies=[Depends(rate_limit("login"))])
 async def login(request: LoginRequest, db: Session = Depends(get_db)):
     """用户登录"""
     auth_service = AuthService(db)
-    result = auth_service.login(request.username, request.password, request.totp_code)
+    result = await auth_service.login(request.username, request.password, request.totp_code)
     
     if "error" in result:
         raise HTTPException(
@@ -102,11 +106,11 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
     )
 
 
-@router.post("/setup-2fa", response_model=Setup2FAResponse)
+@router.post("/setup-2fa", response_model=Setup2FAResponse, dependencies=[Depends(rate_limit("login"))])
 async def setup_2fa(request: LoginRequest, db: Session = Depends(get_db)):
     """设置 2FA (需要先验证用户名密码)"""
     auth_service = AuthService(db)
-    user = auth_service.authenticate(request.username, request.password)
+    user = await auth_service.authenticate(request.username, request.password)
     
     if not user:
         raise HTTPException(
@@ -114,18 +118,18 @@ async def setup_2fa(request: LoginRequest, db: Session = Depends(get_db)):
             detail="用户名或密码错误"
         )
     
-    secret, qr_code = auth_service.setup_2fa(user.id)
+    secret, qr_code = await auth_service.setup_2fa(user.id)
     return Setup2FAResponse(secret=secret, qr_code=qr_code)
 
 
-@router.post("/verify-2fa", response_model=LoginResponse)
+@router.post("/verify-2fa", response_model=LoginResponse, dependencies=[Depends(rate_limit("login"))])
 async def verify_2fa(
     request: LoginRequest,
     db: Session = Depends(get_db)
 ):
     """验证并启用 2FA"""
     auth_service = AuthService(db)
-    user = auth_service.authenticate(request.username, request.password)
+    user = await auth_service.authenticate(request.username, request.password)
     
     if not user:
         raise HTTPException(
@@ -145,15 +149,15 @@ async def verify_2fa(
             detail="验证码错误"
         )
     
-    # 启用成功，返回令牌
-    result = auth_service.login(request.username, request.password, request.totp_code)
+    # 启用成功，直接签发令牌 (密码与验证码均已校验，无需再走登录流程)
+    result = auth_service.issue_tokens(user)
     return LoginResponse(
         access_token=result["access_token"],
         refresh_token=result["refresh_token"]
     )
 
 
-@router.post("/refresh", response_model=TokenRefreshResponse)
+@router.post("/refresh", response_model=TokenRefreshResponse, dependencies=[Depends(rate_limit())])
 async def refresh_token(request: TokenRefreshRequest, db: Session = Depends(get_db)):
     """刷新访问令牌"""
     auth_service = AuthService(db)
@@ -168,7 +172,42 @@ async def refresh_token(request: TokenRefreshRequest, db: Session = Depends(get_
     return TokenRefreshResponse(access_token=new_token)
 
 
-@router.post("/verify-totp")
+@router.post("/logout")
+async def logout(user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """登出 (使已签发的访问令牌和刷新令牌全部失效)"""
+    if user:
+        AuthService(db).revoke_tokens(user.id)
+    return {"success": True}
+
+
+@router.post("/change-password", response_model=LoginResponse, dependencies=[Depends(rate_limit("login"))])
+async def change_password(
+    request: ChangePasswordRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """修改密码 (其他会话的令牌失效，返回当前会话的新令牌)"""
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="认证未启用"
+        )
+    
+    auth_service = AuthService(db)
+    result = await auth_service.change_password(user.id, request.old_password, request.new_password)
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="原密码错误"
+        )
+    
+    return LoginResponse(
+        access_token=result["access_token"],
+        refresh_token=result["refresh_token"]
+    )
+
+
+@router.post("/verify-totp", dependencies=[Depends(rate_limit("totp"))])
 async def verify_totp(request: Verify2FARequest, db: Session = Depends(get_db)):
     """验证 TOTP 验证码 (用于解锁屏幕)"""
     auth_service = AuthService(db)
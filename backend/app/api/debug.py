@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from app.core.config import settings
+from app.core.profiler import verify_profiler_token, list_profiles, get_profile
+
+router = APIRouter()
+
+
+def _require_profiler_token(token: Optional[str]) -> None:
+    """剖析结果仅对持有管理员令牌的请求开放"""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="剖析未启用")
+    if not verify_profiler_token(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无效的剖析令牌")
+
+
+@router.get("/profiles")
+async def get_profiles(x_profile_token: Optional[str] = Header(None)):
+    """列出最近的请求剖析"""
+    _require_profiler_token(x_profile_token)
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile_detail(profile_id: int, x_profile_token: Optional[str] = Header(None)):
+    """获取请求剖析详情 (调用统计与 SQL 语句)"""
+    _require_profiler_token(x_profile_token)
+    profile = get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="剖析记录不存在")
+    return profile
@@ -1,27 +1,64 @@
+import hmac
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.models import get_db, User
+from app.core.config import settings
 from app.core.security import verify_token
-from app.services import AuthService
+from app.core.token_cache import CurrentUser, token_cache
 from typing import Optional
 
 security = HTTPBearer(auto_error=False)
 
 
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
-) -> Optional[User]:
-    """获取当前认证用户 - 开发模式跳过认证"""
-    # 开发模式：跳过认证
-    return None
-    
-    # 生产模式代码（暂时注释）
-    # token = credentials.credentials
-    # payload = verify_token(token, token_type="access")
-    # if not payload:
-    #     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="无效的认证令牌")
-    # user_id = int(payload.get("sub"))
-    # auth_service = AuthService(db)
-    # return auth_service.get_user_by_id(user_id)
+) -> Optional[CurrentUser]:
+    """获取当前认证用户 (已验证的令牌命中缓存时不解码 JWT、不查询数据库)"""
+    # 关闭认证 (仅用于本地开发)
+    if not settings.AUTH_ENABLED:
+        return None
+
+    if not credentials:
+        raise _unauthorized("未提供认证令牌")
+
+    token = credentials.credentials
+    user = token_cache.get(token)
+    if user:
+        return user
+
+    payload = verify_token(token, token_type="access")
+    if not payload:
+        raise _unauthorized("无效的认证令牌")
+
+    db_user = db.get(User, int(payload.get("sub")))
+    # 登出或修改密码后，之前签发的令牌版本失效
+    if not db_user or payload.get("ver", 0) != db_user.token_version:
+        raise _unauthorized("无效的认证令牌")
+
+    user = CurrentUser(id=db_user.id, username=db_user.username, token_version=db_user.token_version)
+    token_cache.put(token, user, payload["exp"])
+    return user
+
+
+async def require_metrics_access(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: Session = Depends(get_db)
+) -> None:
+    """指标访问控制: 设置 METRICS_TOKEN 时校验该令牌，否则与其他接口一样需要登录"""
+    if settings.METRICS_TOKEN:
+        supplied = credentials.credentials if credentials else ""
+        if not hmac.compare_digest(supplied.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8")):
+            raise _unauthorized("无效的指标令牌")
+        return
+    await get_current_user(credentials, db)
@@ -1,25 +1,135 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import Response, StreamingResponse
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Query, UploadFile, status
+from fastapi import File as UploadField
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from app.models import get_db, User
+from app.models import get_db, SessionLocal
 from app.schemas import (
     FileCreate,
     FileUpdate,
     FileResponse,
     FileListResponse,
     FileSaveRequest,
+    FileChangeResponse,
+    FileChangesResponse,
+    FolderListResponse,
+    FolderMoveRequest,
+    FileBatchGetRequest,
+    FileBatchRequest,
+    FileBatchResult,
+    FileBatchResponse,
+    BackupResponse,
 )
-from app.services import FileService
+from app.services import ExportService, FileService, ImportService
+from app.core.token_cache import CurrentUser
 from app.api.deps import get_current_user
+import asyncio
+import codecs
 import json
-import zipfile
-import io
 from datetime import datetime
 
 router = APIRouter()
 
+# 超过该大小的文件以流式 JSON 返回，避免整体解密、解码和序列化
+STREAM_CONTENT_THRESHOLD = 1024 * 1024
+STREAM_WRITE_SIZE = 256 * 1024
+
+# 增量同步每次返回的最大变更数
+CHANGES_PAGE_SIZE = 500
+# SSE 检查新变更的间隔与空闲心跳间隔 (秒)；轮询数据库，多 worker 时同样能收到其他进程的变更
+CHANGES_POLL_SECONDS = 1.0
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def stream_file_response(file_service: FileService, file) -> StreamingResponse:
+    """以流式 JSON 返回文件详情 (字段与 FileResponse 一致)
+
+    内容逐个分块解密、增量解码并转义后直接写入响应，
+    峰值内存约为一个分块的大小，而不是文件大小的数倍。
+    """
+    meta = FileResponse(
+        id=file.id,
+        name=file.name,
+        path=file.path,
+        content="",
+        language=file.language,
+        encoding=file.encoding,
+        is_deleted=file.is_deleted,
+        created_at=file.created_at,
+        updated_at=file.updated_at
+    ).model_dump(mode="json", exclude={"content"})
+    
+    def generate():
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        parts = [b'{"content":"']
+        pending = 0
+        for chunk in file_service.iter_file_content(file):
+            text = decoder.decode(chunk)
+            if text:
+                part = json.dumps(text, ensure_ascii=False)[1:-1].encode("utf-8")
+                parts.append(part)
+                pending += len(part)
+            # 合并为较大的写入，减少线程切换次数
+            if pending >= STREAM_WRITE_SIZE:
+                yield b"".join(parts)
+                parts = []
+                pending = 0
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            parts.append(json.dumps(tail, ensure_ascii=False)[1:-1].encode("utf-8"))
+        parts.append(b'",' + json.dumps(meta, ensure_ascii=False)[1:].encode("utf-8"))
+        yield b"".join(parts)
+    
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+def file_detail_response(file_service: FileService, file):
+    """文件详情 (含内容)，大文件以流式 JSON 返回"""
+    if (file.content_size or 0) >= STREAM_CONTENT_THRESHOLD:
+        return stream_file_response(file_service, file)
+    
+    return FileResponse(
+        id=file.id,
+        name=file.name,
+        path=file.path,
+        content=file_service.get_file_content(file),
+        language=file.language,
+        encoding=file.encoding,
+        is_deleted=file.is_deleted,
+        created_at=file.created_at,
+        updated_at=file.updated_at
+    )
+
+
+def changes_page(file_service: FileService, since: int, limit: int) -> FileChangesResponse:
+    """since 之后的变更及文件当前的元信息
+
+    since 超过最新序号 (例如数据库从备份恢复) 时从头返回，并标记 reset，客户端应清空本地列表。
+    """
+    reset = since > file_service.get_change_seq()
+    if reset:
+        since = 0
+    
+    changes = file_service.get_changes(since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    files = file_service.get_file_metadata([change.file_id for change in changes])
+    return FileChangesResponse(
+        seq=changes[-1].seq if changes else since,
+        has_more=has_more,
+        reset=reset,
+        changes=[
+            FileChangeResponse(
+                seq=change.seq,
+                file_id=change.file_id,
+                operation=change.operation,
+                file=files.get(change.file_id)
+            )
+            for change in changes
+        ]
+    )
+
 
 class ReorderRequest(BaseModel):
     file_ids: List[int]  # 按顺序排列的文件 ID 列表
@@ -28,7 +138,7 @@ class ReorderRequest(BaseModel):
 @router.get("", response_model=List[FileListResponse])
 async def list_files(
     include_deleted: bool = False,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """列出所有文件"""
@@ -37,10 +147,95 @@ async def list_files(
     return files
 
 
+@router.get("/changes", response_model=FileChangesResponse)
+async def get_changes(
+    since: int = 0,
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=CHANGES_PAGE_SIZE),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """增量同步: 返回 seq 大于 since 的文件变更 (每个文件只包含最新状态)
+
+    since=0 返回全部文件 (含回收站)；has_more 为 true 时以返回的 seq 继续请求。
+    """
+    return changes_page(FileService(db), since, limit)
+
+
+@router.get("/changes/events")
+async def stream_changes(
+    since: int = 0,
+    last_event_id: Optional[str] = Header(None),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """以 SSE 推送文件变更，事件数据与 /files/changes 的响应相同"""
+    # 断线重连时从最后收到的序号继续
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    async def events():
+        position = since
+        idle = 0.0
+        while True:
+            # 每次检查使用短会话，不在整个连接期间占用数据库连接
+            db = SessionLocal()
+            try:
+                page = changes_page(FileService(db), position, CHANGES_PAGE_SIZE)
+            finally:
+                db.close()
+            if page.changes or page.reset:
+                yield f"id: {page.seq}\nevent: changes\ndata: {page.model_dump_json()}\n\n"
+                position = page.seq
+                idle = 0.0
+                if page.has_more:
+                    continue
+            elif idle >= SSE_HEARTBEAT_SECONDS:
+                yield ": ping\n\n"
+                idle = 0.0
+            await asyncio.sleep(CHANGES_POLL_SECONDS)
+            idle += CHANGES_POLL_SECONDS
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/folders", response_model=FolderListResponse)
+async def list_folder(
+    path: str = "/",
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """列出文件夹 (虚拟路径的前缀): 子文件夹及其子树的文件数与大小、直接位于其下的文件"""
+    file_service = FileService(db)
+    return file_service.list_folder(path)
+
+
+@router.post("/folders/move")
+async def move_folder(
+    request: FolderMoveRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """移动/重命名文件夹 (子树中的所有文件在一条 UPDATE 中改写路径)"""
+    file_service = FileService(db)
+    
+    try:
+        moved = file_service.move_folder(request.from_path, request.to_path)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return {"moved": moved}
+
+
 @router.post("/reorder")
 async def reorder_files(
     request: ReorderRequest,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """重新排序文件"""
@@ -49,9 +244,69 @@ async def reorder_files(
     return {"message": "排序成功"}
 
 
+@router.post("/batch", response_model=FileBatchResponse)
+async def batch_files(
+    request: FileBatchRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量操作 (多选删除、恢复、永久删除、移动/重命名、修改语言)
+
+    所有操作在一个事务中执行，逐项返回结果；不存在的文件只使对应项失败。
+    """
+    file_service = FileService(db)
+    errors = file_service.apply_batch(request.operations)
+    results = [
+        FileBatchResult(op=operation.op, file_id=operation.file_id, ok=error is None, error=error)
+        for operation, error in zip(request.operations, errors)
+    ]
+    failed = sum(1 for result in results if not result.ok)
+    return FileBatchResponse(succeeded=len(results) - failed, failed=failed, results=results)
+
+
+@router.post("/batch-get")
+async def batch_get_files(
+    request: FileBatchGetRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量获取文件详情 (恢复编辑会话时一次取回所有标签页)
+
+    文件与分块各通过一次查询读取，分块在线程池中并行解密，按请求顺序以流式 JSON 返回:
+    {"files": [FileResponse, ...], "missing": [不存在或已删除的文件 ID]}
+    """
+    file_service = FileService(db)
+    found = {file.id: file for file in file_service.get_files(request.file_ids)}
+    order = list(dict.fromkeys(request.file_ids))
+    files = [found[file_id] for file_id in order if file_id in found]
+    missing = [file_id for file_id in order if file_id not in found]
+    pending = file_service.submit_contents(files)
+    
+    async def generate():
+        yield b'{"files":['
+        for index, (file, futures) in enumerate(zip(files, pending)):
+            # 在事件循环中等待工作线程，不阻塞其他请求
+            parts = [await asyncio.wrap_future(future) for future in futures]
+            item = FileResponse(
+                id=file.id,
+                name=file.name,
+                path=file.path,
+                content=b"".join(parts).decode("utf-8"),
+                language=file.language,
+                encoding=file.encoding,
+                is_deleted=file.is_deleted,
+                created_at=file.created_at,
+                updated_at=file.updated_at
+            )
+            yield (b"," if index else b"") + item.model_dump_json().encode("utf-8")
+        yield b'],"missing":' + json.dumps(missing).encode("utf-8") + b"}"
+    
+    return StreamingResponse(generate(), media_type="application/json")
+
+
 @router.get("/trash", response_model=List[FileListResponse])
 async def list_trash(
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """列出回收站文件"""
@@ -59,89 +314,104 @@ async def list_trash(
     return file_service.list_deleted_files()
 
 
+@router.get("/storage/stats")
+async def get_storage_stats(
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取分块存储统计 (去重比例)"""
+    file_service = FileService(db)
+    return file_service.get_storage_stats()
+
+
+@router.post("/storage/gc")
+async def collect_storage_garbage(
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """回收未被引用的分块"""
+    file_service = FileService(db)
+    deleted = file_service.collect_garbage()
+    return {"deleted_chunks": deleted}
+
+
 @router.get("/export-all")
 async def export_all_files(
     password: str = None,
-    user: User = Depends(get_current_user),
+    mode: str = Query("full", pattern="^(full|incremental|differential)$"),
+    since_seq: Optional[int] = Query(None, ge=0),
+    since: Optional[datetime] = None,
+    base: Optional[str] = Query(None, max_length=100),
+    name: Optional[str] = Query(None, max_length=100),
+    include_versions: bool = False,
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """导出所有文件为 ZIP 压缩包（可选密码保护）"""
-    file_service = FileService(db)
-    files = file_service.list_files(include_deleted=False)
-    
-    zip_buffer = io.BytesIO()
-    
-    # 如果有密码，使用 pyzipper 创建加密 ZIP
-    if password:
-        import pyzipper
-        with pyzipper.AESZipFile(zip_buffer, 'w', compression=pyzipper.ZIP_DEFLATED, encryption=pyzipper.WZ_AES) as zip_file:
-            zip_file.setpassword(password.encode('utf-8'))
-            
-            metadata = {
-                "exported_at": datetime.utcnow().isoformat(),
-                "file_count": len(files),
-                "encrypted": True,
-                "files": []
-            }
-            
-            for f in files:
-                file_obj = file_service.get_file(f.id)
-                if file_obj:
-                    content = file_service.get_file_content(file_obj)
-                    file_path = f.path.lstrip('/') or f.name
-                    zip_file.writestr(file_path, content.encode('utf-8'))
-                    metadata["files"].append({
-                        "name": f.name,
-                        "path": f.path,
-                        "language": f.language,
-                        "created_at": f.created_at.isoformat() if f.created_at else None,
-                        "updated_at": f.updated_at.isoformat() if f.updated_at else None,
-                    })
-            
-            zip_file.writestr("_metadata.json", json.dumps(metadata, ensure_ascii=False, indent=2).encode('utf-8'))
-    else:
-        # 无密码，使用标准 zipfile
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            metadata = {
-                "exported_at": datetime.utcnow().isoformat(),
-                "file_count": len(files),
-                "encrypted": False,
-                "files": []
-            }
-            
-            for f in files:
-                file_obj = file_service.get_file(f.id)
-                if file_obj:
-                    content = file_service.get_file_content(file_obj)
-                    file_path = f.path.lstrip('/') or f.name
-                    zip_file.writestr(file_path, content.encode('utf-8'))
-                    metadata["files"].append({
-                        "name": f.name,
-                        "path": f.path,
-                        "language": f.language,
-                        "created_at": f.created_at.isoformat() if f.created_at else None,
-                        "updated_at": f.updated_at.isoformat() if f.updated_at else None,
-                    })
-            
-            zip_file.writestr("_metadata.json", json.dumps(metadata, ensure_ascii=False, indent=2).encode('utf-8'))
-    
-    zip_buffer.seek(0)
-    
-    filename = f"texton-backup-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
+    """导出文件为 ZIP 压缩包（可选密码保护）
+
+    mode=full 导出所有文件；incremental 导出上一个备份 (base 或 since_seq / since) 之后
+    变更的文件；differential 导出完整备份 base 之后变更的文件。include_versions 时包含
+    范围内新增的版本历史。每次导出都会登记备份，备份 ID 写入清单与 X-Backup-Id 响应头。
+    分块在线程池中并行解密和压缩，按顺序流式写出，内存占用与文件数量无关。
+    """
+    export_service = ExportService(db)
+    try:
+        backup, content = export_service.export_backup(
+            mode=mode,
+            since_seq=since_seq,
+            since=since,
+            base=base,
+            name=name,
+            include_versions=include_versions,
+            password=password,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    suffix = "" if mode == "full" else f"-{mode}"
+    filename = f"texton-backup{suffix}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
     
     return StreamingResponse(
-        zip_buffer,
+        content,
         media_type="application/zip",
         headers={
-            "Content-Disposition": f"attachment; filename={filename}"
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Backup-Id": backup.id,
         }
     )
 
 
+@router.get("/backups", response_model=List[BackupResponse])
+async def list_backups(
+    limit: int = Query(100, ge=1, le=1000),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """已登记的导出备份 (最新的在前)"""
+    return ExportService(db).list_backups(limit)
+
+
+@router.post("/import-archive")
+async def import_archives(
+    archives: List[UploadFile] = UploadField(...),
+    password: Optional[str] = Form(None),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """从导出的 ZIP 压缩包导入
+
+    可以同时上传一条备份链 (完整备份 + 增量备份，或完整备份 + 差异备份)，
+    按清单串联后导入最终状态；路径已存在的文件跳过。
+    """
+    try:
+        return ImportService(db).import_archives([archive.file for archive in archives], password)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/import")
 async def import_files(
     data: dict,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """从 JSON 导入文件"""
@@ -175,7 +445,7 @@ async def import_files(
 @router.post("", response_model=FileResponse)
 async def create_file(
     request: FileCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """创建文件"""
@@ -202,7 +472,7 @@ async def create_file(
 @router.get("/{file_id}", response_model=FileResponse)
 async def get_file(
     file_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取文件详情"""
@@ -215,24 +485,13 @@ async def get_file(
             detail="文件不存在"
         )
     
-    content = file_service.get_file_content(file)
-    return FileResponse(
-        id=file.id,
-        name=file.name,
-        path=file.path,
-        content=content,
-        language=file.language,
-        encoding=file.encoding,
-        is_deleted=file.is_deleted,
-        created_at=file.created_at,
-        updated_at=file.updated_at
-    )
+    return file_detail_response(file_service, file)
 
 
 @router.get("/{file_id}/export")
 async def export_file(
     file_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """导出单个文件"""
@@ -245,14 +504,15 @@ async def export_file(
             detail="文件不存在"
         )
     
-    content = file_service.get_file_content(file)
+    headers = {"Content-Disposition": f"attachment; filename={file.name}"}
+    if file.content_chunks is not None:
+        headers["Content-Length"] = str(file.content_size)
     
-    return Response(
-        content=content,
+    # 按分块流式输出，大文件无需整体解密到内存
+    return StreamingResponse(
+        file_service.iter_file_content(file),
         media_type="text/plain",
-        headers={
-            "Content-Disposition": f"attachment; filename={file.name}"
-        }
+        headers=headers
     )
 
 
@@ -260,7 +520,7 @@ async def export_file(
 async def update_file(
     file_id: int,
     request: FileUpdate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """更新文件元信息"""
@@ -296,10 +556,10 @@ async def update_file(
 @router.post("/{file_id}/duplicate", response_model=FileResponse)
 async def duplicate_file(
     file_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """复制文件"""
+    """复制文件 (副本共享源文件的加密分块，不重新加密)"""
     file_service = FileService(db)
     file = file_service.get_file(file_id)
     
@@ -309,8 +569,6 @@ async def duplicate_file(
             detail="文件不存在"
         )
     
-    content = file_service.get_file_content(file)
-    
     # 生成新文件名
     base_name = file.name.rsplit('.', 1)
     if len(base_name) > 1:
@@ -324,31 +582,15 @@ async def duplicate_file(
     else:
         new_path = f"/{new_name}"
     
-    new_file = file_service.create_file(
-        name=new_name,
-        path=new_path,
-        content=content,
-        language=file.language
-    )
-    
-    return FileResponse(
-        id=new_file.id,
-        name=new_file.name,
-        path=new_file.path,
-        content=content,
-        language=new_file.language,
-        encoding=new_file.encoding,
-        is_deleted=new_file.is_deleted,
-        created_at=new_file.created_at,
-        updated_at=new_file.updated_at
-    )
+    new_file = file_service.duplicate_file(file_id, name=new_name, path=new_path)
+    return file_detail_response(file_service, new_file)
 
 
 @router.post("/{file_id}/save", response_model=FileResponse)
 async def save_file(
     file_id: int,
     request: FileSaveRequest,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """保存文件内容"""
@@ -383,7 +625,7 @@ async def save_file(
 async def delete_file(
     file_id: int,
     permanent: bool = False,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """删除文件 (默认软删除)"""
@@ -406,7 +648,7 @@ async def delete_file(
 @router.post("/{file_id}/restore")
 async def restore_file(
     file_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """从回收站恢复文件"""
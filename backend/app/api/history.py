@@ -1,10 +1,12 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from app.models import get_db, User
+from app.models import get_db
 from app.schemas import FileVersionResponse, FileRestoreRequest, FileResponse
 from app.services import FileService
+from app.core.token_cache import CurrentUser
 from app.api.deps import get_current_user
+from app.api.files import file_detail_response
 
 router = APIRouter()
 
@@ -12,7 +14,7 @@ router = APIRouter()
 @router.get("/{file_id}/versions", response_model=List[FileVersionResponse])
 async def get_versions(
     file_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取文件版本历史"""
@@ -33,7 +35,7 @@ async def get_versions(
 async def get_version_content(
     file_id: int,
     version_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取指定版本的内容"""
@@ -53,7 +55,7 @@ async def get_version_content(
 async def restore_version(
     file_id: int,
     request: FileRestoreRequest,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """恢复到指定版本"""
@@ -67,15 +69,4 @@ async def restore_version(
             detail=str(e)
         )
     
-    content = file_service.get_file_content(file)
-    return FileResponse(
-        id=file.id,
-        name=file.name,
-        path=file.path,
-        content=content,
-        language=file.language,
-        encoding=file.encoding,
-        is_deleted=file.is_deleted,
-        created_at=file.created_at,
-        updated_at=file.updated_at
-    )
+    return file_detail_response(file_service, file)
@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.jobs import job_runner, Job
+from app.core.rate_limit import rate_limit
+from app.core.updates import PROJECT_ROOT
+from app.core.token_cache import CurrentUser
+from app.api.deps import get_current_user
+
+router = APIRouter()
+
+UPDATE_JOB = "update"
+# 更新脚本的最长执行时间 (秒)
+UPDATE_TIMEOUT_SECONDS = 300
+# SSE 空闲时的心跳间隔 (秒)
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def _get_job(job_id: str) -> Job:
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    return job
+
+
+@router.post("", dependencies=[Depends(rate_limit())])
+async def perform_update(user: CurrentUser = Depends(get_current_user)):
+    """启动后台更新任务（拉取代码、安装依赖、构建前端、重启服务），立即返回任务 ID"""
+    if settings.ENVIRONMENT != "production":
+        return {"success": False, "message": "仅生产环境支持自动更新"}
+
+    # 设置完整的 PATH
+    env = os.environ.copy()
+    env["PATH"] = "/usr/local/bin:/usr/bin:/bin:" + env.get("PATH", "")
+
+    update_script = os.path.join(PROJECT_ROOT, "scripts", "update.sh")
+    if os.path.exists(update_script):
+        argv = ["/bin/bash", update_script]
+        message = "更新完成！页面将自动刷新。"
+    else:
+        # 如果脚本不存在，只执行 git pull
+        argv = ["/usr/bin/git", "pull", "origin", "main"]
+        message = "代码已更新，请手动重启服务并重新构建前端"
+
+    job, created = job_runner.start(
+        UPDATE_JOB, argv, cwd=PROJECT_ROOT, env=env,
+        timeout=UPDATE_TIMEOUT_SECONDS, success_message=message
+    )
+    if job is None:
+        # 其他 worker 刚开始更新，任务尚未写入
+        return {"success": False, "message": "更新正在启动，请稍后刷新页面"}
+    return {
+        "success": True,
+        "message": "更新已开始" if created else "更新正在进行中",
+        "job": job.to_dict(),
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_update_job(job_id: str, offset: int = 0, user: CurrentUser = Depends(get_current_user)):
+    """轮询任务状态与 offset 之后的日志"""
+    return _get_job(job_id).to_dict(offset)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_update_job(
+    job_id: str,
+    offset: int = 0,
+    last_event_id: Optional[str] = Header(None),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """以 SSE 推送任务日志，任务结束时发送 done 事件"""
+    _get_job(job_id)
+    # 断线重连时从最后收到的日志行继续
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    async def events():
+        position = offset
+        while True:
+            # 任务可能运行在其他 worker 中，每次从任务文件读取最新状态
+            job = job_runner.get(job_id)
+            if job is None:
+                return
+            lines, next_offset = job.lines_since(position)
+            for i, line in enumerate(lines):
+                yield f"id: {next_offset - len(lines) + i + 1}\nevent: log\ndata: {json.dumps(line)}\n\n"
+            position = next_offset
+            if job.done:
+                summary = {k: v for k, v in job.to_dict(position).items() if k != "log"}
+                yield f"event: done\ndata: {json.dumps(summary, ensure_ascii=False)}\n\n"
+                return
+            if not lines:
+                yield ": ping\n\n"
+            await job_runner.wait_for_change(job_id, position, SSE_HEARTBEAT_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_update_job(job_id: str, user: CurrentUser = Depends(get_current_user)):
+    """取消正在运行的任务 (终止整个进程组)"""
+    job = await job_runner.cancel(_get_job(job_id))
+    return job.to_dict()
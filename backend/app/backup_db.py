@@ -0,0 +1,60 @@
+"""
+数据库备份脚本
+运行: python -m app.backup_db [--list] [--restore 备份文件 [--output 数据库路径]]
+
+不带参数时立即创建一个在线备份 (服务运行中也可以执行) 并按 DB_BACKUP_KEEP 轮换；
+服务正在备份时先等待其完成。
+--restore 把备份解密为新的数据库文件 (默认为 DATABASE_URL 指向的路径，须先停止服务并移走原文件)，
+并从备份目录补齐 Blob 存储中缺少的分块。
+"""
+import argparse
+import os
+import time
+
+from app.core.config import settings
+from app.services.db_backup import (
+    backup_lock,
+    backup_time,
+    check_keep,
+    create_backup,
+    database_path,
+    list_backups,
+    restore_backup,
+    rotate_backups,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库在线备份与恢复")
+    parser.add_argument("--list", action="store_true", help="列出已有的备份")
+    parser.add_argument("--restore", metavar="BACKUP", help="从备份文件恢复")
+    parser.add_argument("--output", help="恢复的目标数据库文件 (默认为当前数据库路径)")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Secure Editor - 数据库备份")
+    print("=" * 50)
+
+    if args.list:
+        for path in list_backups():
+            print(f"  {backup_time(path):%Y-%m-%d %H:%M:%S} UTC  {os.path.getsize(path):>12,} B  {path}")
+        return
+
+    if args.restore:
+        output = args.output or database_path()
+        restored = restore_backup(args.restore, output)
+        print(f"\n✓ 已恢复到 {output}，补齐 Blob {restored} 个")
+        return
+
+    check_keep(settings.DB_BACKUP_KEEP)
+    started = time.perf_counter()
+    with backup_lock(blocking=True):
+        path = create_backup()
+        removed = rotate_backups(settings.DB_BACKUP_KEEP)
+    print(f"\n✓ 备份已校验: {path}，耗时 {time.perf_counter() - started:.2f}s")
+    if removed:
+        print(f"✓ 轮换删除旧备份 {removed} 个")
+
+
+if __name__ == "__main__":
+    main()
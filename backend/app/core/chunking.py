@@ -0,0 +1,47 @@
+"""
+内容定义分块 (Content-Defined Chunking)
+
+分块边界只取决于边界附近的内容，因此在文件中间插入或删除文本
+只会影响相邻的一两个分块，其余分块保持不变，可以跨文件和版本去重。
+
+文本文件以换行作为候选边界，对候选位置之前的滑动窗口计算指纹，
+指纹低位全为 0 时切分。候选位置的查找和指纹计算都在 C 实现中完成，
+避免在 Python 中逐字节滚动哈希。
+"""
+import zlib
+from typing import List
+
+CHUNK_MIN_SIZE = 4 * 1024
+CHUNK_MAX_SIZE = 64 * 1024
+
+# 指纹窗口大小与切分掩码 (超过最小长度后平均每 128 个候选位置切分一次)
+_WINDOW_SIZE = 64
+_BOUNDARY_MASK = 0x7F
+
+
+def _find_boundary(data: bytes, start: int) -> int:
+    """查找从 start 开始的下一个分块边界"""
+    limit = min(start + CHUNK_MAX_SIZE, len(data))
+    if limit - start <= CHUNK_MIN_SIZE:
+        return limit
+    
+    pos = data.find(b"\n", start + CHUNK_MIN_SIZE - 1, limit)
+    while pos != -1:
+        cut = pos + 1
+        if zlib.crc32(data[cut - _WINDOW_SIZE:cut]) & _BOUNDARY_MASK == 0:
+            return cut
+        pos = data.find(b"\n", cut, limit)
+    
+    # 没有内容边界 (例如超长行)，按最大长度硬切分
+    return limit
+
+
+def split_chunks(data: bytes) -> List[bytes]:
+    """将数据切分为内容定义的分块"""
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = _find_boundary(data, start)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
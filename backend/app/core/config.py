@@ -16,8 +16,20 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # 认证 (关闭后所有接口无需令牌，仅用于本地开发)
+    AUTH_ENABLED: bool = True
+    # 已验证令牌缓存: 最大条目数与最长保留时间 (秒)
+    AUTH_CACHE_SIZE: int = 1024
+    AUTH_CACHE_MAX_AGE_SECONDS: int = 300
+    
     # 数据库
     DATABASE_URL: str = "sqlite:///./data/secure_editor.db"
+    # 启动时自动执行结构迁移；关闭后需先运行 python -m app.migrate
+    AUTO_MIGRATE: bool = True
+    # SQLite 等待写锁的最长时间 (秒)
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
+    # 多 worker 部署时通过文件锁串行化写事务 (等待者在锁释放时立即被唤醒)
+    SQLITE_WRITE_LOCK: bool = True
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:10086"
@@ -33,22 +45,67 @@ class Settings(BaseSettings):
     def trusted_hosts_list(self) -> List[str]:
         return [host.strip() for host in self.TRUSTED_HOSTS.split(",")]
     
-    # Rate Limiting
+    # 限流 (按客户端 IP 的令牌桶，多 worker 共享 RATE_LIMIT_STORAGE 中的状态)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE: str = "./data/ratelimit.db"
+    # 每分钟请求数: 一般接口 / 登录与 2FA 验证、修改密码 / 解锁屏幕
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_LOGIN_PER_MINUTE: int = 10
+    RATE_LIMIT_TOTP_PER_MINUTE: int = 10
     
     # 文件存储
     FILES_STORAGE_PATH: str = "./data/files"
+    # 存储后端: local (加密 Blob 写入 FILES_STORAGE_PATH) / database (内联保存在 SQLite)
+    STORAGE_BACKEND: str = "local"
     
     # 版本快照
     SNAPSHOT_INTERVAL_SECONDS: int = 60
     SNAPSHOT_MAX_OPERATIONS: int = 10
     
+    # 回收站: 后台任务永久删除移入回收站超过 TRASH_RETENTION_DAYS 天的文件 (0 表示不自动清理)
+    TRASH_RETENTION_DAYS: int = 0
+    # 清理间隔 (秒) 与每批永久删除的文件数 (每批单独提交)
+    TRASH_PURGE_INTERVAL_SECONDS: int = 3600
+    TRASH_PURGE_BATCH_SIZE: int = 100
+    
+    # 数据库在线备份: 后台任务每隔 DB_BACKUP_INTERVAL_SECONDS 创建一致的副本 (0 表示不自动备份)
+    DB_BACKUP_INTERVAL_SECONDS: int = 0
+    DB_BACKUP_PATH: str = "./data/backups"
+    # 保留的备份数 (更早的自动删除，至少为 1)
+    DB_BACKUP_KEEP: int = 7
+    # 以 ENCRYPTION_KEY 派生的密钥加密备份文件
+    DB_BACKUP_ENCRYPT: bool = True
+    # 每步复制的页数与步间休眠 (毫秒)，限制备份占用的磁盘带宽
+    DB_BACKUP_PAGES_PER_STEP: int = 256
+    DB_BACKUP_STEP_SLEEP_MS: int = 10
+    
     # GitHub 仓库 (用于检测更新)
     GITHUB_REPO: str = ""
+    # 更新检查结果的缓存时间 (秒)，后台任务按此间隔刷新
+    UPDATE_CHECK_TTL_SECONDS: int = 600
+    # 后台任务 (在线更新) 的状态与日志目录，多个 worker 共享
+    JOBS_PATH: str = "./data/jobs"
+    
+    # CPU 密集操作 (Argon2 密码哈希、二维码生成) 的进程池
+    # 排队任务超过 CPU_POOL_MAX_PENDING 时直接返回 503
+    CPU_POOL_WORKERS: int = 2
+    CPU_POOL_MAX_PENDING: int = 16
+    # 批量读取与全部导出的解密/压缩线程数 (0 表示 CPU 核数)
+    CRYPTO_THREADS: int = 0
     
     # 自动锁定 (分钟)
     AUTO_LOCK_MINUTES: int = 5
     
+    # 指标 (/api/metrics)，需携带 Bearer 令牌访问: 设置 METRICS_TOKEN 时为该令牌，否则为登录令牌
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str = ""
+    
+    # 请求剖析 (默认关闭)，携带 X-Profile-Token 请求头的请求总会被剖析
+    PROFILER_ENABLED: bool = False
+    PROFILER_SAMPLE_RATE: float = 0.0
+    PROFILER_TOKEN: str = ""
+    PROFILER_MAX_PROFILES: int = 20
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -56,6 +113,11 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-# 确保数据目录存在
-os.makedirs(os.path.dirname(settings.DATABASE_URL.replace("sqlite:///", "")), exist_ok=True)
-os.makedirs(settings.FILES_STORAGE_PATH, exist_ok=True)
+
+def ensure_data_dirs():
+    """确保数据目录存在 (在启动和命令行脚本中调用，而不是导入时)"""
+    if settings.DATABASE_URL.startswith("sqlite:///"):
+        db_dir = os.path.dirname(settings.DATABASE_URL.replace("sqlite:///", ""))
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+    os.makedirs(settings.FILES_STORAGE_PATH, exist_ok=True)
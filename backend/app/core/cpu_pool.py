@@ -0,0 +1,83 @@
+"""
+CPU 密集操作进程池
+
+Argon2 密码哈希和二维码生成会占用数十到数百毫秒 CPU，在事件循环或线程池中
+执行会阻塞其他请求 (GIL)。这些操作提交到独立的进程池执行:
+- 进程池使用 spawn 启动，不继承服务进程中的线程和数据库连接
+- 排队与执行中的任务总数有上限，超过时立即抛出 CPUPoolSaturated (返回 503)，
+  登录突发不会无限堆积并拖慢自动保存等其他请求
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.metrics import CPU_POOL_PENDING, CPU_POOL_REJECTED, CPU_POOL_SECONDS
+
+
+class CPUPoolSaturated(RuntimeError):
+    """进程池队列已满"""
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _warm_up() -> None:
+    """工作进程启动时预先导入 passlib/argon2"""
+    from app.core.security import _pwd_context
+    _pwd_context()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.CPU_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+        )
+    return _executor
+
+
+async def start_pool() -> None:
+    """启动工作进程 (应用启动时在后台执行，避免首次登录等待进程启动)"""
+    executor = _get_executor()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[
+        loop.run_in_executor(executor, time.sleep, 0)
+        for _ in range(settings.CPU_POOL_WORKERS)
+    ])
+
+
+def shutdown_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_cpu(fn: Callable, *args):
+    """在进程池中执行 fn(*args)，队列已满时抛出 CPUPoolSaturated"""
+    global _executor, _pending
+    operation = fn.__name__
+    if _pending >= settings.CPU_POOL_MAX_PENDING:
+        CPU_POOL_REJECTED.inc(operation=operation)
+        raise CPUPoolSaturated("服务器繁忙，请稍后重试")
+
+    _pending += 1
+    CPU_POOL_PENDING.set(_pending)
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    except BrokenProcessPool:
+        # 工作进程异常退出 (如被 OOM 终止)，下次调用时重建进程池
+        _executor = None
+        raise
+    finally:
+        _pending -= 1
+        CPU_POOL_PENDING.set(_pending)
+        CPU_POOL_SECONDS.observe(time.perf_counter() - started, operation=operation)
@@ -1,7 +1,13 @@
 import os
+import time
 import base64
+import hashlib
+import hmac
+from functools import lru_cache
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from .config import settings
+from .metrics import record_crypto
 
 
 def _get_key() -> bytes:
@@ -17,6 +23,7 @@ def _get_key() -> bytes:
 
 def encrypt_content(content: str) -> str:
     """AES-256-GCM 加密内容"""
+    started = time.perf_counter()
     key = _get_key()
     aesgcm = AESGCM(key)
     
@@ -28,21 +35,124 @@ def encrypt_content(content: str) -> str:
     
     # 组合 nonce + ciphertext 并 base64 编码
     encrypted = base64.b64encode(nonce + ciphertext).decode('utf-8')
+    record_crypto("encrypt", len(ciphertext) - 16, started)
     return encrypted
 
 
 def decrypt_content(encrypted: str) -> str:
     """AES-256-GCM 解密内容"""
+    return decrypt_content_bytes(encrypted).decode('utf-8')
+
+
+def decrypt_content_bytes(encrypted: str) -> bytes:
+    """AES-256-GCM 解密内容，返回 UTF-8 字节 (用于流式输出，避免解码再编码)"""
+    started = time.perf_counter()
     key = _get_key()
     aesgcm = AESGCM(key)
     
-    # base64 解码
-    data = base64.b64decode(encrypted.encode('utf-8'))
+    # base64 解码 (直接接受 str，无需先 encode 复制一份)
+    data = base64.b64decode(encrypted)
     
-    # 分离 nonce 和 ciphertext
-    nonce = data[:12]
-    ciphertext = data[12:]
+    # 通过 memoryview 分离 nonce 和 ciphertext，切片不复制数据
+    view = memoryview(data)
+    nonce = view[:12]
+    ciphertext = view[12:]
     
     # 解密
     plaintext = aesgcm.decrypt(nonce, ciphertext, None)
-    return plaintext.decode('utf-8')
+    record_crypto("decrypt", len(plaintext), started)
+    return plaintext
+
+
+@lru_cache(maxsize=None)
+def _derive_key(label: bytes) -> bytes:
+    """从主密钥派生用途独立的子密钥"""
+    return hmac.new(_get_key(), label, hashlib.sha256).digest()
+
+
+def chunk_id(data: bytes) -> str:
+    """计算分块的带密钥内容 ID (HMAC-SHA256)，相同明文得到相同 ID"""
+    return hmac.new(_derive_key(b"chunk-id"), data, hashlib.sha256).hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    """计算完整内容的带密钥哈希 (HMAC-SHA256)，用于判断内容是否变化，不泄露明文"""
+    return hmac.new(_derive_key(b"content-hash"), data, hashlib.sha256).hexdigest()
+
+
+def encrypt_chunk(cid: str, data: bytes) -> bytes:
+    """确定性加密分块 (nonce 由内容 ID 派生，相同明文得到相同密文)"""
+    started = time.perf_counter()
+    aesgcm = AESGCM(_derive_key(b"chunk-enc"))
+    nonce = bytes.fromhex(cid)[:12]
+    ciphertext = aesgcm.encrypt(nonce, data, cid.encode())
+    record_crypto("encrypt", len(data), started)
+    return ciphertext
+
+
+def decrypt_chunk(cid: str, ciphertext) -> bytes:
+    """解密分块，内容 ID 作为附加数据参与认证 (ciphertext 可以是 memoryview)"""
+    started = time.perf_counter()
+    aesgcm = AESGCM(_derive_key(b"chunk-enc"))
+    nonce = bytes.fromhex(cid)[:12]
+    plaintext = aesgcm.decrypt(nonce, ciphertext, cid.encode())
+    record_crypto("decrypt", len(plaintext), started)
+    return plaintext
+
+
+# 加密文件格式: 标识 + 8 字节随机前缀，之后每段为 4 字节密文长度 + 密文
+_FILE_MAGIC = b"TXENC1"
+_FILE_SEGMENT_SIZE = 1024 * 1024
+
+
+def encrypt_file(src_path: str, dst_path: str) -> None:
+    """分段 AES-256-GCM 加密文件 (用于数据库备份)
+
+    nonce 为随机前缀 + 段序号，附加数据标记最后一段，截断或调换顺序都无法通过认证。
+    """
+    aesgcm = AESGCM(_derive_key(b"file-enc"))
+    prefix = os.urandom(8)
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        dst.write(_FILE_MAGIC + prefix)
+        index = 0
+        segment = src.read(_FILE_SEGMENT_SIZE)
+        while True:
+            following = src.read(_FILE_SEGMENT_SIZE)
+            final = not following
+            ciphertext = aesgcm.encrypt(prefix + index.to_bytes(4, "big"), segment, b"\x01" if final else b"\x00")
+            dst.write(len(ciphertext).to_bytes(4, "big"))
+            dst.write(ciphertext)
+            if final:
+                break
+            segment = following
+            index += 1
+        dst.flush()
+        os.fsync(dst.fileno())
+
+
+def decrypt_file(src_path: str, dst_path: str) -> None:
+    """解密 encrypt_file 生成的文件，损坏、截断或密钥不匹配时抛出 ValueError"""
+    aesgcm = AESGCM(_derive_key(b"file-enc"))
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        header = src.read(len(_FILE_MAGIC) + 8)
+        if header[:len(_FILE_MAGIC)] != _FILE_MAGIC:
+            raise ValueError("不是加密的备份文件")
+        prefix = header[len(_FILE_MAGIC):]
+        index = 0
+        while True:
+            length = src.read(4)
+            if len(length) < 4:
+                raise ValueError("加密文件不完整")
+            ciphertext = src.read(int.from_bytes(length, "big"))
+            nonce = prefix + index.to_bytes(4, "big")
+            try:
+                dst.write(aesgcm.decrypt(nonce, ciphertext, b"\x00"))
+            except InvalidTag:
+                try:
+                    dst.write(aesgcm.decrypt(nonce, ciphertext, b"\x01"))
+                except InvalidTag:
+                    raise ValueError("加密文件已损坏或密钥不匹配")
+                if src.read(1):
+                    raise ValueError("加密文件在结束标记之后还有数据")
+                return
+            index += 1
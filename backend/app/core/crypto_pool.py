@@ -0,0 +1,33 @@
+"""
+解密/压缩线程池
+
+cryptography 的 AES-GCM 与 zlib 在处理数据时释放 GIL，多个分块可以在线程中真正并行解密或压缩，
+而且线程之间直接共享密文和明文，不需要像进程池那样序列化传输。用于批量读取与全部导出:
+- 线程数由 CRYPTO_THREADS 设置 (0 表示 CPU 核数)
+- 提交的任务只做解密/压缩与 Blob 读取，不访问数据库会话
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.core.config import settings
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def pool_size() -> int:
+    return settings.CRYPTO_THREADS or os.cpu_count() or 1
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=pool_size(), thread_name_prefix="crypto")
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,324 @@
+"""
+后台任务执行器
+
+在事件循环中以异步子进程运行长时间任务 (如在线更新)，不占用请求处理:
+- 每个任务有唯一 ID，状态与输出保存在 JOBS_PATH 中 (<id>.json 与逐行追加的 <id>.log)，
+  任何 worker 都可以通过轮询 (offset) 或 SSE 返回任务进度，也可以取消任务
+- 同一类型的任务同时只运行一个: 启动前获取 <类型>.lock 文件锁 (跨 worker)，
+  重复提交返回正在运行的任务
+- 运行任务的 worker 在任务期间持有 <id>.lock；该 worker 退出 (如更新脚本重启服务) 后，
+  仍为 running 的任务被标记为 interrupted
+- 子进程运行在独立的进程组中，取消时终止整个进程组 (包括脚本启动的子命令)
+- 不支持 flock 的平台 (Windows) 只在进程内保证同类任务唯一
+"""
+import asyncio
+import json
+import os
+import re
+import secrets
+import signal
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+
+# 每次返回的最大日志行数 (更早的行被跳过，offset 按总行数计算)
+MAX_LOG_LINES = 5000
+# 保留的已结束任务数
+MAX_FINISHED_JOBS = 20
+# 取消时等待进程退出的时间，超时后强制结束
+KILL_TIMEOUT_SECONDS = 10
+# 等待任务文件变化的轮询间隔 (秒)
+POLL_INTERVAL_SECONDS = 0.5
+
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+
+_JOB_ID = re.compile(r"[0-9a-f]{16}")
+_FIELDS = ("id", "kind", "status", "message", "returncode", "pid", "started_at", "finished_at")
+
+
+class Job:
+    """任务状态 (JOBS_PATH/<id>.json 的内容)"""
+
+    def __init__(
+        self,
+        id: str,
+        kind: str,
+        status: str = RUNNING,
+        message: str = "",
+        returncode: Optional[int] = None,
+        pid: Optional[int] = None,
+        started_at: Optional[float] = None,
+        finished_at: Optional[float] = None,
+        log_path: str = "",
+    ):
+        self.id = id
+        self.kind = kind
+        self.status = status
+        self.message = message
+        self.returncode = returncode
+        # 子进程 (进程组) ID，用于取消
+        self.pid = pid
+        self.started_at = started_at if started_at is not None else time.time()
+        self.finished_at = finished_at
+        self.log_path = log_path
+
+    @property
+    def done(self) -> bool:
+        return self.status != RUNNING
+
+    def lines_since(self, offset: int) -> Tuple[List[str], int]:
+        """返回 offset 之后的日志行与下一个 offset"""
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        # 只返回完整的行，运行任务的 worker 可能正在写入最后一行
+        lines = [line.decode("utf-8", errors="replace") for line in data.split(b"\n")[:-1]]
+        start = max(0, offset, len(lines) - MAX_LOG_LINES)
+        return lines[start:], len(lines)
+
+    def to_dict(self, offset: int = 0) -> dict:
+        lines, next_offset = self.lines_since(offset)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "message": self.message,
+            "returncode": self.returncode,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "log": lines,
+            "offset": next_offset,
+        }
+
+
+class JobRunner:
+    def __init__(self, root: Optional[str] = None):
+        self._root = root
+        # 本 worker 运行中的任务
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def root(self) -> str:
+        return self._root or settings.JOBS_PATH
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        job = self._load(job_id)
+        if job and not job.done and not self._is_alive(job_id):
+            # 运行任务的 worker 在写入最终状态之后才释放锁，重新读取一次再判断
+            job = self._load(job_id)
+            if job and not job.done:
+                job.status = INTERRUPTED
+                job.message = "运行任务的进程已退出 (服务可能已重启)"
+                job.finished_at = time.time()
+                self._save(job)
+        return job
+
+    def running(self, kind: str) -> Optional[Job]:
+        try:
+            with open(self._path(f"{kind}.current")) as f:
+                job = self.get(f.read().strip())
+        except FileNotFoundError:
+            return None
+        return job if job and not job.done else None
+
+    def start(
+        self, kind: str, argv: List[str], cwd: str, env: dict, timeout: float, success_message: str = ""
+    ) -> Tuple[Optional[Job], bool]:
+        """启动任务，返回 (任务, 是否新建)
+
+        同类任务正在运行时返回该任务；其他 worker 刚获取锁、尚未写入任务时返回 (None, False)。
+        """
+        existing = self.running(kind)
+        if existing:
+            return existing, False
+
+        os.makedirs(self.root, exist_ok=True)
+        kind_fd = self._try_lock(f"{kind}.lock")
+        if kind_fd is None:
+            return self.running(kind), False
+
+        job_fd = None
+        try:
+            job = Job(secrets.token_hex(8), kind)
+            job.log_path = self._path(f"{job.id}.log")
+            # 新任务的锁文件不会被其他进程持有
+            job_fd = self._try_lock(f"{job.id}.lock")
+            self._save(job)
+            self._write(f"{kind}.current", job.id)
+            self._prune()
+        except BaseException:
+            for fd in (kind_fd, job_fd):
+                if fd is not None:
+                    os.close(fd)
+            raise
+
+        self._tasks[job.id] = asyncio.create_task(
+            self._run(job, (kind_fd, job_fd), argv, cwd, env, timeout, success_message)
+        )
+        return job, True
+
+    async def wait_for_change(self, job_id: str, offset: int, timeout: float) -> None:
+        """等待新日志或任务结束"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.get(job_id)
+            if job is None or job.done or job.lines_since(offset)[1] > offset:
+                return
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    async def cancel(self, job: Job) -> Job:
+        """终止任务的进程组并等待任务结束 (任何 worker 都可以调用)，返回最新状态"""
+        if job.done or job.pid is None:
+            return job
+        self._write(f"{job.id}.cancel", "")
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            self._signal(job.pid, sig)
+            job = await self._wait_done(job.id, KILL_TIMEOUT_SECONDS) or job
+            if job.done:
+                break
+        return job
+
+    async def _wait_done(self, job_id: str, timeout: float) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.done or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    @staticmethod
+    def _signal(pid: int, sig: int) -> None:
+        try:
+            os.killpg(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _is_alive(self, job_id: str) -> bool:
+        """运行该任务的 worker 是否仍在 (持有任务锁)"""
+        if job_id in self._tasks:
+            return True
+        if fcntl is None:
+            return False
+        fd = os.open(self._path(f"{job_id}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    def _try_lock(self, name: str) -> Optional[int]:
+        """获取文件锁，返回文件描述符 (关闭即释放)；已被其他进程持有时返回 None"""
+        fd = os.open(self._path(name), os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+        return fd
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        try:
+            with open(self._path(f"{job_id}.json"), encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return Job(**{key: data.get(key) for key in _FIELDS}, log_path=self._path(f"{job_id}.log"))
+
+    def _save(self, job: Job) -> None:
+        self._write(f"{job.id}.json", json.dumps({key: getattr(job, key) for key in _FIELDS}, ensure_ascii=False))
+
+    def _write(self, name: str, content: str) -> None:
+        """写入临时文件后替换，读取者不会看到写了一半的内容"""
+        tmp = self._path(f"{name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, self._path(name))
+
+    def _prune(self) -> None:
+        jobs = [self._load(name[:-5]) for name in os.listdir(self.root) if name.endswith(".json")]
+        finished = sorted((job for job in jobs if job and job.done), key=lambda job: job.finished_at or 0)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            for suffix in (".json", ".log", ".lock", ".cancel"):
+                try:
+                    os.unlink(self._path(job.id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    async def _run(
+        self, job: Job, lock_fds: Tuple[int, int], argv: List[str], cwd: str, env: dict, timeout: float,
+        success_message: str
+    ) -> None:
+        log_fd = os.open(job.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            status, message = await self._execute(job, log_fd, argv, cwd, env, timeout, success_message)
+            job.status = status
+            job.message = message
+            job.finished_at = time.time()
+            self._save(job)
+        finally:
+            # 最终状态写入之后才释放锁
+            os.close(log_fd)
+            for fd in lock_fds:
+                os.close(fd)
+            self._tasks.pop(job.id, None)
+
+    async def _execute(
+        self, job: Job, log_fd: int, argv: List[str], cwd: str, env: dict, timeout: float, success_message: str
+    ) -> Tuple[str, str]:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                cwd=cwd,
+                env=env,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except OSError as e:
+            return FAILED, str(e)
+
+        job.pid = process.pid
+        self._save(job)
+        try:
+            await asyncio.wait_for(self._pump(process, log_fd), timeout)
+        except asyncio.TimeoutError:
+            self._signal(process.pid, signal.SIGKILL)
+            job.returncode = await process.wait()
+            return FAILED, "任务超时"
+
+        job.returncode = await process.wait()
+        if os.path.exists(self._path(f"{job.id}.cancel")):
+            return CANCELLED, "已取消"
+        if job.returncode == 0:
+            return SUCCEEDED, success_message
+        return FAILED, f"退出码 {job.returncode}"
+
+    @staticmethod
+    async def _pump(process: asyncio.subprocess.Process, log_fd: int) -> None:
+        async for line in process.stdout:
+            # 每行一次追加写入，其他 worker 读取时不会看到交错的内容
+            os.write(log_fd, line.rstrip(b"\n") + b"\n")
+
+
+job_runner = JobRunner()
@@ -0,0 +1,345 @@
+"""
+进程内指标采集 (Prometheus 文本格式)
+
+只依赖标准库，记录一次指标只需一次加锁的字典更新，可在生产环境常开。
+多 worker 部署时每个进程各自统计，由 Prometheus 按实例聚合。
+"""
+import asyncio
+import time
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶 (秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各分桶计数..., +Inf 计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "texton_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "texton_db_query_duration_seconds",
+    "SQL statement execution time",
+))
+DB_QUERIES_PER_REQUEST = registry.register(Histogram(
+    "texton_db_queries_per_request",
+    "Number of SQL statements issued per HTTP request",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000),
+))
+DB_TIME_PER_REQUEST = registry.register(Histogram(
+    "texton_db_time_per_request_seconds",
+    "Total SQL execution time per HTTP request",
+    ("route",),
+))
+CRYPTO_BYTES = registry.register(Counter(
+    "texton_crypto_bytes_total",
+    "Plaintext bytes processed by AES-GCM",
+    ("operation",),
+))
+CRYPTO_SECONDS = registry.register(Counter(
+    "texton_crypto_seconds_total",
+    "Time spent in AES-GCM encrypt/decrypt",
+    ("operation",),
+))
+SNAPSHOTS_CREATED = registry.register(Counter(
+    "texton_snapshots_created_total",
+    "File version snapshots created",
+))
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "texton_event_loop_lag_seconds",
+    "Delay between scheduled and actual wake-up of the event loop monitor",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+))
+EVENT_LOOP_LAG_LAST = registry.register(Gauge(
+    "texton_event_loop_lag_last_seconds",
+    "Most recent event loop lag measurement",
+))
+CPU_POOL_PENDING = registry.register(Gauge(
+    "texton_cpu_pool_pending",
+    "CPU-bound tasks queued or running in the process pool",
+))
+CPU_POOL_REJECTED = registry.register(Counter(
+    "texton_cpu_pool_rejected_total",
+    "CPU-bound tasks rejected because the process pool queue was full",
+    ("operation",),
+))
+CPU_POOL_SECONDS = registry.register(Histogram(
+    "texton_cpu_pool_task_seconds",
+    "Wall time of CPU-bound tasks including queueing",
+    ("operation",),
+))
+DB_WRITE_LOCK_WAIT = registry.register(Histogram(
+    "texton_db_write_lock_wait_seconds",
+    "Time spent waiting for the SQLite single-writer lock",
+))
+RATE_LIMIT_REJECTED = registry.register(Counter(
+    "texton_rate_limit_rejected_total",
+    "Requests rejected by the rate limiter",
+    ("group",),
+))
+TRASH_PURGED = registry.register(Counter(
+    "texton_trash_purged_total",
+    "Files permanently deleted by the scheduled trash purge",
+))
+DB_BACKUPS = registry.register(Counter(
+    "texton_db_backups_total",
+    "Scheduled database backups by result",
+    ("status",),
+))
+DB_BACKUP_LAST_SUCCESS = registry.register(Gauge(
+    "texton_db_backup_last_success_timestamp_seconds",
+    "Unix time of the last verified database backup",
+))
+
+# 当前请求的 SQL 统计 [语句数, 耗时]，请求之外为 None
+_request_db_stats: ContextVar[Optional[List[float]]] = ContextVar("request_db_stats", default=None)
+
+
+def record_crypto(operation: str, size: int, started: float) -> None:
+    """记录一次加解密的字节数和耗时"""
+    CRYPTO_BYTES.inc(size, operation=operation)
+    CRYPTO_SECONDS.inc(time.perf_counter() - started, operation=operation)
+
+
+def instrument_engine(engine) -> None:
+    """通过 SQLAlchemy 事件记录每条 SQL 的耗时，并累计到当前请求"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_DURATION.observe(elapsed)
+        stats = _request_db_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+def route_label(scope) -> str:
+    """返回请求匹配的完整路由模板，例如 /api/files/{file_id}
+
+    子路由的模板可能不含 include_router 的前缀，前缀由请求路径中
+    对应数量的开头路径段补齐。未匹配任何路由时返回 unmatched。
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    template_parts = [part for part in template.split("/") if part]
+    path_parts = [part for part in scope["path"].split("/") if part]
+    prefix = path_parts[:max(0, len(path_parts) - len(template_parts))]
+    return "/" + "/".join(prefix + template_parts)
+
+
+class MetricsMiddleware:
+    """记录每个请求的延迟和 SQL 统计 (纯 ASGI 中间件，开销低于 BaseHTTPMiddleware)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        stats = [0, 0.0]
+        token = _request_db_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_db_stats.reset(token)
+            # 使用路由模板作为标签，避免按具体 ID 产生大量时间序列
+            route_path = route_label(scope)
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_path,
+                status=status_code,
+            )
+            DB_QUERIES_PER_REQUEST.observe(stats[0], route=route_path)
+            DB_TIME_PER_REQUEST.observe(stats[1], route=route_path)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """周期性测量事件循环的调度延迟 (阻塞事件循环的同步代码会体现为延迟升高)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
@@ -0,0 +1,153 @@
+"""
+按需请求剖析 (cProfile + SQL 语句)
+
+开启 PROFILER_ENABLED 后，按 PROFILER_SAMPLE_RATE 随机采样，或对携带
+X-Profile-Token 请求头 (值为 PROFILER_TOKEN) 的请求进行剖析。结果保存在
+最近 PROFILER_MAX_PROFILES 条的环形缓冲区中，通过 /api/debug/profiles 查看。
+
+cProfile 同一时间只能剖析一个请求，并发请求中其余的照常处理、不做剖析。
+剖析在事件循环线程上进行，期间其他协程的调用也会计入结果。
+"""
+import cProfile
+import hmac
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+
+from .config import settings
+
+PROFILE_HEADER = "x-profile-token"
+
+# 单个剖析最多记录的 SQL 语句数与语句长度
+_MAX_STATEMENTS = 500
+_MAX_STATEMENT_LENGTH = 2000
+_STATS_LINES = 60
+
+_profiles: deque = deque(maxlen=max(1, settings.PROFILER_MAX_PROFILES))
+_profile_ids = itertools.count(1)
+_active = threading.Lock()
+
+# 当前请求捕获的 SQL [(语句, 耗时)]，未剖析时为 None
+_captured_sql: ContextVar[Optional[List[tuple]]] = ContextVar("captured_sql", default=None)
+
+
+def verify_profiler_token(token: Optional[str]) -> bool:
+    """校验剖析令牌 (未配置令牌时一律拒绝)"""
+    if not settings.PROFILER_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token, settings.PROFILER_TOKEN)
+
+
+def list_profiles() -> List[dict]:
+    """最近的剖析摘要 (新的在前)"""
+    return [
+        {key: value for key, value in profile.items() if key not in ("sql", "stats")}
+        for profile in reversed(_profiles)
+    ]
+
+
+def get_profile(profile_id: int) -> Optional[dict]:
+    """获取完整剖析结果"""
+    for profile in _profiles:
+        if profile["id"] == profile_id:
+            return profile
+    return None
+
+
+def capture_sql(engine) -> None:
+    """剖析期间记录执行的 SQL 语句及耗时"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _captured_sql.get() is not None:
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured = _captured_sql.get()
+        if captured is None or not conn.info.get("profile_query_start"):
+            return
+        elapsed = time.perf_counter() - conn.info["profile_query_start"].pop()
+        if len(captured) < _MAX_STATEMENTS:
+            captured.append((statement[:_MAX_STATEMENT_LENGTH], elapsed))
+
+
+def _format_stats(profile: cProfile.Profile) -> str:
+    buffer = io.StringIO()
+    stats = pstats.Stats(profile, stream=buffer)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(_STATS_LINES)
+    stats.print_callees(_STATS_LINES // 3)
+    return buffer.getvalue()
+
+
+class ProfilerMiddleware:
+    """对采样或指定的请求进行剖析 (纯 ASGI 中间件)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _should_profile(self, scope) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER.encode():
+                return verify_profiler_token(value.decode("latin-1"))
+        return settings.PROFILER_SAMPLE_RATE > 0 and random.random() < settings.PROFILER_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # cProfile 不支持嵌套，已有请求在剖析时直接放行
+        if not _active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_profile_ids)
+        status_code = 500
+        captured: List[tuple] = []
+        token = _captured_sql.set(captured)
+        profiler = cProfile.Profile()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile_id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            _captured_sql.reset(token)
+            _active.release()
+
+            _profiles.append({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "started_at": started_at.isoformat(),
+                "duration_ms": round(duration * 1000, 2),
+                "sql_count": len(captured),
+                "sql_time_ms": round(sum(elapsed for _, elapsed in captured) * 1000, 2),
+                "sql": [
+                    {"statement": statement, "duration_ms": round(elapsed * 1000, 3)}
+                    for statement, elapsed in captured
+                ],
+                "stats": _format_stats(profiler),
+            })
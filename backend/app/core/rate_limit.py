@@ -0,0 +1,129 @@
+"""
+跨进程共享的限流
+
+按 路由分组 + 客户端 IP 的令牌桶，状态保存在独立的 SQLite 文件 (RATE_LIMIT_STORAGE) 中，
+同一主机上的多个 uvicorn worker 共享同一组桶，服务重启后计数也不会清零:
+- 每次检查只执行一条 INSERT ... ON CONFLICT DO UPDATE ... RETURNING，补充令牌、
+  扣减和判断在 SQLite 内原子完成，不需要显式事务或额外的跨进程锁
+- 每个进程复用一个连接 (WAL, synchronous=NORMAL，提交时不 fsync)，单次检查约数十微秒
+- 已补满的桶与不存在等价，定期删除
+- 存储不可用时放行请求并记录日志，不影响正常使用
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# 路由分组 -> 每分钟允许的请求数 (同时也是突发容量)
+# login 由登录、设置/验证 2FA、修改密码共享，切换接口不能绕过限制
+LIMITS: Dict[str, int] = {
+    "default": settings.RATE_LIMIT_PER_MINUTE,
+    "login": settings.RATE_LIMIT_LOGIN_PER_MINUTE,
+    "totp": settings.RATE_LIMIT_TOTP_PER_MINUTE,
+}
+
+# 每个进程每检查多少次清理一次已补满的桶
+_PRUNE_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# SET 中的表达式都基于更新前的行计算；时钟回拨时不补充也不倒扣
+_REFILL = "MIN(:capacity, tokens + MAX(:now - updated_at, 0) * :rate)"
+_TAKE = f"""
+INSERT INTO buckets (key, tokens, updated_at, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = CASE WHEN {_REFILL} >= 1 THEN {_REFILL} - 1 ELSE {_REFILL} END,
+    allowed = {_REFILL} >= 1,
+    updated_at = MAX(updated_at, :now)
+RETURNING allowed, tokens
+"""
+
+
+class RateLimiter:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._checks = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def hit(self, key: str, per_minute: int) -> Tuple[bool, int]:
+        """消耗一个令牌，返回 (是否放行, 需要等待的秒数)"""
+        rate = per_minute / 60.0
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            allowed, tokens = conn.execute(
+                _TAKE, {"key": key, "capacity": per_minute, "rate": rate, "now": now}
+            ).fetchone()
+            self._checks += 1
+            if self._checks % _PRUNE_EVERY == 0:
+                self._prune(conn, now)
+        if allowed:
+            return True, 0
+        return False, max(1, math.ceil((1 - tokens) / rate))
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        # 容量等于每分钟请求数，空闲一分钟的桶一定已补满
+        conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - 60,))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+rate_limiter = RateLimiter(settings.RATE_LIMIT_STORAGE)
+
+
+def rate_limit(group: str = "default"):
+    """路由依赖: 按客户端 IP 限流，超出时返回 429 和 Retry-After"""
+    per_minute = LIMITS[group]
+
+    async def dependency(request: Request) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        client = request.client.host if request.client else "unknown"
+        try:
+            allowed, retry_after = rate_limiter.hit(f"{group}:{client}", per_minute)
+        except sqlite3.Error:
+            logger.exception("限流存储不可用，放行请求")
+            return
+        if not allowed:
+            RATE_LIMIT_REJECTED.inc(group=group)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="请求过于频繁，请稍后再试",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+    return dependency
@@ -1,24 +1,46 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Tuple
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from .config import settings
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+@lru_cache(maxsize=None)
+def _pwd_context():
+    """密码哈希上下文 (首次使用时才导入 passlib/argon2)"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["argon2"], deprecated="auto")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """生成密码哈希"""
-    return pwd_context.hash(password)
+    return _pwd_context().hash(password)
+
+
+def render_qr_code(data: str) -> str:
+    """生成二维码 PNG，返回 base64 (qrcode/PIL 较重，只在设置 2FA 时导入)"""
+    import base64
+    import io
+    import qrcode
+    
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
+    from jose import jwt
+    
     to_encode = data.copy()
     expire = datetime.utcnow() + (
         expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -29,6 +51,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def create_refresh_token(data: dict) -> str:
     """创建刷新令牌"""
+    from jose import jwt
+    
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
@@ -37,6 +61,8 @@ def create_refresh_token(data: dict) -> str:
 
 def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
     """验证令牌"""
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
@@ -48,9 +74,9 @@ def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
         return None
 
 
-def create_tokens(user_id: int) -> Tuple[str, str]:
+def create_tokens(user_id: int, token_version: int = 0) -> Tuple[str, str]:
     """创建访问令牌和刷新令牌"""
-    data = {"sub": str(user_id)}
+    data = {"sub": str(user_id), "ver": token_version}
     access_token = create_access_token(data)
     refresh_token = create_refresh_token(data)
     return access_token, refresh_token
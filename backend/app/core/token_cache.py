@@ -0,0 +1,64 @@
+"""
+已验证访问令牌缓存
+
+每个请求都解码 JWT 并查询用户会给自动保存等高频接口带来额外开销。验证通过的
+令牌与用户信息缓存在进程内 (LRU，有容量上限):
+- 条目在令牌过期时失效，且最长保留 AUTH_CACHE_MAX_AGE_SECONDS，
+  多 worker 部署时其他进程中的登出/改密最迟在此时间后生效
+- 登出或修改密码时立即清除该用户的所有条目
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """已认证用户 (与数据库会话无关，可在请求间共享)"""
+    id: int
+    username: str
+    token_version: int
+
+
+class TokenCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[CurrentUser, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: CurrentUser, token_expires_at: float) -> None:
+        expires_at = min(token_expires_at, time.time() + settings.AUTH_CACHE_MAX_AGE_SECONDS)
+        with self._lock:
+            self._entries[token] = (user, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict_user(self, user_id: int) -> None:
+        """清除用户的所有缓存令牌"""
+        with self._lock:
+            for token in [t for t, (user, _) in self._entries.items() if user.id == user_id]:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.AUTH_CACHE_SIZE)
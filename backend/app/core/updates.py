@@ -0,0 +1,178 @@
+"""
+版本信息与更新检查缓存
+
+- version.json 只在文件修改时间变化时重新解析
+- GitHub 更新检查由后台任务定期刷新，接口直接返回缓存结果，不等待网络;
+  缓存过期后仍返回旧结果，同时在后台重新检查 (stale-while-revalidate)
+- 所有检查共用一个 httpx.AsyncClient，并使用 ETag 条件请求 (304 不计入 GitHub 限额)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+VERSION_FILE = os.path.join(PROJECT_ROOT, "version.json")
+
+DEFAULT_VERSION = {"version": "1.0.0", "buildTime": "unknown"}
+
+_version_cache: Tuple[Optional[int], dict] = (None, DEFAULT_VERSION)
+
+
+def get_version_info() -> dict:
+    """读取 version.json (按修改时间缓存)"""
+    global _version_cache
+    try:
+        mtime = os.stat(VERSION_FILE).st_mtime_ns
+    except OSError:
+        return DEFAULT_VERSION
+
+    cached_mtime, data = _version_cache
+    if cached_mtime == mtime:
+        return data
+
+    try:
+        with open(VERSION_FILE, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = DEFAULT_VERSION
+    _version_cache = (mtime, data)
+    return data
+
+
+async def get_local_commit() -> str:
+    """本地 git 提交的短 SHA (异步子进程，不阻塞事件循环)"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "/usr/bin/git", "rev-parse", "--short", "HEAD",
+            cwd=PROJECT_ROOT,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=5)
+    except (OSError, asyncio.TimeoutError):
+        return ""
+    return stdout.decode().strip() if process.returncode == 0 else ""
+
+
+class UpdateChecker:
+    """缓存 GitHub 更新检查结果"""
+
+    def __init__(self):
+        self.result: Optional[dict] = None
+        self.checked_at = 0.0
+        self._client = None
+        self._refreshing: Optional[asyncio.Task] = None
+        # URL -> (ETag, 响应 JSON)
+        self._etags: Dict[str, Tuple[str, dict]] = {}
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                headers={"Accept": "application/vnd.github.v3+json"},
+                timeout=10.0,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._refreshing and not self._refreshing.done():
+            self._refreshing.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get(self) -> dict:
+        """返回缓存结果，过期时在后台重新检查"""
+        if not settings.GITHUB_REPO:
+            return {"has_update": False, "message": "未配置 GitHub 仓库"}
+
+        if time.monotonic() - self.checked_at >= settings.UPDATE_CHECK_TTL_SECONDS:
+            self.trigger_refresh()
+        if self.result is None:
+            return {"has_update": False, "pending": True, "message": "正在检查更新"}
+        return self.result
+
+    def trigger_refresh(self) -> None:
+        """启动一次后台检查 (已有检查进行中时不重复发起)"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self.refresh())
+
+    async def refresh(self) -> None:
+        try:
+            self.result = await self._check()
+        except Exception as e:
+            logger.warning("update check failed: %s", e)
+            # 保留上一次成功的结果
+            if self.result is None or "error" in self.result:
+                self.result = {"has_update": False, "error": str(e)}
+        self.checked_at = time.monotonic()
+
+    async def run(self) -> None:
+        """后台定期刷新"""
+        while True:
+            self.trigger_refresh()
+            await asyncio.shield(self._refreshing)
+            await asyncio.sleep(settings.UPDATE_CHECK_TTL_SECONDS)
+
+    async def _get_json(self, url: str) -> Optional[dict]:
+        """条件 GET，返回 JSON，404 时返回 None"""
+        headers = {}
+        cached = self._etags.get(url)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        response = await self._get_client().get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+
+        data = response.json()
+        if response.headers.get("ETag"):
+            self._etags[url] = (response.headers["ETag"], data)
+        return data
+
+    async def _check(self) -> dict:
+        github_repo = settings.GITHUB_REPO
+        current_version = get_version_info().get("version", "1.0.0")
+
+        # 获取最新 release
+        data = await self._get_json(f"https://api.github.com/repos/{github_repo}/releases/latest")
+        if data is not None:
+            latest_version = data["tag_name"].lstrip("v")
+            return {
+                "has_update": latest_version != current_version,
+                "current_version": current_version,
+                "latest_version": latest_version,
+                "release_notes": (data.get("body") or "")[:500],
+                "update_url": data["html_url"],
+                "type": "release"
+            }
+
+        # 没有 release，检查最新 commit 与本地是否一致
+        data = await self._get_json(f"https://api.github.com/repos/{github_repo}/commits/main")
+        if data is None:
+            return {"has_update": False}
+
+        remote_sha = data["sha"][:7]
+        local_sha = await get_local_commit()
+        return {
+            "has_update": remote_sha != local_sha if local_sha else True,
+            "current_version": current_version,
+            "latest_version": remote_sha,
+            "message": data["commit"]["message"].split('\n')[0][:100],
+            "release_notes": data["commit"]["message"],
+            "update_url": f"https://github.com/{github_repo}",
+            "type": "commit"
+        }
+
+
+update_checker = UpdateChecker()
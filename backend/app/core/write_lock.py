@@ -0,0 +1,153 @@
+"""
+SQLite 单写者协调
+
+SQLite 同一时刻只允许一个写事务。多个 uvicorn worker 各自提交时，等待写锁依赖 SQLite
+的 busy handler (按 1ms ~ 100ms 递增休眠重试)，并发保存时尾延迟很高，超时后返回
+"database is locked"。这里在 DB-API 连接层把写事务排成一个队列:
+- 连接执行第一条写语句前获取写锁，提交或回滚后立即释放；只读查询不受影响
+  (WAL 模式下读与写并行)
+- 写锁由进程内的所有者记录与数据库旁的文件锁 (flock) 组成，等待者在锁释放时立即被唤醒，
+  进程退出时内核自动释放文件锁
+- 同一线程可重入 (异步路由都在事件循环线程中执行)
+- 不支持 flock 的平台 (Windows) 只串行化进程内的写事务，跨进程仍依赖 busy_timeout
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.metrics import DB_WRITE_LOCK_WAIT
+
+# 会开启写事务或需要写锁的语句
+_WRITE_KEYWORDS = frozenset({"INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER", "VACUUM"})
+
+
+class WriteLock:
+    """进程内所有者 + 跨进程文件锁，可以在获取线程之外释放"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._cond = threading.Condition()
+        self._owner: Optional[int] = None
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        me = threading.get_ident()
+        started = time.perf_counter()
+        with self._cond:
+            while self._owner not in (None, me):
+                self._cond.wait()
+            self._depth += 1
+            if self._owner == me:
+                return
+            self._owner = me
+        try:
+            if fcntl and self.path:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._reset()
+            raise
+        DB_WRITE_LOCK_WAIT.observe(time.perf_counter() - started)
+
+    def release(self) -> None:
+        with self._cond:
+            self._depth -= 1
+            if self._depth > 0:
+                return
+        if fcntl and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._reset()
+
+    def _reset(self) -> None:
+        with self._cond:
+            self._depth = 0
+            self._owner = None
+            self._cond.notify()
+
+
+def _is_write(statement: str) -> bool:
+    words = statement.lstrip().split(None, 1)
+    return bool(words) and words[0].upper() in _WRITE_KEYWORDS
+
+
+class _WriteLockCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        self.connection._before_statement(sql)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection._after_statement()
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._before_statement(sql)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection._after_statement()
+
+
+class WriteLockConnection(sqlite3.Connection):
+    """写事务期间持有写锁的连接 (通过 sqlite3.connect(factory=...) 创建)"""
+
+    write_lock: WriteLock
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._holds_write_lock = False
+
+    def cursor(self, factory=_WriteLockCursor):
+        return super().cursor(factory)
+
+    def _before_statement(self, sql: str) -> None:
+        if not self._holds_write_lock and not self.in_transaction and _is_write(sql):
+            self.write_lock.acquire()
+            self._holds_write_lock = True
+
+    def _after_statement(self) -> None:
+        # 未开启事务 (DDL、执行失败) 时立即释放，否则等到提交或回滚
+        if self._holds_write_lock and not self.in_transaction:
+            self._holds_write_lock = False
+            self.write_lock.release()
+
+    def executescript_locked(self, script: str) -> None:
+        """持有写锁执行 SQL 脚本 (executescript 不经过游标，不会自动获取写锁)"""
+        self.write_lock.acquire()
+        try:
+            self.executescript(script)
+        finally:
+            self.write_lock.release()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._after_statement()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._after_statement()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._holds_write_lock:
+                self._holds_write_lock = False
+                self.write_lock.release()
+
+
+def connection_factory(database_path: str) -> type:
+    """返回绑定到数据库文件写锁的连接类"""
+    lock_path = f"{database_path}-writer.lock" if database_path not in ("", ":memory:") else None
+    return type("WriteLockConnection", (WriteLockConnection,), {"write_lock": WriteLock(lock_path)})
@@ -0,0 +1,110 @@
+"""
+流式 ZIP 写入
+
+条目的压缩数据、CRC32 与原始大小由调用方预先计算 (可以在线程池中并行完成)，
+写入器只按顺序生成本地文件头和最后的中央目录，输出为字节串，不需要可定位的输出流:
+- 文件名使用 UTF-8 (通用标志位 11)
+- 大小或偏移超过 4GB、条目超过 65535 个时使用 ZIP64 扩展
+"""
+import struct
+import time
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP_FILECOUNT_LIMIT = 0xFFFF
+_UTF8_FLAG = 0x800
+# 与 zipfile 一致: 创建系统为 Unix，权限 0644
+_CREATE_SYSTEM = 3
+_EXTERNAL_ATTR = 0o100644 << 16
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_DIR = struct.Struct("<4s4B4HL2L5H2L")
+_END_ARCHIVE = struct.Struct("<4s4H2LH")
+_END_ARCHIVE64 = struct.Struct("<4sQ2H2L4Q")
+_END_ARCHIVE64_LOCATOR = struct.Struct("<4sLQL")
+
+
+def compress_entry(parts: Iterable[bytes], level: int = 6) -> Tuple[bytes, int, int]:
+    """逐段 deflate (原始流，无 zlib 头)，返回 (压缩数据, CRC32, 原始字节数)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    out = []
+    for part in parts:
+        crc = zlib.crc32(part, crc)
+        size += len(part)
+        out.append(compressor.compress(part))
+    out.append(compressor.flush())
+    return b"".join(out), crc, size
+
+
+def _dos_datetime(date_time: tuple) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time[:6]
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+class ZipStreamWriter:
+    def __init__(self):
+        self._offset = 0
+        # (文件名, CRC32, 压缩后大小, 原始大小, 本地文件头偏移, DOS 日期, DOS 时间, 压缩方式)
+        self._entries: List[tuple] = []
+
+    def local_header(
+        self,
+        name: str,
+        compress_size: int,
+        crc: int,
+        file_size: int,
+        date_time: Optional[tuple] = None,
+        method: int = ZIP_DEFLATED
+    ) -> bytes:
+        """返回条目的本地文件头，调用方随后输出 compress_size 字节的数据"""
+        encoded = name.encode("utf-8")
+        dosdate, dostime = _dos_datetime(date_time or time.localtime())
+        zip64 = file_size >= _ZIP64_LIMIT or compress_size >= _ZIP64_LIMIT
+        extra = struct.pack("<HHQQ", 1, 16, file_size, compress_size) if zip64 else b""
+        header = _LOCAL_HEADER.pack(
+            b"PK\x03\x04", 45 if zip64 else 20, _UTF8_FLAG, method, dostime, dosdate, crc,
+            _ZIP64_LIMIT if zip64 else compress_size,
+            _ZIP64_LIMIT if zip64 else file_size,
+            len(encoded), len(extra)
+        ) + encoded + extra
+
+        self._entries.append((encoded, crc, compress_size, file_size, self._offset, dosdate, dostime, method))
+        self._offset += len(header) + compress_size
+        return header
+
+    def finish(self) -> bytes:
+        """返回中央目录与结束记录"""
+        records = []
+        for encoded, crc, compress_size, file_size, offset, dosdate, dostime, method in self._entries:
+            # ZIP64 扩展字段按 原始大小、压缩后大小、偏移 的顺序只包含超出限制的值
+            zip64_values = [value for value in (file_size, compress_size, offset) if value >= _ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(zip64_values)}Q", 1, 8 * len(zip64_values), *zip64_values) if zip64_values else b""
+            version = 45 if zip64_values else 20
+            records.append(_CENTRAL_DIR.pack(
+                b"PK\x01\x02", version, _CREATE_SYSTEM, version, 0, _UTF8_FLAG, method, dostime, dosdate, crc,
+                min(compress_size, _ZIP64_LIMIT), min(file_size, _ZIP64_LIMIT),
+                len(encoded), len(extra), 0, 0, 0, _EXTERNAL_ATTR, min(offset, _ZIP64_LIMIT)
+            ) + encoded + extra)
+
+        directory = b"".join(records)
+        count = len(self._entries)
+        start = self._offset
+        if count >= _ZIP_FILECOUNT_LIMIT or start >= _ZIP64_LIMIT or len(directory) >= _ZIP64_LIMIT:
+            end64_offset = start + len(directory)
+            directory += _END_ARCHIVE64.pack(
+                b"PK\x06\x06", _END_ARCHIVE64.size - 12, 45, 45, 0, 0, count, count, len(directory), start
+            )
+            directory += _END_ARCHIVE64_LOCATOR.pack(b"PK\x06\x07", 0, end64_offset, 1)
+            return directory + _END_ARCHIVE.pack(
+                b"PK\x05\x06", 0, 0, _ZIP_FILECOUNT_LIMIT, _ZIP_FILECOUNT_LIMIT, _ZIP64_LIMIT, _ZIP64_LIMIT, 0
+            )
+
+        return directory + _END_ARCHIVE.pack(b"PK\x05\x06", 0, 0, count, count, len(directory), start, 0)
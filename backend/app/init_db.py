@@ -2,8 +2,9 @@
 数据库初始化脚本
 运行: python -m app.init_db
 """
+import asyncio
 import getpass
-from app.models import Base, engine, SessionLocal
+from app.models import SessionLocal, migrate
 from app.services import AuthService
 
 
@@ -14,7 +15,7 @@ def init_database():
     print("=" * 50)
     
     # 创建表
-    Base.metadata.create_all(bind=engine)
+    migrate(force=True)
     print("✓ 数据库表创建完成")
     
     db = SessionLocal()
@@ -43,7 +44,7 @@ def init_database():
         password = getpass.getpass("密码: ")
         confirm = getpass.getpass("确认密码: ")
     
-    user = auth_service.create_user(username, password)
+    asyncio.run(auth_service.create_user(username, password))
     print(f"\n✓ 用户 '{username}' 创建成功")
     print("\n首次登录时需要设置 2FA (两步验证)")
     print("请准备好 Google Authenticator 或类似应用")
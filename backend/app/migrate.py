@@ -0,0 +1,41 @@
+"""
+数据库结构迁移脚本
+运行: python -m app.migrate [--status]
+
+按顺序执行尚未应用的结构迁移，可重复执行。AUTO_MIGRATE=false 时
+服务启动不会修改数据库结构，需要在部署时先运行此脚本。
+"""
+import argparse
+import logging
+import time
+from app.models import migrate, migration_status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库结构迁移")
+    parser.add_argument("--status", action="store_true", help="只显示当前版本与待执行的迁移")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Secure Editor - 数据库结构迁移")
+    print("=" * 50)
+
+    status = migration_status()
+    print(f"当前版本: {status['current']}  最新版本: {status['latest']}")
+    for version, description in status["pending"]:
+        print(f"  待执行 #{version}: {description}")
+
+    if args.status:
+        return
+    if not status["pending"]:
+        print("\n✓ 数据库结构已是最新")
+        return
+
+    logging.basicConfig(level=logging.INFO, format="  %(message)s")
+    started = time.perf_counter()
+    version = migrate(force=True)
+    print(f"\n✓ 已升级到版本 {version}，耗时 {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+存储迁移脚本: 将 SQLite 中内联保存的文件内容迁移到分块 Blob 存储
+运行: python -m app.migrate_storage [--batch-size N] [--orphan-grace-seconds N] [--vacuum]
+
+1. 旧版 files / file_versions 的内联密文 (content_encrypted) 转换为分块
+2. 为已是分块存储、但在内容哈希 (迁移 6) 之前写入的记录计算 content_hash
+3. 密文仍保存在 chunks 表中的分块写入 Blob 存储后端
+4. 清理 Blob 存储中没有对应记录的孤立 Blob: 只删除超过 --orphan-grace-seconds (默认 1 小时)
+   未写入的 Blob，正在保存的内容 (Blob 已写入、分块记录尚未提交) 不受影响，服务运行时也可以执行
+
+可重复执行，中断后再次运行会从未迁移的记录继续。
+"""
+import argparse
+from sqlalchemy import text, update
+from app.core.crypto import content_hash
+from app.models import SessionLocal, File, FileVersion, Chunk, migrate, engine
+from app.services.chunk_store import ORPHAN_GRACE_SECONDS, load_chunk_ids
+from app.services.file_service import FileService
+from app.storage import get_blob_storage
+
+
+def migrate_inline_content(db, model, batch_size: int) -> int:
+    """将内联密文转换为分块存储，返回迁移数量"""
+    file_service = FileService(db)
+    migrated = 0
+    while True:
+        rows = db.query(model).filter(
+            model.content_chunks.is_(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+
+        for row in rows:
+            file_service.convert_to_chunks(row)
+        db.commit()
+        db.expunge_all()
+        migrated += len(rows)
+        print(f"  {model.__tablename__}: 已迁移 {migrated} 条")
+    return migrated
+
+
+def backfill_content_hashes(db, model, batch_size: int) -> int:
+    """为缺少内容哈希的分块记录计算哈希，返回回填数量"""
+    chunks = FileService(db).chunks
+    backfilled = 0
+    while True:
+        rows = db.query(model.id, model.content_chunks).filter(
+            model.content_chunks.isnot(None),
+            model.content_hash.is_(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+
+        for row_id, chunk_ids in rows:
+            digest = content_hash(chunks.read(load_chunk_ids(chunk_ids)))
+            # 期间被保存的记录已由保存写入新内容的哈希
+            db.execute(update(model).where(
+                model.id == row_id, model.content_chunks == chunk_ids
+            ).values(content_hash=digest))
+        db.commit()
+        backfilled += len(rows)
+        print(f"  {model.__tablename__}: 已回填哈希 {backfilled} 条")
+    return backfilled
+
+
+def migrate_chunk_blobs(db, batch_size: int) -> int:
+    """将 chunks 表中的密文写入 Blob 存储，返回迁移数量"""
+    storage = get_blob_storage()
+    migrated = 0
+    while True:
+        rows = db.query(Chunk.id, Chunk.data).filter(
+            Chunk.data.isnot(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+
+        for cid, data in rows:
+            storage.put(cid, data)
+        db.query(Chunk).filter(
+            Chunk.id.in_([cid for cid, _ in rows])
+        ).update({Chunk.data: None}, synchronize_session=False)
+        db.commit()
+        migrated += len(rows)
+        print(f"  chunks: 已写入 Blob 存储 {migrated} 个")
+    return migrated
+
+
+def migrate_storage(batch_size: int = 200, vacuum: bool = False, orphan_grace_seconds: float = ORPHAN_GRACE_SECONDS):
+    """执行存储迁移"""
+    print("=" * 50)
+    print("Secure Editor - 存储迁移")
+    print("=" * 50)
+
+    migrate(force=True)
+    db = SessionLocal()
+    try:
+        print("\n>>> 转换内联内容为分块...")
+        migrate_inline_content(db, File, batch_size)
+        migrate_inline_content(db, FileVersion, batch_size)
+
+        print("\n>>> 回填内容哈希...")
+        backfill_content_hashes(db, File, batch_size)
+        backfill_content_hashes(db, FileVersion, batch_size)
+
+        if get_blob_storage() is None:
+            print("\n! 当前为内联存储模式 (STORAGE_BACKEND=database)，跳过 Blob 迁移")
+        else:
+            print("\n>>> 写入 Blob 存储...")
+            migrate_chunk_blobs(db, batch_size)
+            removed = FileService(db).chunks.sweep_orphans(orphan_grace_seconds)
+            print(f"✓ 清理孤立 Blob {removed} 个")
+    finally:
+        db.close()
+
+    if vacuum:
+        print("\n>>> 压缩数据库...")
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # 同时切换为增量自动清理，之后回收站清理可以逐步归还空闲页
+            conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+
+    print("\n迁移完成!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="迁移文件内容到分块 Blob 存储")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的记录数")
+    parser.add_argument(
+        "--orphan-grace-seconds", type=float, default=ORPHAN_GRACE_SECONDS,
+        help="只清理超过该秒数未写入的孤立 Blob (更新的 Blob 可能属于尚未提交的保存)"
+    )
+    parser.add_argument("--vacuum", action="store_true", help="迁移后执行 VACUUM 回收数据库空间")
+    args = parser.parse_args()
+    migrate_storage(batch_size=args.batch_size, vacuum=args.vacuum, orphan_grace_seconds=args.orphan_grace_seconds)
@@ -1,3 +1,6 @@
 from .base import Base, engine, SessionLocal, get_db
 from .user import User
-from .file import File, FileVersion
+from .file import File, FileVersion, FileChange
+from .chunk import Chunk, ChunkPin
+from .backup import Backup
+from .migrations import migrate, migration_status, SCHEMA_VERSION
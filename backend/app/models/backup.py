@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class Backup(Base):
+    """导出备份登记: 记录每个压缩包覆盖的变更范围，增量 / 差异导出以此为基准"""
+    __tablename__ = "backups"
+    
+    # 写入压缩包清单 (_manifest.json) 的备份 ID
+    id = Column(String(32), primary_key=True)
+    name = Column(String(100), nullable=True, index=True)
+    # full / incremental / differential
+    mode = Column(String(20), nullable=False)
+    
+    # 上一级备份 (导入时按此串联)；差异备份的上一级即基准完整备份
+    parent_id = Column(String(32), nullable=True)
+    # 所属备份链的完整备份
+    base_id = Column(String(32), nullable=True)
+    
+    # 覆盖的变更范围 (file_changes.seq]，以及导出时最新的版本 ID (版本历史的增量起点)
+    from_seq = Column(Integer, nullable=False, default=0)
+    to_seq = Column(Integer, nullable=False, default=0)
+    to_version_id = Column(Integer, nullable=False, default=0)
+    include_versions = Column(Boolean, default=False)
+    
+    file_count = Column(Integer, default=0)
+    deleted_count = Column(Integer, default=0)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
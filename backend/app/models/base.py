@@ -1,13 +1,43 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.profiler import capture_sql
 
+
+def _sqlite_connect_args() -> dict:
+    connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}
+    if settings.SQLITE_WRITE_LOCK:
+        from app.core.write_lock import connection_factory
+        connect_args["factory"] = connection_factory(make_url(settings.DATABASE_URL).database or "")
+    return connect_args
+
+
+is_sqlite = settings.DATABASE_URL.startswith("sqlite")
+
+# SQLite 连接开销很小: 连接池不设溢出上限，流式响应等长时间占用连接时，
+# 其他请求不会在事件循环中阻塞等待空闲连接
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    connect_args=_sqlite_connect_args() if is_sqlite else {},
+    **({"max_overflow": -1} if is_sqlite else {})
 )
 
+if is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: 读不阻塞写、写不阻塞读；WAL 下 NORMAL 只在检查点时 fsync
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+# SQL 耗时与每请求查询数统计，剖析时记录 SQL 语句
+instrument_engine(engine)
+capture_sql(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -20,3 +50,4 @@ def get_db():
         yield db
     finally:
         db.close()
+
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, Text
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class Chunk(Base):
+    """内容寻址的加密分块 (按带密钥的内容 ID 去重)"""
+    __tablename__ = "chunks"
+    
+    # HMAC-SHA256(明文) 十六进制，不泄露明文
+    id = Column(String(64), primary_key=True)
+    
+    # 确定性加密后的分块 (nonce 由 id 派生，不单独存储)
+    # 为空表示密文保存在 Blob 存储后端 (FILES_STORAGE_PATH)，key 即 id
+    data = Column(LargeBinary, nullable=True)
+    
+    # 大小信息
+    size = Column(Integer, nullable=False)  # 明文字节数
+    stored_size = Column(Integer, nullable=False)  # 密文字节数
+    
+    # 被 File / FileVersion 引用的次数，为 0 时可被回收
+    ref_count = Column(Integer, default=0, nullable=False, index=True)
+    
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ChunkPin(Base):
+    """长时间读取 (如全部导出) 期间固定的分块: 每个分块增加一次引用，读取结束时释放
+
+    进程在读取中途退出时遗留的记录由垃圾回收在超时后释放。
+    """
+    __tablename__ = "chunk_pins"
+    
+    id = Column(Integer, primary_key=True)
+    # 固定的分块 ID (JSON 列表，不重复)
+    chunk_ids = Column(Text, nullable=False, default="[]")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
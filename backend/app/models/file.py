@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -6,14 +6,26 @@ from .base import Base
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        # 文件列表: WHERE is_deleted = 0 ORDER BY sort_order, name
+        Index("ix_files_is_deleted_sort_order_name", "is_deleted", "sort_order", "name"),
+        # 文件夹: WHERE is_deleted = 0 AND path >= '/a/' AND path < '/a0' (含大小，统计时只读索引)
+        Index("ix_files_is_deleted_path", "is_deleted", "path", "content_size"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     path = Column(String(1000), nullable=False, index=True)  # 虚拟路径
     
-    # 加密后的内容
+    # 加密后的内容 (旧版内联存储，新内容写入分块存储)
     content_encrypted = Column(Text, nullable=True)
     
+    # 分块存储: 有序分块 ID 列表 (JSON) 与明文字节数
+    content_chunks = Column(Text, nullable=True)
+    content_size = Column(Integer, default=0)
+    # 内容的 HMAC-SHA256 (判断保存内容是否变化)，旧数据为空
+    content_hash = Column(String(64), nullable=True)
+    
     # 文件元信息
     language = Column(String(50), default="plaintext")
     encoding = Column(String(20), default="utf-8")
@@ -35,12 +47,22 @@ class File(Base):
 
 class FileVersion(Base):
     __tablename__ = "file_versions"
+    __table_args__ = (
+        # 版本历史: WHERE file_id = ? ORDER BY version_number
+        Index("ix_file_versions_file_id_version_number", "file_id", "version_number"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     file_id = Column(Integer, ForeignKey("files.id"), nullable=False)
     
-    # 加密后的内容快照
-    content_encrypted = Column(Text, nullable=False)
+    # 加密后的内容快照 (旧版内联存储，分块存储的版本为空字符串)
+    content_encrypted = Column(Text, nullable=False, default="")
+    
+    # 分块存储: 有序分块 ID 列表 (JSON) 与明文字节数
+    content_chunks = Column(Text, nullable=True)
+    content_size = Column(Integer, default=0)
+    # 内容的 HMAC-SHA256 (相同内容的连续快照只保存一次)，旧数据为空
+    content_hash = Column(String(64), nullable=True)
     
     # 版本信息
     version_number = Column(Integer, nullable=False)
@@ -51,3 +73,21 @@ class FileVersion(Base):
     
     # 关联
     file = relationship("File", back_populates="versions")
+
+
+class FileChange(Base):
+    """文件变更日志: 每个文件只保留最新一条记录，seq 按提交顺序单调递增"""
+    __tablename__ = "file_changes"
+    __table_args__ = (
+        Index("ix_file_changes_file_id", "file_id"),
+        # AUTOINCREMENT: 压缩删除旧记录后 seq 也不会被复用
+        {"sqlite_autoincrement": True},
+    )
+    
+    seq = Column(Integer, primary_key=True)
+    # 不使用外键: 永久删除后仍需保留删除记录
+    file_id = Column(Integer, nullable=False)
+    # create / save / rename / update / reorder / delete / restore / purge
+    operation = Column(String(20), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,209 @@
+"""
+数据库结构迁移
+
+迁移按版本号顺序执行，结构版本保存在 schema_version 表中。启动时只读取
+一次版本号，与最新版本一致时不做任何结构操作。
+
+- 每个迁移的结构变更与版本号更新在同一个事务中提交 (SQLite 支持事务性 DDL)，
+  失败时整体回滚，下次启动重试
+- 索引在结构事务之后逐个以独立的短事务创建，避免长时间持有写锁阻塞在线保存
+- 所有操作都是幂等的 (IF NOT EXISTS / 缺失时才添加)，中断后可以安全重跑
+
+命令行: python -m app.migrate [--status]
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings, ensure_data_dirs
+from .base import Base
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    # 在结构事务中执行 (conn 为已开启事务的连接)
+    upgrade: Optional[Callable] = None
+    # (索引名, 表名, 列) 在结构事务之后逐个创建
+    indexes: List[Tuple[str, str, Tuple[str, ...]]] = field(default_factory=list)
+
+
+def _migration_engine():
+    """迁移专用引擎: SQLite 下显式 BEGIN IMMEDIATE，使 DDL 处于事务中并串行化并发迁移"""
+    if not settings.DATABASE_URL.startswith("sqlite"):
+        return create_engine(settings.DATABASE_URL, poolclass=NullPool)
+
+    # 多个 worker 同时启动时，后到的迁移等待先到的完成
+    engine = create_engine(
+        settings.DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}
+    )
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        # pysqlite 默认不会在 DDL 前开启事务，改为由下方的 begin 事件显式控制
+        dbapi_connection.isolation_level = None
+        # 新数据库在建表前设置，删除数据后可逐步归还空闲页 (已有数据库需执行一次 VACUUM 才生效)
+        dbapi_connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def add_column(conn, table: str, column: str, ddl_type: str) -> None:
+    """为已有表添加列 (已存在时跳过)"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_tables(conn) -> None:
+    # 新数据库直接按当前模型建表；已有数据库只补齐缺失的表
+    Base.metadata.create_all(bind=conn)
+
+
+def _chunk_storage(conn) -> None:
+    for table in ("files", "file_versions"):
+        add_column(conn, table, "content_chunks", "TEXT")
+        add_column(conn, table, "content_size", "INTEGER")
+
+
+def _token_version(conn) -> None:
+    add_column(conn, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _content_hash(conn) -> None:
+    # 无法在 SQL 中计算 HMAC，旧数据保持为空: 下次保存或创建快照时写入，
+    # 或由 python -m app.migrate_storage 一次回填
+    for table in ("files", "file_versions"):
+        add_column(conn, table, "content_hash", "VARCHAR(64)")
+
+
+def _change_log(conn) -> None:
+    Base.metadata.create_all(bind=conn, tables=[Base.metadata.tables["file_changes"]])
+    # 已有文件各记录一条变更，since=0 即可获得完整列表
+    conn.execute(text(
+        "INSERT INTO file_changes (file_id, operation, created_at) "
+        "SELECT id, 'create', CURRENT_TIMESTAMP FROM files "
+        "WHERE id NOT IN (SELECT file_id FROM file_changes) ORDER BY id"
+    ))
+
+
+def _backup_registry(conn) -> None:
+    Base.metadata.create_all(bind=conn, tables=[Base.metadata.tables["backups"]])
+
+
+def _chunk_pins(conn) -> None:
+    Base.metadata.create_all(bind=conn, tables=[Base.metadata.tables["chunk_pins"]])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "初始结构", upgrade=_create_tables),
+    Migration(2, "分块存储 (chunks 表与 content_chunks/content_size 列)", upgrade=_chunk_storage),
+    Migration(3, "版本历史与文件列表的复合索引", indexes=[
+        ("ix_file_versions_file_id_version_number", "file_versions", ("file_id", "version_number")),
+        ("ix_files_is_deleted_sort_order_name", "files", ("is_deleted", "sort_order", "name")),
+    ]),
+    Migration(4, "用户令牌版本 (登出与修改密码后使已签发令牌失效)", upgrade=_token_version),
+    Migration(5, "文件变更日志 (增量同步)", upgrade=_change_log),
+    Migration(6, "文件与版本的内容哈希 (跳过未变化的保存与重复快照)", upgrade=_content_hash),
+    Migration(7, "文件夹路径前缀索引 (范围扫描、子树统计)", indexes=[
+        ("ix_files_is_deleted_path", "files", ("is_deleted", "path", "content_size")),
+    ]),
+    Migration(8, "导出备份登记 (增量与差异导出)", upgrade=_backup_registry),
+    Migration(9, "导出期间固定分块 (不被垃圾回收删除)", upgrade=_chunk_pins),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn) -> int:
+    """读取当前数据库的结构版本 (未记录时为 0)"""
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def _set_schema_version(conn, version: int) -> None:
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+
+
+def pending_migrations(current: int) -> List[Migration]:
+    return [migration for migration in MIGRATIONS if migration.version > current]
+
+
+def _apply(engine, migration: Migration) -> None:
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        # 其他进程可能已经完成了该迁移
+        if get_schema_version(conn) >= migration.version:
+            return
+        if migration.upgrade:
+            migration.upgrade(conn)
+        if not migration.indexes:
+            _set_schema_version(conn, migration.version)
+
+    for name, table, columns in migration.indexes:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+            ))
+
+    if migration.indexes:
+        with engine.begin() as conn:
+            _set_schema_version(conn, max(migration.version, get_schema_version(conn)))
+
+    logger.info("migration %s applied in %.2fs: %s", migration.version, time.perf_counter() - started, migration.description)
+
+
+def migrate(force: bool = False) -> int:
+    """将数据库结构升级到最新版本，返回升级后的版本号
+
+    force 为 True 时忽略 AUTO_MIGRATE (命令行工具显式执行迁移)。
+    """
+    ensure_data_dirs()
+    engine = _migration_engine()
+    try:
+        with engine.connect() as conn:
+            current = get_schema_version(conn)
+            conn.commit()
+        if current >= SCHEMA_VERSION:
+            return current
+
+        if not (force or settings.AUTO_MIGRATE):
+            raise RuntimeError(
+                f"数据库结构版本 {current} 落后于 {SCHEMA_VERSION}，请先运行 python -m app.migrate"
+            )
+
+        for migration in pending_migrations(current):
+            _apply(engine, migration)
+        return SCHEMA_VERSION
+    finally:
+        engine.dispose()
+
+
+def migration_status() -> dict:
+    """当前结构版本与待执行的迁移"""
+    ensure_data_dirs()
+    engine = _migration_engine()
+    try:
+        with engine.connect() as conn:
+            current = get_schema_version(conn)
+            conn.commit()
+    finally:
+        engine.dispose()
+    return {
+        "current": current,
+        "latest": SCHEMA_VERSION,
+        "pending": [(m.version, m.description) for m in pending_migrations(current)],
+    }
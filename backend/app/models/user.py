@@ -14,6 +14,9 @@ class User(Base):
     totp_secret = Column(String(32), nullable=True)
     totp_enabled = Column(Boolean, default=False)
     
+    # 令牌版本: 登出或修改密码时递增，使之前签发的令牌失效
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # 时间戳
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
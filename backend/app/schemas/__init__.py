@@ -5,12 +5,24 @@ from .auth import (
     TokenRefreshResponse,
     Setup2FAResponse,
     Verify2FARequest,
+    ChangePasswordRequest,
 )
 from .file import (
     FileCreate,
     FileUpdate,
     FileResponse,
     FileListResponse,
+    FileChangeResponse,
+    FileChangesResponse,
+    FolderResponse,
+    FolderListResponse,
+    FolderMoveRequest,
+    FileBatchGetRequest,
+    FileBatchOperation,
+    FileBatchRequest,
+    FileBatchResult,
+    FileBatchResponse,
+    BackupResponse,
     FileSaveRequest,
     FileVersionResponse,
     FileRestoreRequest,
@@ -30,5 +30,10 @@ class Setup2FAResponse(BaseModel):
     qr_code: str  # base64 encoded QR code image
 
 
+class ChangePasswordRequest(BaseModel):
+    old_password: str = Field(..., min_length=1)
+    new_password: str = Field(..., min_length=8)
+
+
 class Verify2FARequest(BaseModel):
     totp_code: str = Field(..., min_length=6, max_length=6)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime, timezone
 
 
@@ -55,6 +55,91 @@ class FileListResponse(BaseModel):
         }
 
 
+class FileChangeResponse(BaseModel):
+    seq: int
+    file_id: int
+    operation: str
+    file: Optional[FileListResponse] = None  # 永久删除后为空
+
+
+class FileChangesResponse(BaseModel):
+    seq: int  # 下一次请求使用的 since
+    has_more: bool
+    reset: bool = False  # 为 true 时客户端应先清空本地列表
+    changes: List[FileChangeResponse]
+
+
+class FolderResponse(BaseModel):
+    name: str
+    path: str
+    file_count: int  # 子树中的文件数 (不含回收站)
+    total_size: int  # 子树中文件内容的总字节数
+
+
+class FolderListResponse(BaseModel):
+    path: str
+    file_count: int
+    total_size: int
+    folders: List[FolderResponse]  # 直接子文件夹
+    files: List[FileListResponse]  # 直接位于该文件夹下的文件
+
+
+class FolderMoveRequest(BaseModel):
+    from_path: str = Field(..., min_length=1, max_length=1000)
+    to_path: str = Field(..., min_length=1, max_length=1000)
+
+
+class FileBatchGetRequest(BaseModel):
+    file_ids: List[int] = Field(..., min_length=1, max_length=100)
+
+
+class FileBatchOperation(BaseModel):
+    # delete: 移入回收站  restore: 从回收站恢复  purge: 永久删除
+    # move: 修改名称和/或路径  set_language: 修改语言
+    op: Literal["delete", "restore", "purge", "move", "set_language"]
+    file_id: int
+    name: Optional[str] = Field(None, min_length=1, max_length=255)
+    path: Optional[str] = Field(None, max_length=1000)
+    language: Optional[str] = Field(None, max_length=50)
+
+
+class FileBatchRequest(BaseModel):
+    operations: List[FileBatchOperation] = Field(..., max_length=10000)
+
+
+class FileBatchResult(BaseModel):
+    op: str
+    file_id: int
+    ok: bool
+    error: Optional[str] = None
+
+
+class FileBatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[FileBatchResult]  # 与请求中的 operations 一一对应
+
+
+class BackupResponse(BaseModel):
+    id: str
+    name: Optional[str] = None
+    mode: str  # full / incremental / differential
+    parent_id: Optional[str] = None
+    base_id: Optional[str] = None
+    from_seq: int  # 覆盖的变更范围 (from_seq, to_seq]
+    to_seq: int
+    include_versions: bool
+    file_count: int
+    deleted_count: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+        json_encoders = {
+            datetime: lambda v: v.replace(tzinfo=timezone.utc).isoformat() if v.tzinfo is None else v.isoformat()
+        }
+
+
 class FileVersionResponse(BaseModel):
     id: int
     version_number: int
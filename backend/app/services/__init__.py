@@ -1,2 +1,4 @@
 from .auth_service import AuthService
 from .file_service import FileService
+from .export_service import ExportService
+from .import_service import ImportService
@@ -1,12 +1,10 @@
-import pyotp
-import qrcode
-import io
-import base64
 from datetime import datetime
 from typing import Optional, Tuple
 from sqlalchemy.orm import Session
 from app.models import User
-from app.core.security import verify_password, get_password_hash, create_tokens, verify_token
+from app.core.cpu_pool import run_cpu
+from app.core.token_cache import token_cache
+from app.core.security import verify_password, get_password_hash, render_qr_code, create_tokens, verify_token
 
 
 class AuthService:
@@ -21,12 +19,18 @@ class AuthService:
         """根据 ID 获取用户"""
         return self.db.query(User).filter(User.id == user_id).first()
     
-    def authenticate(self, username: str, password: str) -> Optional[User]:
-        """验证用户名密码"""
+    def _release_connection(self) -> None:
+        """结束当前读事务，等待进程池期间不占用连接池中的连接"""
+        self.db.commit()
+    
+    async def authenticate(self, username: str, password: str) -> Optional[User]:
+        """验证用户名密码 (Argon2 校验在进程池中执行)"""
         user = self.get_user_by_username(username)
         if not user:
             return None
-        if not verify_password(password, user.password_hash):
+        password_hash = user.password_hash
+        self._release_connection()
+        if not await run_cpu(verify_password, password, password_hash):
             return None
         return user
     
@@ -39,12 +43,14 @@ class AuthService:
             
         if not user or not user.totp_secret:
             return False
+        
+        import pyotp
         totp = pyotp.TOTP(user.totp_secret)
         return totp.verify(code)
     
-    def login(self, username: str, password: str, totp_code: Optional[str] = None) -> dict:
+    async def login(self, username: str, password: str, totp_code: Optional[str] = None) -> dict:
         """登录流程"""
-        user = self.authenticate(username, password)
+        user = await self.authenticate(username, password)
         if not user:
             return {"error": "用户名或密码错误"}
         
@@ -63,19 +69,23 @@ class AuthService:
         if not self.verify_totp(user, totp_code):
             return {"error": "验证码错误"}
         
-        # 更新最后登录时间
+        return self.issue_tokens(user)
+    
+    def issue_tokens(self, user: User) -> dict:
+        """为已完成验证的用户生成令牌，并更新最后登录时间"""
         user.last_login = datetime.utcnow()
         self.db.commit()
         
-        # 生成令牌
-        access_token, refresh_token = create_tokens(user.id)
+        access_token, refresh_token = create_tokens(user.id, user.token_version)
         return {
             "access_token": access_token,
             "refresh_token": refresh_token
         }
     
-    def setup_2fa(self, user_id: int) -> Tuple[str, str]:
+    async def setup_2fa(self, user_id: int) -> Tuple[str, str]:
         """设置 2FA，返回 (secret, qr_code_base64)"""
+        import pyotp
+        
         user = self.get_user_by_id(user_id)
         if not user:
             raise ValueError("用户不存在")
@@ -85,18 +95,10 @@ class AuthService:
         user.totp_secret = secret
         self.db.commit()
         
-        # 生成 QR 码
+        # 生成 QR 码 (在进程池中渲染 PNG)
         totp = pyotp.TOTP(secret)
         uri = totp.provisioning_uri(name=user.username, issuer_name="SecureEditor")
-        
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(uri)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+        qr_base64 = await run_cpu(render_qr_code, uri)
         
         return secret, qr_base64
     
@@ -121,15 +123,42 @@ class AuthService:
         
         user_id = int(payload.get("sub"))
         user = self.get_user_by_id(user_id)
-        if not user:
+        if not user or payload.get("ver", 0) != user.token_version:
             return None
         
-        access_token, _ = create_tokens(user_id)
+        access_token, _ = create_tokens(user_id, user.token_version)
         return access_token
     
-    def create_user(self, username: str, password: str) -> User:
+    def revoke_tokens(self, user_id: int) -> None:
+        """使用户已签发的所有令牌失效 (登出)"""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return
+        user.token_version += 1
+        self.db.commit()
+        token_cache.evict_user(user_id)
+    
+    async def change_password(self, user_id: int, old_password: str, new_password: str) -> Optional[dict]:
+        """修改密码，使旧令牌失效并返回新令牌；原密码错误时返回 None"""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return None
+        password_hash = user.password_hash
+        self._release_connection()
+        if not await run_cpu(verify_password, old_password, password_hash):
+            return None
+        
+        new_hash = await run_cpu(get_password_hash, new_password)
+        user.password_hash = new_hash
+        user.token_version += 1
+        self.db.commit()
+        token_cache.evict_user(user_id)
+        return self.issue_tokens(user)
+    
+    async def create_user(self, username: str, password: str) -> User:
         """创建用户"""
-        password_hash = get_password_hash(password)
+        self._release_connection()
+        password_hash = await run_cpu(get_password_hash, password)
         user = User(username=username, password_hash=password_hash)
         self.db.add(user)
         self.db.commit()
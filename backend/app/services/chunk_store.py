@@ -0,0 +1,307 @@
+import json
+from collections import Counter
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import Chunk, ChunkPin, File, FileVersion
+from app.core.chunking import split_chunks
+from app.core.crypto import chunk_id, encrypt_chunk, decrypt_chunk
+from app.core.crypto_pool import get_executor
+from app.storage import get_blob_storage
+
+# SQLite 单条语句的参数数量有限，IN 查询分批执行
+_QUERY_BATCH_SIZE = 500
+# 清理孤立 Blob 时跳过最近写入的 Blob (其分块记录可能尚未提交)
+ORPHAN_GRACE_SECONDS = 3600
+# 固定超过该时间仍未释放 (进程中途退出) 时由垃圾回收释放
+PIN_MAX_AGE_SECONDS = 24 * 3600
+
+
+def dump_chunk_ids(ids: List[str]) -> str:
+    """序列化分块 ID 列表"""
+    return json.dumps(ids, separators=(",", ":"))
+
+
+def load_chunk_ids(value: Optional[str]) -> List[str]:
+    """反序列化分块 ID 列表"""
+    return json.loads(value) if value else []
+
+
+class ChunkStore:
+    """内容寻址的分块存储，按引用计数共享分块"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.storage = get_blob_storage()
+
+    def put(self, content: str) -> Tuple[List[str], int]:
+        """写入内容并增加分块引用，返回 (分块 ID 列表, 明文字节数)
+
+        先增加所有分块的引用: 第一条写语句之后事务持有写锁直到提交，垃圾回收不能在其间
+        删除记录，之后在事务内复核哪些分块仍需插入。加密和写入 Blob 在获取写锁之前完成，
+        复核时发现刚被回收的分块才在持锁期间补写。
+        """
+        data = content.encode("utf-8")
+        pieces = split_chunks(data)
+        ids = [chunk_id(piece) for piece in pieces]
+        plaintext = dict(zip(ids, pieces))
+        counts = Counter(ids)
+
+        # 只加密尚未存储过的分块
+        prepared = {
+            cid: self._encrypt(cid, plaintext[cid])
+            for cid in set(counts) - self._existing_ids(list(counts))
+        }
+
+        self._adjust(counts)
+        missing = set(counts) - self._existing_ids(list(counts))
+        rows = []
+        for cid in missing:
+            ciphertext = prepared.get(cid) or self._encrypt(cid, plaintext[cid])
+            if self.storage is not None:
+                # 持锁时确认 Blob 仍然存在 (加密之后可能被垃圾回收删除)
+                self.storage.put(cid, ciphertext)
+            rows.append({
+                "id": cid,
+                "data": None if self.storage is not None else ciphertext,
+                "size": len(plaintext[cid]),
+                "stored_size": len(ciphertext),
+                "ref_count": counts[cid],
+            })
+        if rows:
+            table = Chunk.__table__
+            stmt = sqlite_insert(table)
+            self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[table.c.id],
+                    set_={"ref_count": table.c.ref_count + stmt.excluded.ref_count}
+                ),
+                rows
+            )
+        return ids, len(data)
+
+    def _encrypt(self, cid: str, piece: bytes) -> bytes:
+        ciphertext = encrypt_chunk(cid, piece)
+        if self.storage is not None:
+            self.storage.put(cid, ciphertext)
+        return ciphertext
+
+    def read(self, ids: List[str]) -> bytes:
+        """按顺序读取并解密分块"""
+        if not ids:
+            return b""
+
+        stored = self._load(list(set(ids)))
+        plaintext = {}
+        for cid in stored:
+            plaintext[cid] = decrypt_chunk(cid, stored[cid])
+        return b"".join(plaintext[cid] for cid in ids)
+
+    def iter_read(self, ids: List[str]) -> Iterator[bytes]:
+        """按顺序流式解密分块
+
+        Blob 存储中的密文读入同一个复用的缓冲区，通过 memoryview 直接解密，
+        峰值内存约为一个分块的大小，与文件总大小无关。
+        """
+        buffer = bytearray()
+        for i in range(0, len(ids), _QUERY_BATCH_SIZE):
+            batch = ids[i:i + _QUERY_BATCH_SIZE]
+            rows = {
+                cid: (data, stored_size)
+                for cid, data, stored_size in self.db.query(
+                    Chunk.id, Chunk.data, Chunk.stored_size
+                ).filter(Chunk.id.in_(set(batch))).all()
+            }
+            for cid in batch:
+                if cid not in rows:
+                    raise ValueError(f"分块缺失: {cid}")
+                data, stored_size = rows[cid]
+                if data is None:
+                    if self.storage is None:
+                        raise ValueError(f"分块 {cid} 保存在 Blob 存储中，但当前为内联存储模式")
+                    if len(buffer) < stored_size:
+                        buffer = bytearray(stored_size)
+                    view = memoryview(buffer)[:stored_size]
+                    self.storage.read_into(cid, view)
+                    data = view
+                yield decrypt_chunk(cid, data)
+
+    def submit_decrypt(self, ids: Iterable[str]) -> Dict[str, Future]:
+        """读取分块密文 (每 500 个一次查询) 并提交到线程池并行解密，返回 分块 ID -> 明文 Future
+
+        Blob 存储中的密文在工作线程中读取。
+        """
+        stored = self.load_ciphertexts(list(set(ids)))
+        executor = get_executor()
+        return {cid: executor.submit(self.decrypt_stored, cid, data) for cid, data in stored.items()}
+
+    def decrypt_stored(self, cid: str, data: Optional[bytes]) -> bytes:
+        """解密 load_ciphertexts 返回的密文 (不访问数据库会话，可以在工作线程中调用)"""
+        return decrypt_chunk(cid, self._get_blob(cid) if data is None else data)
+
+    def retain(self, ids: Iterable[str]) -> None:
+        """增加分块引用"""
+        self._adjust(Counter(ids))
+
+    def release(self, ids: Iterable[str]) -> None:
+        """减少分块引用 (分块在垃圾回收时才删除)"""
+        self._adjust({cid: -count for cid, count in Counter(ids).items()})
+
+    def pin(self, pin: ChunkPin, ids: Iterable[str]) -> None:
+        """固定分块 (每个分块增加一次引用)，记录在 pin 中，由调用方提交
+
+        调用方应在同一个写事务中读取 ids，期间分块不会被回收。
+        """
+        unique = sorted(set(ids))
+        self._adjust({cid: 1 for cid in unique})
+        pin.chunk_ids = dump_chunk_ids(unique)
+
+    def unpin(self, pin_id: int) -> None:
+        """释放固定的分块并删除记录 (已被释放时不做任何事)，由调用方提交"""
+        table = ChunkPin.__table__
+        row = self.db.execute(delete(table).where(table.c.id == pin_id).returning(table.c.chunk_ids)).first()
+        if row:
+            self.release(load_chunk_ids(row[0]))
+
+    def release_stale_pins(self) -> int:
+        """释放超过 PIN_MAX_AGE_SECONDS 的固定，返回释放数量 (由调用方提交)"""
+        table = ChunkPin.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=PIN_MAX_AGE_SECONDS)
+        rows = self.db.execute(delete(table).where(table.c.created_at < cutoff).returning(table.c.chunk_ids)).all()
+        for (chunk_ids,) in rows:
+            self.release(load_chunk_ids(chunk_ids))
+        return len(rows)
+
+    def collect_garbage(self, limit: Optional[int] = None) -> int:
+        """删除不再被引用的分块，返回删除数量 (limit: 单次最多删除的数量，用于分批回收)"""
+        self.release_stale_pins()
+        table = Chunk.__table__
+        candidates = select(table.c.id).where(table.c.ref_count <= 0)
+        if limit:
+            candidates = candidates.limit(limit)
+        # 条件在删除时再次判断，只有确实删除的记录才删除 Blob
+        ids = self.db.execute(
+            delete(table).where(table.c.id.in_(candidates), table.c.ref_count <= 0).returning(table.c.id)
+        ).scalars().all()
+        self.db.commit()
+
+        # 数据库提交后再删除 Blob，避免事务回滚后引用丢失的密文
+        if self.storage is not None:
+            self._delete_blobs(ids)
+        return len(ids)
+
+    def _delete_blobs(self, ids: List[str]) -> None:
+        """删除已删除记录的 Blob
+
+        先执行一条写语句获取写锁: 持锁期间 put() 不能重新插入这些分块，
+        已被重新插入的分块保留 Blob。
+        """
+        table = Chunk.__table__
+        for i in range(0, len(ids), _QUERY_BATCH_SIZE):
+            batch = ids[i:i + _QUERY_BATCH_SIZE]
+            self.db.execute(delete(table).where(table.c.id.in_(batch), table.c.ref_count <= 0))
+            alive = self._existing_ids(batch)
+            for cid in batch:
+                if cid not in alive:
+                    self.storage.delete(cid)
+            self.db.commit()
+
+    def sweep_orphans(self, min_age_seconds: float = ORPHAN_GRACE_SECONDS) -> int:
+        """删除 Blob 存储中没有对应分块记录的孤立 Blob (例如写入后事务回滚)
+
+        put() 先写 Blob 再在事务中插入分块记录，提交前 Blob 看起来也是孤立的；
+        只删除超过 min_age_seconds 未写入的 Blob，服务运行时也可以安全执行。
+        """
+        if self.storage is None:
+            return 0
+        cutoff = time.time() - min_age_seconds
+        keys = list(self.storage.keys())
+        known = self._existing_ids(keys)
+        removed = 0
+        for key in keys:
+            if key in known:
+                continue
+            try:
+                if self.storage.modified_at(key) > cutoff:
+                    continue
+            except KeyError:
+                continue
+            self.storage.delete(key)
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        """统计存储占用与去重比例"""
+        chunk_count, unique_bytes, stored_bytes = self.db.query(
+            func.count(Chunk.id),
+            func.coalesce(func.sum(Chunk.size), 0),
+            func.coalesce(func.sum(Chunk.stored_size), 0),
+        ).one()
+        unreferenced = self.db.query(func.count(Chunk.id)).filter(Chunk.ref_count <= 0).scalar()
+
+        logical_bytes = 0
+        for model in (File, FileVersion):
+            logical_bytes += self.db.query(
+                func.coalesce(func.sum(model.content_size), 0)
+            ).filter(model.content_chunks.isnot(None)).scalar()
+
+        return {
+            "chunk_count": chunk_count,
+            "unreferenced_chunks": unreferenced,
+            "logical_bytes": logical_bytes,
+            "unique_bytes": unique_bytes,
+            "stored_bytes": stored_bytes,
+            "dedup_ratio": round(logical_bytes / unique_bytes, 2) if unique_bytes else 1.0,
+        }
+
+    def _existing_ids(self, ids: List[str]) -> set:
+        """查询已存储的分块 ID"""
+        existing = set()
+        for i in range(0, len(ids), _QUERY_BATCH_SIZE):
+            batch = ids[i:i + _QUERY_BATCH_SIZE]
+            rows = self.db.query(Chunk.id).filter(Chunk.id.in_(batch)).all()
+            existing.update(row[0] for row in rows)
+        return existing
+
+    def _load(self, ids: List[str]) -> Dict[str, bytes]:
+        """批量读取分块密文"""
+        stored = self.load_ciphertexts(ids)
+        # 密文不在数据库中的分块从 Blob 存储读取
+        for cid, data in stored.items():
+            if data is None:
+                stored[cid] = self._get_blob(cid)
+        return stored
+
+    def load_ciphertexts(self, ids: List[str]) -> Dict[str, Optional[bytes]]:
+        """批量读取分块记录中的密文 (保存在 Blob 存储中的为 None)"""
+        stored = {}
+        for i in range(0, len(ids), _QUERY_BATCH_SIZE):
+            batch = ids[i:i + _QUERY_BATCH_SIZE]
+            rows = self.db.query(Chunk.id, Chunk.data).filter(Chunk.id.in_(batch)).all()
+            stored.update(rows)
+
+        missing = set(ids) - set(stored)
+        if missing:
+            raise ValueError(f"分块缺失: {len(missing)} 个")
+        return stored
+
+    def _get_blob(self, cid: str) -> bytes:
+        if self.storage is None:
+            raise ValueError(f"分块 {cid} 保存在 Blob 存储中，但当前为内联存储模式")
+        return self.storage.get(cid)
+
+    def _adjust(self, deltas: Dict[str, int]) -> None:
+        """批量调整引用计数"""
+        params = [{"cid": cid, "delta": delta} for cid, delta in deltas.items() if delta]
+        if not params:
+            return
+        stmt = (
+            update(Chunk.__table__)
+            .where(Chunk.__table__.c.id == bindparam("cid"))
+            .values(ref_count=Chunk.__table__.c.ref_count + bindparam("delta"))
+        )
+        self.db.execute(stmt, params)
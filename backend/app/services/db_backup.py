@@ -0,0 +1,327 @@
+"""
+数据库在线备份
+
+后台任务每隔 DB_BACKUP_INTERVAL_SECONDS 为 SQLite 数据库创建一致的时间点副本:
+- 源连接在整个备份期间持有同一个读事务 (WAL 模式下读不阻塞写)，备份始终复制同一个快照，
+  不会因为其他连接的写入而从头重来；在线备份 API 每步复制 DB_BACKUP_PAGES_PER_STEP 页，
+  步间休眠 DB_BACKUP_STEP_SLEEP_MS，整个过程在线程中执行，不占用事件循环
+- 在同一个读事务中统计各表行数；副本通过 quick_check 并且行数一致才算成功
+- DB_BACKUP_ENCRYPT 时以 ENCRYPTION_KEY 派生的密钥分段加密 (AES-256-GCM)
+- 本地 Blob 存储中的分块以硬链接 (跨文件系统时复制) 同步到备份目录的 blobs/:
+  Blob 按内容寻址且不可变，每次只处理新增的，回收站清理删除的分块在备份中仍然可用
+- 只保留最新的 DB_BACKUP_KEEP 个备份，并删除不再被保留的备份引用的 Blob
+- 创建与轮换都在备份目录的文件锁 (.lock) 内执行: 多个 worker 只运行一个备份，
+  命令行备份等待正在进行的备份完成，轮换不会删除其他进程正在写入的备份引用的 Blob；
+  下一次备份时间由最新备份的时间决定，重启不会提前备份
+
+命令行: python -m app.backup_db [--list] [--restore 备份文件 [--output 数据库路径]]
+"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.engine import make_url
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+from app.core.crypto import decrypt_file, encrypt_file
+from app.core.metrics import DB_BACKUPS, DB_BACKUP_LAST_SUCCESS
+from app.storage import LocalBlobStorage, get_blob_storage
+
+logger = logging.getLogger(__name__)
+
+# 失败后重试的最长间隔与其他 worker 正在备份时再次检查的间隔 (秒)
+FAILURE_RETRY_SECONDS = 600
+LOCK_RETRY_SECONDS = 60
+
+# <数据库名>-<UTC 时间>.db[.enc]，同名的 .blobs 列出该备份引用的 Blob
+_BACKUP_NAME = re.compile(r"-(\d{8}-\d{6})\.db(\.enc)?$")
+_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def database_path() -> str:
+    """当前 SQLite 数据库文件的绝对路径"""
+    url = make_url(settings.DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise ValueError("在线备份只支持 SQLite 数据库文件")
+    return os.path.abspath(url.database)
+
+
+def list_backups() -> List[str]:
+    """备份目录中的备份文件 (从新到旧)"""
+    root = settings.DB_BACKUP_PATH
+    if not os.path.isdir(root):
+        return []
+    names = [name for name in os.listdir(root) if _BACKUP_NAME.search(name)]
+    names.sort(key=lambda name: _BACKUP_NAME.search(name).group(1), reverse=True)
+    return [os.path.join(root, name) for name in names]
+
+
+def backup_time(path: str) -> datetime:
+    return datetime.strptime(_BACKUP_NAME.search(path).group(1), _TIME_FORMAT)
+
+
+def _blob_list_path(path: str) -> str:
+    return _BACKUP_NAME.sub(lambda match: f"-{match.group(1)}.blobs", path)
+
+
+def _blob_mirror() -> LocalBlobStorage:
+    return LocalBlobStorage(os.path.join(settings.DB_BACKUP_PATH, "blobs"))
+
+
+def _table_counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def _copy_snapshot(source_path: str, target_path: str, blob_list_path: str) -> Dict[str, int]:
+    """在一个读事务中复制数据库并写出快照引用的 Blob 列表，返回快照中各表的行数"""
+    pause = settings.DB_BACKUP_STEP_SLEEP_MS / 1000
+    source = sqlite3.connect(source_path, timeout=settings.SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        # 第一条查询建立快照，之后的统计、Blob 列表和逐步复制都基于它
+        source.execute("BEGIN")
+        counts = _table_counts(source)
+        with open(blob_list_path, "w") as blob_list:
+            if "chunks" in counts:
+                for (cid,) in source.execute("SELECT id FROM chunks WHERE data IS NULL"):
+                    blob_list.write(cid + "\n")
+        source.backup(target, pages=settings.DB_BACKUP_PAGES_PER_STEP, progress=lambda *_: time.sleep(pause))
+        source.execute("COMMIT")
+        # 副本不依赖 -wal / -shm 文件
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        source.close()
+        target.close()
+    return counts
+
+
+def verify_backup(path: str, expected: Optional[Dict[str, int]] = None) -> None:
+    """只读打开副本，检查结构完整性并核对各表行数"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise RuntimeError(f"备份完整性检查失败: {result}")
+        counts = _table_counts(conn)
+    finally:
+        conn.close()
+    if expected is not None and counts != expected:
+        raise RuntimeError(f"备份行数不一致: 期望 {expected}，实际 {counts}")
+
+
+def _read_blob_list(path: str) -> Iterator[str]:
+    with open(path) as blob_list:
+        for line in blob_list:
+            yield line.strip()
+
+
+def _mirror_blobs(blob_list_path: str) -> int:
+    """把快照引用的 Blob 同步到备份目录，返回新增数量"""
+    storage = get_blob_storage()
+    if storage is None:
+        return 0
+    mirror = _blob_mirror()
+    added = 0
+    missing = 0
+    for key in _read_blob_list(blob_list_path):
+        if mirror.exists(key):
+            continue
+        source = storage.local_path(key)
+        target = mirror.local_path(key)
+        try:
+            if source is None:
+                mirror.put(key, storage.get(key))
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.link(source, target)
+                except FileExistsError:
+                    pass
+                except FileNotFoundError:
+                    raise KeyError(key)
+                except OSError:
+                    # 跨文件系统或不支持硬链接
+                    mirror.put(key, storage.get(key))
+        except KeyError:
+            missing += 1
+            continue
+        added += 1
+    if missing:
+        # 快照之后分块被回收: 这份备份不完整，下一轮重试
+        raise RuntimeError(f"备份引用的 {missing} 个 Blob 已不存在")
+    return added
+
+
+def create_backup() -> str:
+    """创建、校验 (并加密) 一个备份，返回备份文件路径 (阻塞调用)"""
+    source_path = database_path()
+    os.makedirs(settings.DB_BACKUP_PATH, exist_ok=True)
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    stem = os.path.join(settings.DB_BACKUP_PATH, f"{name}-{datetime.utcnow().strftime(_TIME_FORMAT)}")
+    path = stem + (".db.enc" if settings.DB_BACKUP_ENCRYPT else ".db")
+    # 临时文件不匹配备份文件名，中途失败不会被当作备份
+    snapshot_tmp = stem + ".db.tmp"
+    encrypted_tmp = stem + ".db.enc.tmp"
+    blob_list_tmp = stem + ".blobs.tmp"
+
+    try:
+        counts = _copy_snapshot(source_path, snapshot_tmp, blob_list_tmp)
+        verify_backup(snapshot_tmp, counts)
+        _mirror_blobs(blob_list_tmp)
+        # Blob 列表先就位，清理 Blob 时不会漏掉这份备份引用的分块
+        os.replace(blob_list_tmp, stem + ".blobs")
+        if settings.DB_BACKUP_ENCRYPT:
+            encrypt_file(snapshot_tmp, encrypted_tmp)
+            os.replace(encrypted_tmp, path)
+        else:
+            os.replace(snapshot_tmp, path)
+    finally:
+        for tmp in (snapshot_tmp, encrypted_tmp, blob_list_tmp):
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+    return path
+
+
+def check_keep(keep: int) -> None:
+    """保留数至少为 1，否则轮换会删除刚创建的备份"""
+    if keep < 1:
+        raise ValueError(f"DB_BACKUP_KEEP 必须至少为 1 (当前为 {keep})")
+
+
+def rotate_backups(keep: int) -> int:
+    """删除最新 keep 个之外的备份及不再被引用的 Blob，返回删除的备份数 (须持有 backup_lock)"""
+    check_keep(keep)
+    backups = list_backups()
+    expired = backups[keep:]
+    for path in expired:
+        os.unlink(path)
+
+    # 保留的备份引用的 Blob；没有对应备份的 Blob 列表一并删除
+    retained = {_blob_list_path(path) for path in backups[:keep]}
+    referenced = set()
+    for name in os.listdir(settings.DB_BACKUP_PATH):
+        if not name.endswith(".blobs"):
+            continue
+        blob_list = os.path.join(settings.DB_BACKUP_PATH, name)
+        if blob_list in retained:
+            referenced.update(_read_blob_list(blob_list))
+        else:
+            os.unlink(blob_list)
+
+    mirror = _blob_mirror()
+    for key in list(mirror.keys()):
+        if key not in referenced:
+            mirror.delete(key)
+    return len(expired)
+
+
+def restore_backup(path: str, output: str) -> int:
+    """把备份恢复为 output 数据库文件，并补齐 Blob 存储中缺少的分块，返回补齐的数量"""
+    if os.path.exists(output):
+        raise ValueError(f"目标文件已存在: {output}")
+    tmp = output + ".tmp"
+    try:
+        if path.endswith(".enc"):
+            decrypt_file(path, tmp)
+        else:
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                while True:
+                    data = src.read(1024 * 1024)
+                    if not data:
+                        break
+                    dst.write(data)
+        try:
+            verify_backup(tmp)
+        except (RuntimeError, sqlite3.DatabaseError) as e:
+            raise ValueError(str(e))
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+    storage = get_blob_storage()
+    blob_list = _blob_list_path(path)
+    if storage is None or not os.path.exists(blob_list):
+        return 0
+    mirror = _blob_mirror()
+    restored = 0
+    for key in _read_blob_list(blob_list):
+        if not storage.exists(key):
+            storage.put(key, mirror.get(key))
+            restored += 1
+    return restored
+
+
+def _seconds_until_due() -> float:
+    backups = list_backups()
+    if not backups:
+        return 0
+    elapsed = (datetime.utcnow() - backup_time(backups[0])).total_seconds()
+    return settings.DB_BACKUP_INTERVAL_SECONDS - elapsed
+
+
+@contextmanager
+def backup_lock(blocking: bool) -> Iterator[bool]:
+    """持有备份目录的文件锁，返回是否获得 (blocking 时等待其他进程释放)"""
+    os.makedirs(settings.DB_BACKUP_PATH, exist_ok=True)
+    fd = os.open(os.path.join(settings.DB_BACKUP_PATH, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def backup_if_due() -> Optional[str]:
+    """到期时创建备份并轮换，其他进程正在备份或尚未到期时返回 None (阻塞调用)"""
+    check_keep(settings.DB_BACKUP_KEEP)
+    with backup_lock(blocking=False) as locked:
+        # 获取锁之后再检查一次: 其他 worker 可能刚完成备份
+        if not locked or _seconds_until_due() > 0:
+            return None
+        path = create_backup()
+        rotate_backups(settings.DB_BACKUP_KEEP)
+        return path
+
+
+async def run_db_backup() -> None:
+    """后台定期备份，失败时记录日志并在稍后重试"""
+    while True:
+        delay = _seconds_until_due()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            continue
+        started = time.perf_counter()
+        try:
+            path = await asyncio.to_thread(backup_if_due)
+        except Exception:
+            logger.exception("数据库备份失败")
+            DB_BACKUPS.inc(status="failed")
+            await asyncio.sleep(min(settings.DB_BACKUP_INTERVAL_SECONDS, FAILURE_RETRY_SECONDS))
+            continue
+        if path is None:
+            # 其他 worker 正在备份或刚完成备份
+            await asyncio.sleep(LOCK_RETRY_SECONDS)
+            continue
+        DB_BACKUPS.inc(status="succeeded")
+        DB_BACKUP_LAST_SUCCESS.set(time.time())
+        logger.info("database backup: %s (%.1fs)", path, time.perf_counter() - started)
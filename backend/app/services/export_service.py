@@ -0,0 +1,436 @@
+"""
+全部导出
+
+导出组织为有界的 "读取密文 → 解密 → 压缩 → 写入" 流水线:
+- 事件循环线程按批读取分块密文 (每批最多 EXPORT_BATCH_FILES 个文件或 EXPORT_BATCH_BYTES 字节，一次查询)
+- 解密与 deflate 按文件提交到 crypto_pool 线程池并行执行 (均释放 GIL)
+- 唯一的写入者按原顺序等待结果，生成 ZIP 文件头并流式输出；同时只有两批在处理中，
+  内存占用与文件总数无关
+- 设置密码时由 pyzipper 写入 AES 加密条目: 解密仍然并行，压缩与加密由写入者在线程中完成
+
+导出范围在一个写事务中读取，其中的分块被固定到导出结束，期间的删除与垃圾回收不会使导出中断。
+
+备份模式 (每次完整输出的导出登记在 backups 表中，清单写入 _manifest.json):
+- full: 所有文件
+- incremental: 上一个备份 (或指定的 since_seq / since) 之后变更的文件
+- differential: 指定的完整备份之后变更的文件
+变更范围由 file_changes 的 seq 确定，期间被删除的文件记录在清单的 deleted 中；
+include_versions 时同时导出范围内新增的版本历史。导入时按清单的 parent_id 串联压缩包。
+"""
+import asyncio
+import json
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from itertools import chain
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.crypto import decrypt_content_bytes
+from app.core.crypto_pool import get_executor
+from app.core.zip_stream import ZipStreamWriter, compress_entry
+from app.models import Backup, ChunkPin, File, FileChange, FileVersion
+from .chunk_store import ChunkStore, load_chunk_ids
+
+# 每批读取的最大文件数与明文字节数
+EXPORT_BATCH_FILES = 64
+EXPORT_BATCH_BYTES = 16 * 1024 * 1024
+# 合并为较大的写入，减少响应消息数
+EXPORT_WRITE_SIZE = 256 * 1024
+
+# 压缩包末尾的元信息 (_metadata.json 兼容旧版导入) 与备份清单
+METADATA_NAME = "_metadata.json"
+MANIFEST_NAME = "_manifest.json"
+MANIFEST_FORMAT = 1
+BACKUP_MODES = ("full", "incremental", "differential")
+
+# (压缩包内的文件名, 模型 (File / FileVersion), 含 id/content_chunks/content_size 的行, ZIP 条目时间)
+ExportEntry = Tuple[str, type, object, Optional[tuple]]
+
+
+class _StreamBuffer:
+    """只追加的输出缓冲: pyzipper 将其视为不可定位的流 (使用数据描述符)，写入后由生成器取出"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _read_all(parts: Iterator[bytes]) -> bytes:
+    return b"".join(parts)
+
+
+def _zip_time(value: Optional[datetime]) -> Optional[tuple]:
+    return value.timetuple()[:6] if value else None
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _version_path(file_id: int, version_number: int) -> str:
+    return f"_versions/{file_id}/{version_number}"
+
+
+class ExportService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.chunks = ChunkStore(db)
+
+    def list_export_files(self, changed=None) -> list:
+        """导出的文件 (不含回收站，顺序与文件列表一致)；changed 为变更文件 ID 的子查询
+
+        只读取需要的列并返回普通行而不是 ORM 对象，上万个文件时元信息也只占少量内存。
+        """
+        query = self.db.query(
+            File.id, File.name, File.path, File.language, File.created_at, File.updated_at,
+            File.content_chunks, File.content_size
+        ).filter(File.is_deleted == False)
+        if changed is not None:
+            query = query.filter(File.id.in_(changed))
+        return query.order_by(File.sort_order, File.name).all()
+
+    def list_export_versions(self, after_version_id: int = 0, changed=None, since: Optional[datetime] = None) -> list:
+        """导出的版本历史 (只含未删除文件)，按文件与版本号排序"""
+        query = self.db.query(
+            FileVersion.id, FileVersion.file_id, FileVersion.version_number, FileVersion.created_at,
+            FileVersion.content_chunks, FileVersion.content_size
+        ).join(File, File.id == FileVersion.file_id).filter(File.is_deleted == False)
+        if after_version_id:
+            query = query.filter(FileVersion.id > after_version_id)
+        if changed is not None:
+            query = query.filter(FileVersion.file_id.in_(changed))
+        if since is not None:
+            query = query.filter(FileVersion.created_at > since)
+        return query.order_by(FileVersion.file_id, FileVersion.version_number).all()
+
+    def list_backups(self, limit: int = 100) -> List[Backup]:
+        """最近登记的备份"""
+        return self.db.query(Backup).order_by(Backup.created_at.desc()).limit(limit).all()
+
+    def get_backup(self, ref: str) -> Optional[Backup]:
+        """按 ID 或名称查找备份 (名称重复时取最新的)"""
+        return self.db.query(Backup).filter(
+            or_(Backup.id == ref, Backup.name == ref)
+        ).order_by(Backup.created_at.desc()).first()
+
+    def export_all(self, password: Optional[str] = None) -> AsyncIterator[bytes]:
+        """以流式 ZIP 导出所有文件 (可选密码保护)"""
+        return self.export_backup(password=password)[1]
+
+    def export_backup(
+        self,
+        mode: str = "full",
+        since_seq: Optional[int] = None,
+        since: Optional[datetime] = None,
+        base: Optional[str] = None,
+        name: Optional[str] = None,
+        include_versions: bool = False,
+        password: Optional[str] = None
+    ) -> Tuple[Backup, AsyncIterator[bytes]]:
+        """返回 (备份, 流式 ZIP)，参数无效时抛出 ValueError
+
+        增量备份未指定 base / since 时以最近一个属于备份链的备份为基准。
+        最后一个条目输出之后才登记备份，中断的导出不会成为后续增量的基准。
+        """
+        if mode not in BACKUP_MODES:
+            raise ValueError(f"不支持的备份模式: {mode}")
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        ad_hoc = since_seq is not None or since is not None
+        if ad_hoc and (mode != "incremental" or base):
+            raise ValueError("since_seq / since 只能用于未指定 base 的增量备份")
+
+        backup = Backup(
+            id=uuid4().hex,
+            name=name,
+            mode=mode,
+            include_versions=include_versions,
+            created_at=datetime.utcnow(),
+        )
+        parent = None
+        if base:
+            parent = self.get_backup(base)
+            if parent is None:
+                raise ValueError("基准备份不存在")
+        elif mode == "incremental" and not ad_hoc:
+            parent = self.db.query(Backup).filter(
+                Backup.base_id.isnot(None)
+            ).order_by(Backup.created_at.desc()).first()
+            if parent is None:
+                raise ValueError("没有可作为基准的备份，请先创建完整备份")
+        if mode == "differential" and (parent is None or parent.mode != "full"):
+            raise ValueError("差异备份需要指定一个完整备份作为基准 (base)")
+
+        after_version_id = 0
+        if mode == "full":
+            if parent is not None:
+                raise ValueError("完整备份不需要基准备份")
+            backup.base_id = backup.id
+        elif parent is not None:
+            backup.parent_id = parent.id
+            backup.base_id = parent.base_id
+            backup.from_seq = parent.to_seq
+            after_version_id = parent.to_version_id
+        else:
+            backup.from_seq = since_seq or 0
+
+        # 先插入固定记录获取写锁，持锁读取导出范围并固定其中的分块: 导出期间的永久删除、
+        # 回收站清理与垃圾回收都不会删除这些分块，流式输出不会因分块缺失而中断
+        pin = ChunkPin()
+        self.db.add(pin)
+        self.db.flush()
+        # 范围上限: 之后的变更会在下一次增量中再次导出
+        backup.to_seq = self.db.query(func.max(FileChange.seq)).scalar() or 0
+        backup.to_version_id = self.db.query(func.max(FileVersion.id)).scalar() or 0
+        if mode == "full":
+            changed = None
+            deleted = []
+        else:
+            changed = select(FileChange.file_id).where(FileChange.seq > backup.from_seq)
+            if since is not None:
+                changed = changed.where(FileChange.created_at > since)
+            deleted = self.db.scalars(changed.where(
+                FileChange.file_id.not_in(select(File.id).where(File.is_deleted == False))
+            ).order_by(FileChange.file_id)).all()
+
+        files = self.list_export_files(changed)
+        versions = []
+        if include_versions:
+            if after_version_id:
+                versions = self.list_export_versions(after_version_id)
+            else:
+                versions = self.list_export_versions(changed=changed, since=since)
+
+        backup.file_count = len(files)
+        backup.deleted_count = len(deleted)
+        self.chunks.pin(pin, chain.from_iterable(
+            load_chunk_ids(row.content_chunks) for row in chain(files, versions)
+        ))
+        self.db.commit()
+
+        entries = [(f.path.lstrip('/') or f.name, File, f, _zip_time(f.updated_at)) for f in files]
+        entries += [
+            (_version_path(v.file_id, v.version_number), FileVersion, v, _zip_time(v.created_at))
+            for v in versions
+        ]
+        trailer = [
+            (METADATA_NAME, self._metadata(files, bool(password))),
+            (MANIFEST_NAME, self._manifest(backup, since, files, versions, deleted, bool(password))),
+        ]
+        return backup, self._stream_backup(backup, pin.id, entries, trailer, password)
+
+    async def _stream_backup(
+        self, backup: Backup, pin_id: int, entries: List[ExportEntry], trailer: List[Tuple[str, dict]],
+        password: Optional[str]
+    ) -> AsyncIterator[bytes]:
+        """输出 ZIP，完成后登记备份；无论完成与否都释放固定的分块"""
+        try:
+            async for data in self.iter_zip(entries, trailer, password):
+                yield data
+            self.db.add(backup)
+        except BaseException:
+            self.db.rollback()
+            raise
+        finally:
+            self.chunks.unpin(pin_id)
+            self.db.commit()
+
+    @staticmethod
+    def _metadata(files: list, encrypted: bool) -> dict:
+        return {
+            "exported_at": datetime.utcnow().isoformat(),
+            "file_count": len(files),
+            "encrypted": encrypted,
+            "files": [
+                {
+                    "name": f.name,
+                    "path": f.path,
+                    "language": f.language,
+                    "created_at": _isoformat(f.created_at),
+                    "updated_at": _isoformat(f.updated_at),
+                }
+                for f in files
+            ],
+        }
+
+    @staticmethod
+    def _manifest(
+        backup: Backup, since: Optional[datetime], files: list, versions: list, deleted: List[int], encrypted: bool
+    ) -> dict:
+        return {
+            "format": MANIFEST_FORMAT,
+            "backup_id": backup.id,
+            "name": backup.name,
+            "mode": backup.mode,
+            "parent_id": backup.parent_id,
+            "base_id": backup.base_id,
+            "from_seq": backup.from_seq,
+            "to_seq": backup.to_seq,
+            "since": _isoformat(since),
+            "created_at": _isoformat(backup.created_at),
+            "include_versions": backup.include_versions,
+            "encrypted": encrypted,
+            "files": [
+                {
+                    "id": f.id,
+                    "name": f.name,
+                    "path": f.path,
+                    "language": f.language,
+                    "size": f.content_size or 0,
+                    "created_at": _isoformat(f.created_at),
+                    "updated_at": _isoformat(f.updated_at),
+                    "archive_path": f.path.lstrip('/') or f.name,
+                }
+                for f in files
+            ],
+            "versions": [
+                {
+                    "file_id": v.file_id,
+                    "version_number": v.version_number,
+                    "size": v.content_size or 0,
+                    "created_at": _isoformat(v.created_at),
+                    "archive_path": _version_path(v.file_id, v.version_number),
+                }
+                for v in versions
+            ],
+            "deleted": deleted,
+        }
+
+    async def iter_zip(
+        self, entries: List[ExportEntry], trailer: List[Tuple[str, dict]], password: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """按顺序写入 entries 的内容，最后写入 trailer 中的 JSON 文件，逐段产出 ZIP 数据"""
+        trailer = [
+            (name, json.dumps(value, ensure_ascii=False, indent=2).encode("utf-8"))
+            for name, value in trailer
+        ]
+        if password:
+            async for data in self._iter_encrypted_zip(entries, trailer, password):
+                yield data
+            return
+
+        writer = ZipStreamWriter()
+        parts: List[bytes] = []
+        pending = 0
+        async for (name, _, _, date_time), (data, crc, size) in self._pipeline(entries, compress_entry):
+            parts.append(writer.local_header(name, len(data), crc, size, date_time))
+            parts.append(data)
+            pending += len(data)
+            if pending >= EXPORT_WRITE_SIZE:
+                yield b"".join(parts)
+                parts = []
+                pending = 0
+
+        for name, value in trailer:
+            data, crc, size = compress_entry([value])
+            parts.append(writer.local_header(name, len(data), crc, size))
+            parts.append(data)
+        parts.append(writer.finish())
+        yield b"".join(parts)
+
+    async def _iter_encrypted_zip(
+        self, entries: List[ExportEntry], trailer: List[Tuple[str, bytes]], password: str
+    ) -> AsyncIterator[bytes]:
+        import pyzipper
+
+        buffer = _StreamBuffer()
+        zip_file = pyzipper.AESZipFile(buffer, "w", compression=pyzipper.ZIP_DEFLATED, encryption=pyzipper.WZ_AES)
+        zip_file.setpassword(password.encode("utf-8"))
+        async for (name, _, _, date_time), plaintext in self._pipeline(entries, _read_all):
+            info = zip_file.zipinfo_cls(name, date_time=date_time or datetime.now().timetuple()[:6])
+            info.compress_type = pyzipper.ZIP_DEFLATED
+            await asyncio.to_thread(zip_file.writestr, info, plaintext)
+            data = buffer.drain()
+            if data:
+                yield data
+
+        for name, value in trailer:
+            await asyncio.to_thread(zip_file.writestr, name, value)
+        zip_file.close()
+        yield buffer.drain()
+
+    async def _pipeline(self, entries: List[ExportEntry], task: Callable) -> AsyncIterator[tuple]:
+        """按原顺序产出 (entry, task(明文分块迭代器) 的结果)，当前批输出时下一批已在线程池中处理"""
+        window = deque()
+        try:
+            for batch in self._batches(entries):
+                window.append(list(zip(batch, self._submit(batch, task))))
+                if len(window) < 2:
+                    continue
+                for entry, future in window.popleft():
+                    yield entry, await asyncio.wrap_future(future)
+            while window:
+                for entry, future in window.popleft():
+                    yield entry, await asyncio.wrap_future(future)
+        finally:
+            # 客户端断开时取消尚未开始的任务
+            for batch in window:
+                for _, future in batch:
+                    future.cancel()
+
+    @staticmethod
+    def _batches(entries: List[ExportEntry]) -> Iterator[List[ExportEntry]]:
+        batch: List[ExportEntry] = []
+        size = 0
+        for entry in entries:
+            batch.append(entry)
+            size += entry[2].content_size or 0
+            if len(batch) >= EXPORT_BATCH_FILES or size >= EXPORT_BATCH_BYTES:
+                yield batch
+                batch = []
+                size = 0
+        if batch:
+            yield batch
+
+    def _submit(self, batch: List[ExportEntry], task: Callable) -> List[Future]:
+        """读取一批条目的分块密文 (在调用线程中访问数据库)，按条目提交到线程池"""
+        chunk_lists = [load_chunk_ids(source.content_chunks) for _, _, source, _ in batch]
+        stored = self.chunks.load_ciphertexts(list(set(chain.from_iterable(chunk_lists))))
+        legacy = self._load_legacy(batch)
+        executor = get_executor()
+
+        futures = []
+        for (_, model, source, _), ids in zip(batch, chunk_lists):
+            if source.content_chunks is None:
+                parts = self._legacy_parts(legacy.get((model, source.id)))
+            else:
+                parts = self._chunk_parts(ids, stored)
+            futures.append(executor.submit(task, parts))
+        return futures
+
+    def _load_legacy(self, batch: List[ExportEntry]) -> Dict[tuple, Optional[str]]:
+        """读取旧版内联密文 (尚未迁移到分块存储的条目)"""
+        ids_by_model: Dict[type, List[int]] = {}
+        for _, model, source, _ in batch:
+            if source.content_chunks is None:
+                ids_by_model.setdefault(model, []).append(source.id)
+
+        legacy = {}
+        for model, ids in ids_by_model.items():
+            rows = self.db.query(model.id, model.content_encrypted).filter(model.id.in_(ids)).all()
+            legacy.update(((model, row_id), encrypted) for row_id, encrypted in rows)
+        return legacy
+
+    def _chunk_parts(self, ids: List[str], stored: dict) -> Iterator[bytes]:
+        for cid in ids:
+            yield self.chunks.decrypt_stored(cid, stored[cid])
+
+    @staticmethod
+    def _legacy_parts(encrypted: Optional[str]) -> Iterator[bytes]:
+        if encrypted:
+            yield decrypt_content_bytes(encrypted)
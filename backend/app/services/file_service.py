@@ -1,33 +1,114 @@
+from concurrent.futures import Future
 from datetime import datetime
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.models import File, FileVersion
-from app.core.crypto import encrypt_content, decrypt_content
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import String, and_, bindparam, case, delete, func, insert, literal, update
+from sqlalchemy.orm import aliased
+from app.models import File, FileVersion, FileChange
+from app.core.crypto import content_hash, decrypt_content, decrypt_content_bytes
 from app.core.config import settings
+from app.core.crypto_pool import get_executor
+from app.core.metrics import SNAPSHOTS_CREATED
+from .chunk_store import ChunkStore, dump_chunk_ids, load_chunk_ids
+
+# SQLite 单条语句的参数数量有限，IN 条件分批执行
+_BATCH_SIZE = 500
+
+
+def _batches(ids: List[int]) -> Iterator[List[int]]:
+    for i in range(0, len(ids), _BATCH_SIZE):
+        yield ids[i:i + _BATCH_SIZE]
+
+
+def _folder_prefix(path: str) -> str:
+    """规范化文件夹路径: 以 / 开头和结尾 (根目录为 /)"""
+    path = "/" + path.strip().strip("/")
+    return path if path == "/" else path + "/"
+
+
+def _subtree(prefix: str) -> list:
+    """path 位于文件夹子树中的条件 ('/' 的下一个字符是 '0')，可以使用 path 索引做范围扫描"""
+    return [File.path >= prefix, File.path < prefix[:-1] + "0"]
 
 
 class FileService:
     def __init__(self, db: Session):
         self.db = db
+        self.chunks = ChunkStore(db)
     
     def create_file(self, name: str, path: str, content: str = "", language: str = "plaintext") -> File:
         """创建文件"""
-        encrypted = encrypt_content(content) if content else encrypt_content("")
-        
         file = File(
             name=name,
             path=path,
-            content_encrypted=encrypted,
             language=language
         )
+        self._store_content(file, content)
         self.db.add(file)
-        self.db.commit()
-        self.db.refresh(file)
+        self.db.flush()
+        self._record_change(file.id, "create")
         
         # 创建初始版本
-        self._create_version(file, content)
+        self._create_version(file)
+        self.db.commit()
+        self.db.refresh(file)
+        return file
+    
+    def import_file(
+        self,
+        name: str,
+        path: str,
+        content: str,
+        language: str = "plaintext",
+        versions: Iterable[tuple] = (),
+        created_at: Optional[datetime] = None
+    ) -> File:
+        """导入文件及其版本历史 (versions 为按版本号升序的 (版本号, 内容, 创建时间))
+
+        当前内容与最后一个导入的版本不同时再追加一个版本。
+        """
+        file = File(name=name, path=path, language=language, created_at=created_at)
+        self._store_content(file, content)
+        self.db.add(file)
+        self.db.flush()
+        for version_number, version_content, version_created_at in versions:
+            version = FileVersion(
+                file_id=file.id,
+                version_number=version_number,
+                operation_count=0,
+                created_at=version_created_at
+            )
+            self._store_content(version, version_content)
+            self.db.add(version)
+        self.db.flush()
+        self._record_change(file.id, "create")
+        self._create_version(file)
+        self.db.commit()
+        self.db.refresh(file)
+        return file
+
+    def duplicate_file(self, file_id: int, name: str, path: str) -> File:
+        """复制文件: 副本及其初始版本引用源文件的分块，不解密也不重新加密"""
+        source = self.get_file(file_id)
+        if not source:
+            raise ValueError("文件不存在")
+        if source.content_chunks is None:
+            self.convert_to_chunks(source)
         
+        file = File(
+            name=name,
+            path=path,
+            language=source.language,
+            encoding=source.encoding
+        )
+        self._share_content(file, source)
+        self.db.add(file)
+        self.db.flush()
+        self._record_change(file.id, "create")
+        self._create_version(file)
+        self.db.commit()
+        self.db.refresh(file)
         return file
     
     def get_file(self, file_id: int, include_deleted: bool = False) -> Optional[File]:
@@ -46,9 +127,75 @@ class FileService:
     
     def get_file_content(self, file: File) -> str:
         """获取解密后的文件内容"""
-        if not file.content_encrypted:
-            return ""
-        return decrypt_content(file.content_encrypted)
+        return self._read_content(file)
+    
+    def iter_file_content(self, file: File) -> Iterator[bytes]:
+        """流式读取文件内容 (UTF-8 字节)，大文件无需整体解密到内存"""
+        if file.content_chunks is not None:
+            yield from self.chunks.iter_read(load_chunk_ids(file.content_chunks))
+        elif file.content_encrypted:
+            yield decrypt_content_bytes(file.content_encrypted)
+    
+    def get_files(self, file_ids: List[int]) -> List[File]:
+        """按 ID 批量获取文件 (一次查询，不含回收站)"""
+        files: List[File] = []
+        for batch in _batches(list(set(file_ids))):
+            files.extend(self.db.query(File).filter(File.id.in_(batch), File.is_deleted == False).all())
+        return files
+    
+    def submit_contents(self, files: List[File]) -> List[List[Future]]:
+        """在线程池中并行解密多个文件的内容
+
+        返回与 files 对应的分块 Future 列表 (结果为 UTF-8 字节，按顺序拼接即为文件内容)。
+        所有文件的分块密文一起查询，相同的分块只解密一次。
+        """
+        chunk_lists = [load_chunk_ids(file.content_chunks) for file in files]
+        futures = self.chunks.submit_decrypt(chain.from_iterable(chunk_lists))
+        
+        result = []
+        for file, ids in zip(files, chunk_lists):
+            if file.content_chunks is None and file.content_encrypted:
+                result.append([get_executor().submit(decrypt_content_bytes, file.content_encrypted)])
+            else:
+                result.append([futures[cid] for cid in ids])
+        return result
+    
+    def convert_to_chunks(self, target) -> None:
+        """将旧版内联密文转换为分块存储 (用于存储迁移)"""
+        if target.content_chunks is not None:
+            return
+        self._store_content(target, self._read_content(target))
+    
+    def _store_content(self, target, content: str, digest: Optional[str] = None) -> None:
+        """将内容写入分块存储，并释放旧内容引用的分块"""
+        if target.content_chunks is not None:
+            self.chunks.release(load_chunk_ids(target.content_chunks))
+        
+        ids, size = self.chunks.put(content)
+        target.content_chunks = dump_chunk_ids(ids)
+        target.content_size = size
+        target.content_hash = digest or content_hash(content.encode("utf-8"))
+        target.content_encrypted = "" if isinstance(target, FileVersion) else None
+    
+    def _share_content(self, target, source) -> None:
+        """让 target 引用 source 的分块 (写时复制: 只调整引用计数)"""
+        self.chunks.retain(load_chunk_ids(source.content_chunks))
+        if target.content_chunks is not None:
+            self.chunks.release(load_chunk_ids(target.content_chunks))
+        
+        target.content_chunks = source.content_chunks
+        target.content_size = source.content_size
+        target.content_hash = source.content_hash
+        target.content_encrypted = "" if isinstance(target, FileVersion) else None
+    
+    def _read_content(self, source) -> str:
+        """读取 File / FileVersion 的内容 (兼容旧版内联密文)"""
+        if source.content_chunks is not None:
+            ids = load_chunk_ids(source.content_chunks)
+            return self.chunks.read(ids).decode("utf-8")
+        if source.content_encrypted:
+            return decrypt_content(source.content_encrypted)
+        return ""
     
     def list_files(self, include_deleted: bool = False) -> List[File]:
         """列出所有文件"""
@@ -61,29 +208,103 @@ class FileService:
         """重新排序文件"""
         for index, file_id in enumerate(file_ids):
             file = self.db.query(File).filter(File.id == file_id).first()
-            if file:
+            if file and file.sort_order != index:
                 file.sort_order = index
+                self._record_change(file.id, "reorder")
         self.db.commit()
     
     def list_deleted_files(self) -> List[File]:
         """列出回收站文件"""
         return self.db.query(File).filter(File.is_deleted == True).all()
     
+    def list_folder(self, path: str) -> dict:
+        """列出文件夹: 直接子文件夹 (含子树文件数与大小) 与直接位于其下的文件
+
+        文件夹即虚拟路径的前缀，统计只对前缀做一次范围扫描，由 (is_deleted, path, content_size) 索引完成。
+        """
+        prefix = _folder_prefix(path)
+        start = len(prefix) + 1
+        slash = func.instr(func.substr(File.path, start), "/")
+        child = case((slash > 0, func.substr(File.path, start, slash - 1)), else_=None)
+        conditions = [File.is_deleted == False, *_subtree(prefix)]
+        
+        rows = self.db.query(
+            child, func.count(File.id), func.coalesce(func.sum(File.content_size), 0)
+        ).filter(*conditions).group_by(child).all()
+        folders = [
+            {"name": name, "path": prefix + name, "file_count": count, "total_size": size}
+            for name, count, size in rows if name
+        ]
+        files = self.db.query(File).options(load_only(
+            File.id, File.name, File.path, File.language,
+            File.is_deleted, File.sort_order, File.updated_at
+        )).filter(*conditions, slash == 0).order_by(File.sort_order, File.name).all()
+        
+        return {
+            "path": prefix.rstrip("/") or "/",
+            "file_count": sum(row[1] for row in rows),
+            "total_size": sum(row[2] for row in rows),
+            "folders": sorted(folders, key=lambda folder: folder["name"]),
+            "files": files,
+        }
+    
+    def move_folder(self, from_path: str, to_path: str) -> int:
+        """移动/重命名文件夹: 一条 UPDATE 改写子树中所有文件 (含回收站) 的路径前缀，返回文件数"""
+        source = _folder_prefix(from_path)
+        target = _folder_prefix(to_path)
+        if source == "/":
+            raise ValueError("不能移动根目录")
+        if target.startswith(source):
+            raise ValueError("不能移动到自身或子文件夹中")
+        
+        new_path = literal(target, String) + func.substr(File.path, len(source) + 1, type_=String)
+        other = aliased(File)
+        conflict = self.db.query(File.path).join(other, other.path == new_path).filter(
+            *_subtree(source),
+            other.is_deleted == False,
+            ~and_(other.path >= source, other.path < source[:-1] + "0")
+        ).first()
+        if conflict:
+            raise ValueError(f"目标位置已存在同名文件: {conflict[0]}")
+        
+        result = self.db.execute(
+            update(File)
+            .where(*_subtree(source))
+            .values(path=new_path)
+            .returning(File.id)
+            .execution_options(synchronize_session=False)
+        )
+        moved = list(result.scalars())
+        if not moved:
+            raise ValueError("文件夹不存在")
+        self._record_changes(moved, "rename")
+        self.db.commit()
+        return len(moved)
+    
     def save_file(self, file_id: int, content: str, force_snapshot: bool = False) -> File:
         """保存文件内容"""
         file = self.get_file(file_id)
         if not file:
             raise ValueError("文件不存在")
         
+        # 内容未变化: 不分块加密、不写入，也不更新修改时间和操作计数
+        digest = content_hash(content.encode("utf-8"))
+        if digest == file.content_hash:
+            if force_snapshot:
+                self._create_version(file)
+                self.db.commit()
+            return file
+        
         # 加密并保存
-        file.content_encrypted = encrypt_content(content)
+        self._store_content(file, content, digest)
         file.updated_at = datetime.utcnow()
         
         # 检查是否需要创建版本快照
         should_snapshot = force_snapshot or self._should_create_snapshot(file)
         if should_snapshot:
-            self._create_version(file, content)
+            self._create_version(file)
         
+        self._record_change(file.id, "save")
         self.db.commit()
         self.db.refresh(file)
         return file
@@ -110,23 +331,29 @@ class FileService:
         latest_version.operation_count += 1
         return False
     
-    def _create_version(self, file: File, content: str) -> FileVersion:
-        """创建版本快照"""
+    def _create_version(self, file: File) -> FileVersion:
+        """为文件当前内容创建版本快照 (共享文件的分块，由调用方提交)
+
+        内容与最新版本相同时直接返回最新版本。
+        """
         # 获取最新版本号
         latest = self.db.query(FileVersion).filter(
             FileVersion.file_id == file.id
         ).order_by(FileVersion.version_number.desc()).first()
         
+        if latest and file.content_hash is not None and latest.content_hash == file.content_hash:
+            return latest
+        
         version_number = (latest.version_number + 1) if latest else 1
         
         version = FileVersion(
             file_id=file.id,
-            content_encrypted=encrypt_content(content),
             version_number=version_number,
             operation_count=0
         )
+        self._share_content(version, file)
         self.db.add(version)
-        self.db.commit()
+        SNAPSHOTS_CREATED.inc()
         return version
     
     def get_versions(self, file_id: int) -> List[FileVersion]:
@@ -140,20 +367,31 @@ class FileService:
         version = self.db.query(FileVersion).filter(FileVersion.id == version_id).first()
         if not version:
             return None
-        return decrypt_content(version.content_encrypted)
+        return self._read_content(version)
     
     def restore_version(self, file_id: int, version_id: int) -> File:
-        """恢复到指定版本"""
+        """恢复到指定版本: 文件引用该版本的分块，并作为新版本记录 (不解密也不重新加密)"""
         file = self.get_file(file_id)
         if not file:
             raise ValueError("文件不存在")
         
-        content = self.get_version_content(version_id)
-        if content is None:
+        version = self.db.query(FileVersion).filter(
+            FileVersion.id == version_id,
+            FileVersion.file_id == file_id
+        ).first()
+        if not version:
             raise ValueError("版本不存在")
+        if version.content_chunks is None:
+            self.convert_to_chunks(version)
         
-        # 保存当前内容为新版本，然后恢复
-        return self.save_file(file_id, content, force_snapshot=True)
+        if file.content_hash is None or file.content_hash != version.content_hash:
+            self._share_content(file, version)
+            file.updated_at = datetime.utcnow()
+            self._record_change(file.id, "save")
+        self._create_version(file)
+        self.db.commit()
+        self.db.refresh(file)
+        return file
     
     def update_file(self, file_id: int, name: str = None, path: str = None, language: str = None) -> File:
         """更新文件元信息"""
@@ -168,6 +406,7 @@ class FileService:
         if language:
             file.language = language
         
+        self._record_change(file.id, "rename" if name or path else "update")
         self.db.commit()
         self.db.refresh(file)
         return file
@@ -180,6 +419,7 @@ class FileService:
         
         file.is_deleted = True
         file.deleted_at = datetime.utcnow()
+        self._record_change(file.id, "delete")
         self.db.commit()
         return file
     
@@ -191,15 +431,206 @@ class FileService:
         
         file.is_deleted = False
         file.deleted_at = None
+        self._record_change(file.id, "restore")
         self.db.commit()
         return file
     
     def permanent_delete(self, file_id: int) -> bool:
-        """永久删除文件"""
-        file = self.get_file(file_id, include_deleted=True)
-        if not file:
+        """永久删除文件 (集合式删除版本记录，不加载版本内容)"""
+        if not self._purge_files([file_id]):
             return False
-        
-        self.db.delete(file)
         self.db.commit()
+        self.chunks.collect_garbage()
         return True
+    
+    def purge_trash(self, deleted_before: datetime, limit: int) -> int:
+        """永久删除 deleted_before 之前移入回收站的文件，每次最多 limit 个，返回删除数量
+
+        分块只释放引用，由调用方分批回收。
+        """
+        ids = [row[0] for row in self.db.query(File.id).filter(
+            File.is_deleted == True,
+            File.deleted_at < deleted_before
+        ).order_by(File.deleted_at).limit(limit).all()]
+        purged = self._purge_files(ids)
+        self.db.commit()
+        return len(purged)
+    
+    def apply_batch(self, operations) -> List[Optional[str]]:
+        """在一个事务中执行批量操作，返回与 operations 对应的错误信息 (成功为 None)
+
+        operations 中的每一项包含 op、file_id 以及 move / set_language 所需的 name、path、language。
+        相邻的同类操作合并为集合式 SQL 执行，语句数与操作数无关。
+        """
+        errors: List[Optional[str]] = [None] * len(operations)
+        purged = False
+        start = 0
+        while start < len(operations):
+            end = start
+            while end < len(operations) and operations[end].op == operations[start].op:
+                end += 1
+            op = operations[start].op
+            items = list(range(start, end))
+            
+            if op == "delete":
+                done = self._update_files(
+                    [operations[i].file_id for i in items],
+                    [File.is_deleted == False],
+                    {"is_deleted": True, "deleted_at": datetime.utcnow()},
+                    "delete"
+                )
+            elif op == "restore":
+                done = self._update_files(
+                    [operations[i].file_id for i in items],
+                    [File.is_deleted == True],
+                    {"is_deleted": False, "deleted_at": None},
+                    "restore"
+                )
+            elif op == "purge":
+                done = self._purge_files([operations[i].file_id for i in items])
+                purged = purged or bool(done)
+            elif op == "move":
+                done = self._move_files(operations, items, errors)
+            elif op == "set_language":
+                done = set()
+                by_language: Dict[str, List[int]] = {}
+                for i in items:
+                    if operations[i].language:
+                        by_language.setdefault(operations[i].language, []).append(operations[i].file_id)
+                    else:
+                        errors[i] = "缺少 language"
+                for language, ids in by_language.items():
+                    done |= self._update_files(ids, [File.is_deleted == False], {"language": language}, "update")
+            else:
+                raise ValueError(f"不支持的操作: {op}")
+            
+            for i in items:
+                if errors[i] is None and operations[i].file_id not in done:
+                    errors[i] = "文件不存在"
+            start = end
+        
+        self.db.commit()
+        if purged:
+            self.chunks.collect_garbage()
+        return errors
+    
+    def _update_files(self, file_ids: List[int], conditions: list, values: dict, operation: str) -> Set[int]:
+        """对 file_ids 中满足 conditions 的文件执行同一 UPDATE，返回实际更新的文件 ID"""
+        updated: Set[int] = set()
+        for batch in _batches(list(set(file_ids))):
+            result = self.db.execute(
+                update(File)
+                .where(File.id.in_(batch), *conditions)
+                .values(**values)
+                .returning(File.id)
+                .execution_options(synchronize_session=False)
+            )
+            updated.update(result.scalars())
+        self._record_changes(updated, operation)
+        return updated
+    
+    def _move_files(self, operations, items: List[int], errors: List[Optional[str]]) -> Set[int]:
+        """批量修改名称/路径: 一次查询确认文件存在，再以 executemany 更新"""
+        valid = []
+        for i in items:
+            if operations[i].name or operations[i].path:
+                valid.append(i)
+            else:
+                errors[i] = "缺少 name 或 path"
+        
+        existing: Set[int] = set()
+        for batch in _batches(list({operations[i].file_id for i in valid})):
+            existing.update(
+                row[0] for row in self.db.query(File.id).filter(
+                    File.id.in_(batch), File.is_deleted == False
+                ).all()
+            )
+        
+        params = [
+            {"fid": operations[i].file_id, "new_name": operations[i].name, "new_path": operations[i].path}
+            for i in valid if operations[i].file_id in existing
+        ]
+        if params:
+            table = File.__table__
+            self.db.execute(
+                update(table)
+                .where(table.c.id == bindparam("fid"))
+                .values(
+                    name=func.coalesce(bindparam("new_name"), table.c.name),
+                    path=func.coalesce(bindparam("new_path"), table.c.path)
+                ),
+                params
+            )
+        self._record_changes(existing, "rename")
+        return existing
+    
+    def _purge_files(self, file_ids: List[int]) -> Set[int]:
+        """集合式永久删除: 只读取分块引用列，按文件批量删除版本与文件记录"""
+        purged: Set[int] = set()
+        for batch in _batches(list(set(file_ids))):
+            rows = self.db.query(File.id, File.content_chunks).filter(File.id.in_(batch)).all()
+            if not rows:
+                continue
+            ids = [row[0] for row in rows]
+            versions = self.db.query(FileVersion.content_chunks).filter(FileVersion.file_id.in_(ids)).all()
+            
+            # 释放文件及其所有版本引用的分块
+            self.chunks.release(chain.from_iterable(
+                load_chunk_ids(row[-1]) for row in chain(rows, versions)
+            ))
+            self.db.execute(delete(FileVersion).where(FileVersion.file_id.in_(ids)))
+            self.db.execute(delete(File).where(File.id.in_(ids)))
+            purged.update(ids)
+        self._record_changes(purged, "purge")
+        return purged
+    
+    def _record_change(self, file_id: int, operation: str) -> None:
+        """记录文件变更 (随本次修改一起提交)，同时删除该文件之前的记录
+
+        增量同步只需要每个文件最新的状态，日志因此始终保持每个文件一条。
+        """
+        self._record_changes([file_id], operation)
+    
+    def _record_changes(self, file_ids: Iterable[int], operation: str) -> None:
+        """批量记录同一类变更"""
+        file_ids = sorted(file_ids)
+        if not file_ids:
+            return
+        for batch in _batches(file_ids):
+            self.db.execute(
+                delete(FileChange)
+                .where(FileChange.file_id.in_(batch))
+                .execution_options(synchronize_session=False)
+            )
+        self.db.execute(
+            insert(FileChange),
+            [{"file_id": file_id, "operation": operation} for file_id in file_ids]
+        )
+    
+    def get_change_seq(self) -> int:
+        """当前最新的变更序号"""
+        return self.db.query(func.max(FileChange.seq)).scalar() or 0
+    
+    def get_changes(self, since: int, limit: int) -> List[FileChange]:
+        """seq 大于 since 的变更 (按 seq 升序，最多 limit 条)"""
+        return self.db.query(FileChange).filter(
+            FileChange.seq > since
+        ).order_by(FileChange.seq).limit(limit).all()
+    
+    def get_file_metadata(self, file_ids: List[int]) -> Dict[int, File]:
+        """批量读取文件元信息 (不加载内容列)"""
+        if not file_ids:
+            return {}
+        files = self.db.query(File).options(load_only(
+            File.id, File.name, File.path, File.language,
+            File.is_deleted, File.sort_order, File.updated_at
+        )).filter(File.id.in_(file_ids)).all()
+        return {file.id: file for file in files}
+    
+    def get_storage_stats(self) -> dict:
+        """获取分块存储统计 (含去重比例)"""
+        return self.chunks.stats()
+    
+    def collect_garbage(self, limit: Optional[int] = None) -> int:
+        """回收未被引用的分块"""
+        return self.chunks.collect_garbage(limit)
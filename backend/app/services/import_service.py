@@ -0,0 +1,143 @@
+"""
+压缩包导入
+
+支持 /files/export-all 导出的压缩包 (可选密码)。一次可以上传一条备份链:
+完整备份 + 之后的增量备份 (或一个差异备份)，按清单 (_manifest.json) 的 parent_id
+排序后依次合并 —— 后面的压缩包覆盖同一文件的内容与版本，deleted 中的文件被移除，
+最终状态一次写入。没有清单的旧版压缩包按 _metadata.json 作为完整备份导入。
+与 JSON 导入一致，路径已存在的文件跳过。
+"""
+import json
+import zipfile
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .export_service import MANIFEST_FORMAT, MANIFEST_NAME, METADATA_NAME
+from .file_service import FileService
+
+# (压缩包, 清单)
+Archive = Tuple[zipfile.ZipFile, dict]
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class ImportService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.file_service = FileService(db)
+
+    def import_archives(self, archives: List[BinaryIO], password: Optional[str] = None) -> dict:
+        """导入一个或一条链上的多个压缩包，格式或备份链无效时抛出 ValueError"""
+        backup_chain = self.order_chain([self._open(archive, password) for archive in archives])
+
+        # 按备份链合并为最终状态: 原文件 ID -> 条目
+        files: Dict[object, Tuple[zipfile.ZipFile, dict]] = {}
+        versions: Dict[object, Dict[int, Tuple[zipfile.ZipFile, dict]]] = {}
+        for zip_file, manifest in backup_chain:
+            for file_id in manifest.get("deleted", []):
+                files.pop(file_id, None)
+                versions.pop(file_id, None)
+            for entry in manifest["files"]:
+                files[entry["id"]] = (zip_file, entry)
+            for entry in manifest.get("versions", []):
+                versions.setdefault(entry["file_id"], {})[entry["version_number"]] = (zip_file, entry)
+
+        imported = 0
+        skipped = 0
+        for file_id, (zip_file, entry) in files.items():
+            if self.file_service.get_file_by_path(entry["path"]):
+                skipped += 1
+                continue
+            history = (
+                (number, self._read(source, version["archive_path"]), _parse_time(version.get("created_at")))
+                for number, (source, version) in sorted(versions.get(file_id, {}).items())
+            )
+            self.file_service.import_file(
+                name=entry["name"],
+                path=entry["path"],
+                content=self._read(zip_file, entry["archive_path"]),
+                language=entry.get("language") or "plaintext",
+                versions=history,
+                created_at=_parse_time(entry.get("created_at")),
+            )
+            imported += 1
+
+        return {
+            "imported": imported,
+            "skipped": skipped,
+            "backups": [manifest.get("backup_id") for _, manifest in backup_chain],
+        }
+
+    @staticmethod
+    def order_chain(archives: List[Archive]) -> List[Archive]:
+        """按 parent_id 串联压缩包: 唯一的起点 (没有上一级)，之后每个的上一级都是前一个"""
+        roots = [archive for archive in archives if not archive[1].get("parent_id")]
+        if len(roots) != 1:
+            missing = {archive[1]["parent_id"] for archive in archives} - {archive[1].get("backup_id") for archive in archives}
+            if not roots and missing:
+                raise ValueError(f"缺少上一级备份: {', '.join(sorted(missing))}")
+            raise ValueError("备份链必须有且只有一个起点 (完整备份)")
+
+        children: Dict[str, List[Archive]] = {}
+        for archive in archives:
+            if archive[1].get("parent_id"):
+                children.setdefault(archive[1]["parent_id"], []).append(archive)
+
+        backup_chain = [roots[0]]
+        while True:
+            following = children.pop(backup_chain[-1][1].get("backup_id"), [])
+            if not following:
+                break
+            if len(following) > 1:
+                raise ValueError("多个备份基于同一个备份 (差异备份只需要提供最新的一个)")
+            backup_chain.append(following[0])
+        if children:
+            raise ValueError(f"缺少上一级备份: {', '.join(sorted(children))}")
+        return backup_chain
+
+    @staticmethod
+    def _open(archive: BinaryIO, password: Optional[str]) -> Archive:
+        """打开压缩包并读取清单"""
+        try:
+            if password:
+                import pyzipper
+
+                zip_file = pyzipper.AESZipFile(archive)
+                zip_file.setpassword(password.encode("utf-8"))
+            else:
+                zip_file = zipfile.ZipFile(archive)
+            names = set(zip_file.namelist())
+            if MANIFEST_NAME in names:
+                manifest = json.loads(ImportService._read(zip_file, MANIFEST_NAME))
+            elif METADATA_NAME in names:
+                manifest = ImportService._legacy_manifest(json.loads(ImportService._read(zip_file, METADATA_NAME)))
+            else:
+                raise ValueError("压缩包中没有 _manifest.json 或 _metadata.json")
+        except zipfile.BadZipFile:
+            raise ValueError("不是有效的 ZIP 压缩包")
+        if manifest.get("format", MANIFEST_FORMAT) > MANIFEST_FORMAT:
+            raise ValueError("不支持的备份清单版本")
+        return zip_file, manifest
+
+    @staticmethod
+    def _legacy_manifest(metadata: dict) -> dict:
+        """旧版压缩包: 视为完整备份，以路径作为文件标识"""
+        files = [
+            {**entry, "id": entry["path"], "archive_path": entry["path"].lstrip('/') or entry["name"]}
+            for entry in metadata.get("files", [])
+        ]
+        return {"backup_id": None, "mode": "full", "parent_id": None, "files": files, "versions": [], "deleted": []}
+
+    @staticmethod
+    def _read(zip_file: zipfile.ZipFile, name: str) -> str:
+        try:
+            return zip_file.read(name).decode("utf-8")
+        except KeyError:
+            raise ValueError(f"压缩包中缺少 {name}")
+        except (RuntimeError, NotImplementedError):
+            # 加密条目未提供密码或密码错误
+            raise ValueError("压缩包已加密，请提供正确的密码")
@@ -0,0 +1,77 @@
+"""
+回收站定期清理
+
+后台任务每隔 TRASH_PURGE_INTERVAL_SECONDS 永久删除移入回收站超过 TRASH_RETENTION_DAYS 天的文件:
+- 每批最多 TRASH_PURGE_BATCH_SIZE 个文件，以集合式 DELETE 删除版本与文件记录并单独提交，
+  不会长时间占用写锁阻塞保存；每批 (删除、回收分块、归还空闲页) 在线程中执行，不占用事件循环
+- 引用计数归零的分块按批回收 (Blob 在数据库提交后删除)
+- 数据库为增量自动清理模式 (auto_vacuum=INCREMENTAL) 时，每批之后把空闲页归还给文件系统
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.metrics import TRASH_PURGED
+from app.core.write_lock import WriteLockConnection
+from app.models import SessionLocal
+from .file_service import FileService
+
+logger = logging.getLogger(__name__)
+
+# 每批回收的分块数与归还的数据库页数
+GC_BATCH_SIZE = 1000
+VACUUM_PAGES_PER_STEP = 1000
+
+
+def _reclaim_space(db) -> None:
+    """归还一部分空闲页 (auto_vacuum 不是 INCREMENTAL 时不做任何事)"""
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    db.commit()
+    # 该 PRAGMA 每一步只释放一页，cursor.execute 只执行第一步；executescript 会执行到结束，
+    # 但不经过写锁游标，因此显式持有写锁，与其他写事务排队
+    connection = db.connection().connection.driver_connection
+    script = f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});"
+    if isinstance(connection, WriteLockConnection):
+        connection.executescript_locked(script)
+    else:
+        connection.executescript(script)
+
+
+def _purge_batch(deleted_before: datetime) -> int:
+    """永久删除一批过期文件，回收分块并归还空闲页，返回删除的文件数 (阻塞调用)"""
+    db = SessionLocal()
+    try:
+        file_service = FileService(db)
+        purged = file_service.purge_trash(deleted_before, settings.TRASH_PURGE_BATCH_SIZE)
+        while file_service.collect_garbage(GC_BATCH_SIZE) >= GC_BATCH_SIZE:
+            pass
+        _reclaim_space(db)
+        return purged
+    finally:
+        db.close()
+
+
+async def purge_expired_trash() -> int:
+    """执行一轮清理，返回永久删除的文件数"""
+    deleted_before = datetime.utcnow() - timedelta(days=settings.TRASH_RETENTION_DAYS)
+    total = 0
+    while True:
+        purged = await asyncio.to_thread(_purge_batch, deleted_before)
+        total += purged
+        TRASH_PURGED.inc(purged)
+        if purged < settings.TRASH_PURGE_BATCH_SIZE:
+            return total
+
+
+async def run_trash_purge() -> None:
+    """后台定期清理，失败时记录日志并在下一轮重试"""
+    while True:
+        try:
+            purged = await purge_expired_trash()
+            if purged:
+                logger.info("trash purge: permanently deleted %s files", purged)
+        except Exception:
+            logger.exception("回收站清理失败")
+        await asyncio.sleep(settings.TRASH_PURGE_INTERVAL_SECONDS)
@@ -0,0 +1,25 @@
+from typing import Optional
+from app.core.config import settings
+from .base import BlobStorage
+from .local import LocalBlobStorage
+
+# 可用的存储后端 ("database" 表示密文内联保存在 SQLite 中)
+BACKENDS = {
+    "local": lambda: LocalBlobStorage(settings.FILES_STORAGE_PATH),
+}
+
+_storage: Optional[BlobStorage] = None
+
+
+def get_blob_storage() -> Optional[BlobStorage]:
+    """获取配置的 Blob 存储后端，内联存储时返回 None"""
+    global _storage
+    if settings.STORAGE_BACKEND == "database":
+        return None
+    if _storage is None:
+        try:
+            factory = BACKENDS[settings.STORAGE_BACKEND]
+        except KeyError:
+            raise ValueError(f"未知的存储后端: {settings.STORAGE_BACKEND}")
+        _storage = factory()
+    return _storage
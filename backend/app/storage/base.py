@@ -0,0 +1,39 @@
+from typing import Iterator, Optional
+
+
+class BlobStorage:
+    """加密 Blob 存储后端接口 (内容寻址，写入后不可变)"""
+    
+    def put(self, key: str, data: bytes) -> None:
+        """写入 Blob (已存在时可以跳过)"""
+        raise NotImplementedError
+    
+    def get(self, key: str) -> bytes:
+        """读取 Blob，不存在时抛出 KeyError"""
+        raise NotImplementedError
+    
+    def read_into(self, key: str, buffer: memoryview) -> int:
+        """将 Blob 读入预分配的缓冲区，返回读取的字节数"""
+        data = self.get(key)
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def delete(self, key: str) -> None:
+        """删除 Blob (不存在时忽略)"""
+        raise NotImplementedError
+    
+    def exists(self, key: str) -> bool:
+        """Blob 是否存在"""
+        raise NotImplementedError
+    
+    def keys(self) -> Iterator[str]:
+        """遍历所有 Blob 的 key (用于清理孤立 Blob)"""
+        raise NotImplementedError
+    
+    def modified_at(self, key: str) -> float:
+        """Blob 最后一次写入的时间 (Unix 时间)，不存在时抛出 KeyError"""
+        raise NotImplementedError
+    
+    def local_path(self, key: str) -> Optional[str]:
+        """Blob 在本地文件系统中的路径 (支持时用于 sendfile/mmap)，否则为 None"""
+        return None
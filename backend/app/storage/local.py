@@ -0,0 +1,92 @@
+import os
+import tempfile
+from typing import Iterator, Optional
+from .base import BlobStorage
+
+
+class LocalBlobStorage(BlobStorage):
+    """本地文件系统存储，按 key 前缀分两级目录，原子重命名写入"""
+    
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+    
+    @staticmethod
+    def _valid_key(key: str) -> bool:
+        return len(key) >= 4 and key.isalnum()
+    
+    def _path(self, key: str) -> str:
+        if not self._valid_key(key):
+            raise ValueError(f"无效的 Blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+    
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        try:
+            # 已存在时更新修改时间: 清理孤立 Blob 时按修改时间跳过刚被重新引用的 Blob
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        
+        # 先写入同目录临时文件并落盘，再原子替换，避免读到半写入的 Blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+    
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+    
+    def read_into(self, key: str, buffer: memoryview) -> int:
+        try:
+            with open(self._path(key), "rb", buffering=0) as f:
+                total = 0
+                while total < len(buffer):
+                    n = f.readinto(buffer[total:])
+                    if not n:
+                        break
+                    total += n
+                return total
+        except FileNotFoundError:
+            raise KeyError(key)
+    
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+    
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+    
+    def keys(self) -> Iterator[str]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                # 跳过临时文件和不是 Blob 的文件 (如 .gitkeep)
+                if self._valid_key(name):
+                    yield name
+    
+    def modified_at(self, key: str) -> float:
+        try:
+            return os.path.getmtime(self._path(key))
+        except FileNotFoundError:
+            raise KeyError(key)
+    
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
@@ -0,0 +1 @@
+# Secure Editor Backend Benchmarks
@@ -0,0 +1,99 @@
+"""
+全部导出吞吐量基准
+
+创建 N 个文件后，对比逐个解密并写入内存 ZIP 的串行实现与并行流水线 (不同线程数)
+的耗时、吞吐量和 Python 堆峰值内存，并校验导出的压缩包。
+运行: python -m benchmarks.bench_export [--files 10000] [--size-kb 8] [--threads 1,2,4] [--output result.json]
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+import tracemalloc
+import zipfile
+
+from benchmarks.common import setup_environment, make_text, emit
+
+
+def measure(fn) -> dict:
+    """执行 fn 并返回耗时与 Python 堆峰值内存"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    output_bytes = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 3), "peak_bytes": peak, "output_bytes": output_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全部导出吞吐量基准")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--size-kb", type=float, default=8)
+    parser.add_argument("--threads", default=f"1,{os.cpu_count() or 1}", help="逗号分隔的线程数")
+    parser.add_argument("--storage", default="local", choices=["local", "database"])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    workdir = setup_environment(args.storage)
+    archive = os.path.join(workdir, "export.zip")
+    from app.core.config import settings
+    from app.core.crypto_pool import shutdown_executor
+    from app.models import SessionLocal, migrate
+    from app.services import ExportService, FileService
+
+    migrate()
+    db = SessionLocal()
+    file_service = FileService(db)
+    started = time.perf_counter()
+    for i in range(args.files):
+        file_service.create_file(f"f{i}.py", f"/bench/{i % 100}/f{i}.py", make_text(int(args.size_kb * 1024), seed=i), "python")
+    setup_seconds = time.perf_counter() - started
+    total_bytes = sum(f.content_size or 0 for f in file_service.list_files())
+
+    def serial():
+        # 改造前的实现: 逐个文件解密，在内存中构建整个压缩包
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for f in file_service.list_files():
+                zip_file.writestr(f.path.lstrip("/"), file_service.get_file_content(f).encode("utf-8"))
+        return buffer.tell()
+
+    def pipeline():
+        # 写入文件而不是内存，峰值内存只反映流水线本身
+        async def consume():
+            with open(archive, "wb") as output:
+                async for part in ExportService(db).export_all():
+                    output.write(part)
+                return output.tell()
+
+        return asyncio.run(consume())
+
+    results = {"serial": measure(serial)}
+    for threads in [int(t) for t in args.threads.split(",")]:
+        shutdown_executor()
+        settings.CRYPTO_THREADS = threads
+        results[f"pipeline_{threads}"] = measure(pipeline)
+        with zipfile.ZipFile(archive) as zip_file:
+            assert len(zip_file.namelist()) == args.files + 2  # 含 _metadata.json 与 _manifest.json
+            assert zip_file.testzip() is None
+    for result in results.values():
+        result["files_per_second"] = round(args.files / result["seconds"], 1)
+        result["mb_per_second"] = round(total_bytes / result["seconds"] / 1024 / 1024, 2)
+
+    db.close()
+    emit({
+        "benchmark": "export",
+        "storage": args.storage,
+        "files": args.files,
+        "total_bytes": total_bytes,
+        "cpu_count": os.cpu_count(),
+        "setup_seconds": round(setup_seconds, 1),
+        **results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+大文件读取峰值内存基准 (tracemalloc)
+
+对比整体解密后序列化 FileResponse 的路径与流式 JSON 路径的峰值内存。
+运行: python -m benchmarks.bench_read_memory [--size-mb 20] [--output result.json]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks.common import setup_environment, make_text, emit
+
+
+def measure(fn) -> dict:
+    """执行 fn 并返回耗时与 Python 堆峰值内存"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "peak_bytes": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大文件读取峰值内存基准")
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--storage", default="local", choices=["local", "database"])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    setup_environment(args.storage)
+    from app.models import SessionLocal, migrate
+    from app.schemas import FileResponse
+    from app.services import FileService
+    from app.api.files import stream_file_response
+
+    migrate()
+    db = SessionLocal()
+    file_service = FileService(db)
+    content = make_text(int(args.size_mb * 1024 * 1024))
+    file_id = file_service.create_file("big.py", "/big.py", content, "python").id
+    file_size = len(content.encode("utf-8"))
+    del content
+
+    def buffered():
+        file = file_service.get_file(file_id)
+        body = FileResponse(
+            id=file.id,
+            name=file.name,
+            path=file.path,
+            content=file_service.get_file_content(file),
+            language=file.language,
+            encoding=file.encoding,
+            is_deleted=file.is_deleted,
+            created_at=file.created_at,
+            updated_at=file.updated_at
+        ).model_dump_json()
+        assert len(body) > file_size // 2
+
+    def streaming():
+        file = file_service.get_file(file_id)
+        response = stream_file_response(file_service, file)
+
+        async def consume():
+            total = 0
+            async for part in response.body_iterator:
+                total += len(part)
+            return total
+
+        assert asyncio.run(consume()) > file_size
+
+    results = {"buffered": measure(buffered), "streaming": measure(streaming)}
+    for result in results.values():
+        result["peak_vs_file_size"] = round(result["peak_bytes"] / file_size, 2)
+
+    db.close()
+    emit({"benchmark": "read_memory", "storage": args.storage, "file_size": file_size, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
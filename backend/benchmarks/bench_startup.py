@@ -0,0 +1,97 @@
+"""
+冷启动时间基准
+
+在独立子进程中测量:
+- import app.main 的耗时，以及 -X importtime 统计的最慢模块
+- 执行 lifespan 启动 (结构迁移、后台任务) 直到可以处理请求的总耗时
+
+运行: python -m benchmarks.bench_startup [--runs 5] [--output result.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import BACKEND_DIR, setup_environment, emit
+
+_COLD_START = """
+import asyncio, json, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def startup():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({"import_s": imported - started, "ready_s": ready - started}))
+"""
+
+
+def cold_start(runs: int) -> dict:
+    """多次冷启动，返回导入与就绪耗时的中位数"""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _COLD_START],
+            cwd=BACKEND_DIR, env=os.environ.copy(),
+            capture_output=True, text=True, timeout=120, check=True,
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    def median(key):
+        values = sorted(sample[key] for sample in samples)
+        return round(values[len(values) // 2] * 1000, 1)
+
+    return {"runs": runs, "import_ms": median("import_s"), "ready_ms": median("ready_s")}
+
+
+def import_profile(top: int = 15) -> dict:
+    """解析 -X importtime 输出，返回总耗时和累计耗时最多的顶层依赖"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+        capture_output=True, text=True, timeout=120, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|").split("|")]
+        # 输出按完成顺序排列，app 包之前的是解释器启动 (site) 阶段的导入
+        if name == "app":
+            modules = []
+        modules.append((name, int(self_us), int(cumulative_us)))
+
+    total = next((cumulative for name, _, cumulative in modules if name == "app.main"), 0)
+    # 只列出 app.main 直接或间接导入的第三方/应用顶层包
+    top_level = {}
+    for name, _, cumulative in modules:
+        root = name.split(".")[0]
+        if "." not in name and root != "app":
+            top_level[root] = max(top_level.get(root, 0), cumulative)
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": round(total / 1000, 1),
+        "slowest_packages_ms": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+
+def measure(runs: int = 5) -> dict:
+    return {**cold_start(runs), "importtime": import_profile()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动时间基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    setup_environment()
+    emit({"benchmark": "startup", **measure(args.runs)}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+基准测试公共工具
+
+必须在导入 app 之前调用 setup_environment()，使数据库和 Blob 存储
+指向独立的临时目录，避免影响开发数据。
+"""
+import json
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_environment(storage_backend: str = "local") -> str:
+    """创建临时数据目录并配置环境变量，返回目录路径"""
+    workdir = tempfile.mkdtemp(prefix="texton-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/data/secure_editor.db"
+    os.environ["FILES_STORAGE_PATH"] = f"{workdir}/data/files"
+    os.environ["STORAGE_BACKEND"] = storage_backend
+    os.environ["RATE_LIMIT_STORAGE"] = f"{workdir}/data/ratelimit.db"
+    os.environ.setdefault("ENVIRONMENT", "development")
+    # 登录与解锁会被反复调用，默认不限流
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return workdir
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    """生成指定字节数左右的类代码文本 (含多字节字符)"""
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        line = f"def func_{seed}_{i}(x):  # 注释 {i}\n    return x * {i} + {seed}\n"
+        lines.append(line)
+        total += len(line.encode("utf-8"))
+        i += 1
+    return "".join(lines)
+
+
+def emit(result: dict, output: str = None) -> None:
+    """输出 JSON 结果 (写入文件或标准输出)"""
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
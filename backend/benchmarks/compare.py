@@ -0,0 +1,49 @@
+"""
+对比两次基准测试结果
+
+运行: python -m benchmarks.compare base.json new.json [--threshold 10]
+延迟或峰值内存增长超过阈值 (百分比) 的场景标记为回退，存在回退时退出码为 1。
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "peak_bytes", "import_ms", "ready_ms")
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="判定回退的增长百分比")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    print(f"base: {base['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+    print(f"{'scenario':<20}{'metric':<12}{'base':>14}{'new':>14}{'change':>10}")
+
+    regressions = 0
+    for name, result in new["results"].items():
+        previous = base["results"].get(name)
+        if not previous:
+            continue
+        for metric in METRICS:
+            if metric not in result or not previous.get(metric):
+                continue
+            change = (result[metric] - previous[metric]) / previous[metric] * 100
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{name:<20}{metric:<12}{previous[metric]:>14}{result[metric]:>14}{change:>9.1f}%{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+多设备编辑会话负载生成器
+
+回放接近真实使用的会话: 打开文件、按输入节奏自动保存、偶尔创建快照、
+浏览历史版本、锁屏后通过 /auth/verify-totp 解锁。按并发会话数逐级加压，
+报告吞吐量、尾延迟以及 SQLite 锁等待错误。
+
+默认在临时目录中启动独立的 uvicorn 进程 (真实 HTTP 服务)，也可以用 --url
+指向已运行的实例 (需提供已启用 2FA 的账户)。
+
+--workers 可以是逗号分隔的列表 (如 1,2,4)，依次以不同 worker 数启动服务，比较吞吐量
+与 worker 数的关系。
+
+运行: python -m benchmarks.loadgen [--levels 1,5,10,25,50] [--duration 30] [--workers 1,2,4]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.common import BACKEND_DIR, setup_environment, make_text, emit
+from benchmarks.run import summarize
+
+LOCK_ERROR = re.compile(rb"database is locked|database table is locked")
+
+
+class ServerProcess:
+    """在临时数据目录中运行的 uvicorn 子进程，统计日志中的锁错误"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.port = self._free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.lock_errors = 0
+        self.process = None
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=os.environ.copy(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        threading.Thread(target=self._read_log, daemon=True).start()
+
+    def _read_log(self):
+        for line in self.process.stderr:
+            if LOCK_ERROR.search(line):
+                self.lock_errors += 1
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_5xx = 0
+
+    def record(self, op: str, elapsed: float, status_code: int):
+        if status_code >= 400:
+            self.errors[op] += 1
+            if status_code >= 500:
+                self.status_5xx += 1
+        else:
+            self.latencies[op].append(elapsed)
+
+
+async def request(client, stats: LoadStats, op: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except Exception:
+        stats.errors[op] += 1
+        return None
+    stats.record(op, time.perf_counter() - started, response.status_code)
+    return response
+
+
+async def session(client, args, stats: LoadStats, file_id: int, totp, deadline: float):
+    """单个编辑会话"""
+    rng = random.Random()
+    response = await request(client, stats, "open", "GET", f"/api/files/{file_id}")
+    content = response.json()["content"] if response is not None and response.status_code == 200 else ""
+
+    saves = 0
+    while time.monotonic() < deadline:
+        # 输入节奏: 保存间隔带随机抖动
+        await asyncio.sleep(args.save_interval * rng.uniform(0.5, 1.5))
+        content += "".join(rng.choice("abcdefghij \n") for _ in range(rng.randint(5, 40)))
+        saves += 1
+        await request(client, stats, "autosave", "POST", f"/api/files/{file_id}/save", json={
+            "content": content,
+            "create_snapshot": saves % args.snapshot_every == 0,
+        })
+
+        roll = rng.random()
+        if roll < args.history_probability:
+            await request(client, stats, "history", "GET", f"/api/history/{file_id}/versions")
+        elif roll < args.history_probability + args.unlock_probability:
+            await request(client, stats, "unlock", "POST", "/api/auth/verify-totp",
+                          json={"totp_code": totp.now()})
+
+
+async def setup_account(client, username: str, password: str, secret: str = None):
+    """注册账户并启用 2FA，返回 (TOTP, access_token)"""
+    import pyotp
+
+    if secret is None:
+        await client.post("/api/auth/register", json={"username": username, "password": password})
+        response = await client.post("/api/auth/setup-2fa", json={"username": username, "password": password})
+        response.raise_for_status()
+        secret = response.json()["secret"]
+        totp = pyotp.TOTP(secret)
+        response = await client.post("/api/auth/verify-2fa", json={
+            "username": username, "password": password, "totp_code": totp.now()
+        })
+    else:
+        totp = pyotp.TOTP(secret)
+        response = await client.post("/api/auth/login", json={
+            "username": username, "password": password, "totp_code": totp.now()
+        })
+    response.raise_for_status()
+    return totp, response.json()["access_token"]
+
+
+async def run_level(client, args, concurrency: int, totp, server):
+    """以指定并发数运行一轮会话"""
+    # 每两个会话共享一个文件，模拟多设备编辑同一文件
+    file_ids = []
+    for i in range(max(1, concurrency // 2)):
+        response = await client.post("/api/files", json={
+            "name": f"load_{concurrency}_{i}.md",
+            "path": f"/load/{concurrency}/load_{i}.md",
+            "content": make_text(args.file_size, seed=i),
+            "language": "markdown",
+        })
+        response.raise_for_status()
+        file_ids.append(response.json()["id"])
+
+    stats = LoadStats()
+    lock_errors_before = server.lock_errors if server else 0
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*[
+        session(client, args, stats, file_ids[i % len(file_ids)], totp, deadline)
+        for i in range(concurrency)
+    ])
+    elapsed = time.monotonic() - started
+
+    total = sum(len(v) for v in stats.latencies.values())
+    all_latencies = [x for values in stats.latencies.values() for x in values]
+    result = {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "errors": dict(stats.errors),
+        "status_5xx": stats.status_5xx,
+        "lock_errors": (server.lock_errors - lock_errors_before) if server else None,
+        "latency": summarize(all_latencies),
+        "operations": {op: summarize(values) for op, values in stats.latencies.items()},
+    }
+    print(f"  c={concurrency}: {result['throughput_rps']} req/s, "
+          f"p99={result['latency']['p99_ms']}ms, 5xx={stats.status_5xx}, lock_errors={result['lock_errors']}")
+    return result
+
+
+async def main_async(args, server):
+    import httpx
+
+    base_url = args.url or server.url
+    limits = httpx.Limits(max_connections=max(args.levels) * 2, max_keepalive_connections=max(args.levels) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        for _ in range(100):
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+
+        totp, access_token = await setup_account(client, args.username, args.password, args.totp_secret)
+        client.headers["Authorization"] = f"Bearer {access_token}"
+
+        results = []
+        for concurrency in args.levels:
+            results.append(await run_level(client, args, concurrency, totp, server))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多设备编辑会话负载生成器")
+    parser.add_argument("--url", default=None, help="已运行实例的地址 (默认启动临时 uvicorn)")
+    parser.add_argument("--workers", default="1", help="临时 uvicorn 的 worker 数，逗号分隔时依次测试")
+    parser.add_argument("--levels", default="1,5,10,25,50", help="逗号分隔的并发会话数")
+    parser.add_argument("--duration", type=float, default=30, help="每级持续秒数")
+    parser.add_argument("--save-interval", type=float, default=1.0, help="平均自动保存间隔 (秒)")
+    parser.add_argument("--snapshot-every", type=int, default=20, help="每 N 次保存强制创建快照")
+    parser.add_argument("--history-probability", type=float, default=0.05)
+    parser.add_argument("--unlock-probability", type=float, default=0.01)
+    parser.add_argument("--file-size", type=int, default=8 * 1024, help="初始文件大小 (字节)")
+    parser.add_argument("--username", default="loadgen")
+    parser.add_argument("--password", default="loadgen-password")
+    parser.add_argument("--totp-secret", default=None, help="--url 模式下已有账户的 TOTP 密钥")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(",")]
+
+    if args.url:
+        runs = [{"target": args.url, "levels": asyncio.run(main_async(args, None))}]
+    else:
+        runs = []
+        for workers in [int(w) for w in args.workers.split(",")]:
+            print(f"uvicorn --workers {workers}")
+            # 每次使用新的临时数据目录
+            setup_environment()
+            server = ServerProcess(workers)
+            server.start()
+            try:
+                runs.append({"workers": workers, "levels": asyncio.run(main_async(args, server))})
+            finally:
+                server.stop()
+
+    emit({
+        "benchmark": "loadgen",
+        "save_interval_s": args.save_interval,
+        "runs": runs,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
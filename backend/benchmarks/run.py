@@ -0,0 +1,286 @@
+"""
+后端热点路径基准测试
+
+通过 httpx ASGITransport 在进程内驱动 FastAPI 应用，数据库为临时目录中
+新建的 SQLite，结果以 JSON 输出 (p50/p95/p99 延迟与 tracemalloc 峰值内存)，
+可用 benchmarks.compare 对比两次提交的结果。
+
+运行: python -m benchmarks.run [--quick] [--only autosave,list] [--output result.json]
+"""
+import argparse
+import asyncio
+import math
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.common import setup_environment, make_text, emit
+
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, peak_bytes: int = None, **extra) -> dict:
+    """汇总延迟样本 (毫秒)"""
+    values = sorted(s * 1000 for s in samples)
+    result = {
+        "n": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+    if peak_bytes is not None:
+        result["peak_bytes"] = peak_bytes
+    result.update(extra)
+    return result
+
+
+class Bench:
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.results = {}
+
+    async def timed(self, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+        return elapsed, response
+
+    async def run_scenario(self, name: str, iterations: int, fn, **extra):
+        """执行 iterations 次 fn 统计延迟，再额外执行一次测量峰值内存"""
+        samples = []
+        for i in range(iterations):
+            elapsed, _ = await fn(i)
+            samples.append(elapsed)
+
+        peak = None
+        if self.args.memory:
+            tracemalloc.start()
+            await fn(iterations)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.results[name] = summarize(samples, peak, **extra)
+        print(f"  {name}: p50={self.results[name]['p50_ms']}ms p95={self.results[name]['p95_ms']}ms")
+
+    async def create_file(self, name: str, content: str) -> int:
+        _, response = await self.timed("POST", "/api/files", json={
+            "name": name, "path": f"/bench/{name}", "content": content, "language": "python"
+        })
+        return response.json()["id"]
+
+    async def setup_account(self):
+        """创建启用 2FA 的账户，后续请求携带其访问令牌"""
+        import pyotp
+        from app.models import SessionLocal
+        from app.services import AuthService
+
+        db = SessionLocal()
+        auth_service = AuthService(db)
+        user = await auth_service.create_user(USERNAME, PASSWORD)
+        secret, _ = await auth_service.setup_2fa(user.id)
+        auth_service.enable_2fa(user.id, pyotp.TOTP(secret).now())
+        tokens = auth_service.issue_tokens(user)
+        db.close()
+
+        self.totp = pyotp.TOTP(secret)
+        self.client.headers["Authorization"] = f"Bearer {tokens['access_token']}"
+
+    # ---- 场景 ----
+
+    async def bench_login(self):
+        async def login(i):
+            return await self.timed("POST", "/api/auth/login", json={
+                "username": USERNAME, "password": PASSWORD, "totp_code": self.totp.now()
+            })
+
+        await self.run_scenario("login", self.args.login_iterations, login)
+
+    async def bench_autosave(self):
+        for label, size in (("1KB", 1024), ("100KB", 100 * 1024), ("5MB", 5 * 1024 * 1024)):
+            base = make_text(size)
+            file_id = await self.create_file(f"autosave_{label}.py", base)
+            iterations = self.args.autosave_iterations if size < 1024 * 1024 else max(5, self.args.autosave_iterations // 5)
+
+            async def save(i, base=base, file_id=file_id):
+                # 模拟连续输入: 每次在中间位置追加几个字符
+                middle = len(base) // 2
+                content = base[:middle] + ("x" * (i + 1)) + base[middle:]
+                return await self.timed("POST", f"/api/files/{file_id}/save", json={"content": content})
+
+            await self.run_scenario(f"autosave_{label}", iterations, save, file_size=size)
+
+    async def bench_history(self):
+        base = make_text(20 * 1024, seed=1)
+        file_id = await self.create_file("history.py", base)
+        for i in range(self.args.versions):
+            await self.client.post(f"/api/files/{file_id}/save", json={
+                "content": base + f"# rev {i}\n", "create_snapshot": True
+            })
+
+        async def list_versions(i):
+            return await self.timed("GET", f"/api/history/{file_id}/versions")
+
+        await self.run_scenario("history_list", self.args.iterations, list_versions, versions=self.args.versions + 1)
+
+        _, response = await self.timed("GET", f"/api/history/{file_id}/versions")
+        version_ids = [v["id"] for v in response.json()]
+
+        async def restore(i):
+            version_id = version_ids[(i * 7) % len(version_ids)]
+            return await self.timed("POST", f"/api/history/{file_id}/restore", json={"version_id": version_id})
+
+        await self.run_scenario("history_restore", self.args.iterations, restore)
+
+    async def bench_export_import(self):
+        for i in range(self.args.export_files):
+            await self.client.post("/api/files", json={
+                "name": f"export_{i}.py", "path": f"/export/export_{i}.py",
+                "content": make_text(2048, seed=i), "language": "python"
+            })
+
+        async def export_all(i):
+            return await self.timed("GET", "/api/files/export-all")
+
+        await self.run_scenario("export_all", max(3, self.args.iterations // 10), export_all,
+                                files=self.args.export_files)
+
+        async def import_files(i):
+            payload = {"files": [
+                {"name": f"import_{i}_{j}.py", "path": f"/import/{i}/import_{j}.py",
+                 "content": make_text(2048, seed=j), "language": "python"}
+                for j in range(self.args.import_files)
+            ]}
+            return await self.timed("POST", "/api/files/import", json=payload)
+
+        await self.run_scenario("import", max(3, self.args.iterations // 10), import_files,
+                                files=self.args.import_files)
+
+    async def bench_list(self):
+        from sqlalchemy import insert
+        from app.models import SessionLocal, File
+
+        db = SessionLocal()
+        existing = db.query(File).count()
+        for target in self.args.list_sizes:
+            # 列表只涉及元数据，直接批量插入空内容的文件记录
+            missing = target - existing
+            for start in range(0, max(0, missing), 5000):
+                rows = [
+                    {"name": f"list_{existing + start + j}.md",
+                     "path": f"/list/{(existing + start + j) % 100}/list_{existing + start + j}.md",
+                     "language": "markdown", "content_chunks": "[]", "content_size": 0,
+                     "sort_order": 0, "is_deleted": False}
+                    for j in range(min(5000, missing - start))
+                ]
+                db.execute(insert(File), rows)
+                db.commit()
+            existing = max(existing, target)
+
+            async def list_files(i):
+                return await self.timed("GET", "/api/files")
+
+            await self.run_scenario(f"list_{target}", max(3, self.args.iterations // 5), list_files,
+                                    files=existing)
+        db.close()
+
+    async def bench_startup(self):
+        from benchmarks.bench_startup import measure
+
+        # 冷启动在独立子进程中测量，避免受当前进程已导入模块的影响
+        result = await asyncio.to_thread(measure, self.args.startup_runs)
+        self.results["startup"] = result
+        print(f"  startup: import={result['import_ms']}ms ready={result['ready_ms']}ms")
+
+
+SCENARIOS = ("startup", "login", "autosave", "history", "export_import", "list")
+
+
+def git_commit() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return result.stdout.strip()
+    except Exception:
+        return ""
+
+
+async def main_async(args):
+    import httpx
+    from app.main import app
+    from app.models import migrate
+
+    migrate()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        bench = Bench(client, args)
+        await bench.setup_account()
+        for name in args.only:
+            print(f">>> {name}")
+            await getattr(bench, f"bench_{name}")()
+    return bench.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端热点路径基准测试")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，用于快速验证")
+    parser.add_argument("--only", default=",".join(SCENARIOS), help=f"逗号分隔的场景: {','.join(SCENARIOS)}")
+    parser.add_argument("--storage", default="local", choices=["local", "database"])
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="不测量峰值内存")
+    parser.add_argument("--output", default=None, help="结果 JSON 输出文件")
+    args = parser.parse_args()
+
+    args.only = [name.strip() for name in args.only.split(",") if name.strip()]
+    for name in args.only:
+        if name not in SCENARIOS:
+            parser.error(f"未知场景: {name}")
+
+    if args.quick:
+        args.iterations, args.autosave_iterations, args.login_iterations = 20, 20, 5
+        args.versions, args.export_files, args.import_files = 20, 100, 50
+        args.list_sizes = [1000, 10000]
+        args.startup_runs = 3
+    else:
+        args.iterations, args.autosave_iterations, args.login_iterations = 100, 100, 20
+        args.versions, args.export_files, args.import_files = 200, 1000, 200
+        args.list_sizes = [1000, 10000, 100000]
+        args.startup_runs = 7
+
+    workdir = setup_environment(args.storage)
+    results = asyncio.run(main_async(args))
+
+    emit({
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": args.storage,
+            "quick": args.quick,
+            "workdir": workdir,
+        },
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,7 @@ import {
 import { Button } from '@/components/ui/button'
 import { useEditorStore, SaveStatus } from '@/stores/editorStore'
 import { useAuthStore } from '@/stores/authStore'
-import { filesApi } from '@/services/api'
+import { authApi, filesApi } from '@/services/api'
 import { cn } from '@/lib/utils'
 import { useState, useEffect } from 'react'
 import { AnimatePresence } from 'framer-motion'
@@ -68,6 +68,16 @@ export function Header() {
     }
   }, [showFileMenu])
 
+  const handleLogout = async () => {
+    // 服务端使已签发的令牌失效，失败时仍退出本地登录
+    try {
+      await authApi.logout()
+    } catch (error) {
+      console.error('Failed to logout:', error)
+    }
+    logout()
+  }
+
   const handleExport = async () => {
     if (!currentFile) return
     try {
@@ -176,7 +186,7 @@ export function Header() {
           <Settings className="h-4 w-4" />
         </Button>
         {!isMobile && (
-          <Button variant="ghost" size="icon" onClick={logout} title="退出">
+          <Button variant="ghost" size="icon" onClick={handleLogout} title="退出">
             <LogOut className="h-4 w-4" />
           </Button>
         )}
@@ -64,6 +64,26 @@ interface UpdateInfo {
   updateLog?: string
 }
 
+// 更新脚本重启服务期间请求无法到达后端: 连接失败，或反向代理返回 502/503/504
+function isConnectionError(error: any) {
+  const status = error?.response?.status
+  return !error?.response || status === 502 || status === 503 || status === 504
+}
+
+// 等待服务恢复 (最多 2 分钟)，返回是否恢复
+async function waitForService() {
+  for (let i = 0; i < 60; i++) {
+    await new Promise(resolve => setTimeout(resolve, 2000))
+    try {
+      await systemApi.health()
+      return true
+    } catch {
+      // 服务尚未恢复
+    }
+  }
+  return false
+}
+
 interface ToastInfo {
   visible: boolean
   type: 'success' | 'error' | 'info'
@@ -144,11 +164,31 @@ export function Sidebar() {
     setTimeout(() => setToast(prev => ({ ...prev, visible: false })), 3000)
   }
   
+  // 增量同步: 本地保存文件映射，只拉取上次同步之后的变更
+  const changeSeq = useRef(0)
+  const fileMap = useRef(new Map<number, FileItem>())
+
   const loadFiles = async () => {
     setLoading(true)
     try {
-      const response = await filesApi.list()
-      setFiles(response.data)
+      let hasMore = true
+      while (hasMore) {
+        const { data } = await filesApi.changes(changeSeq.current)
+        if (data.reset) fileMap.current.clear()
+        for (const change of data.changes) {
+          if (change.file && !change.file.is_deleted) {
+            fileMap.current.set(change.file_id, change.file)
+          } else {
+            fileMap.current.delete(change.file_id)
+          }
+        }
+        changeSeq.current = data.seq
+        hasMore = data.has_more
+      }
+      // 与 GET /files 的排序一致: sort_order, name
+      setFiles([...fileMap.current.values()].sort((a, b) =>
+        (a.sort_order ?? 0) - (b.sort_order ?? 0) || (a.name < b.name ? -1 : a.name > b.name ? 1 : 0)
+      ))
     } catch (error) {
       console.error('Failed to load files:', error)
     } finally {
@@ -170,6 +210,15 @@ export function Sidebar() {
     loadVersion()
   }, [])
 
+  // 切回页面时同步其他设备上的修改
+  useEffect(() => {
+    const handleVisibilityChange = () => {
+      if (document.visibilityState === 'visible') loadFiles()
+    }
+    document.addEventListener('visibilitychange', handleVisibilityChange)
+    return () => document.removeEventListener('visibilitychange', handleVisibilityChange)
+  }, [])
+
   // 关闭右键菜单
   useEffect(() => {
     const handleClick = () => setContextMenu(prev => ({ ...prev, visible: false }))
@@ -298,6 +347,13 @@ export function Sidebar() {
         return
       }
       
+      // 服务启动后的首次检查尚未完成
+      if (data.pending) {
+        showToast('info', data.message || '正在检查更新，请稍后再试')
+        setUpdateInfo({ hasUpdate: false, checking: false, updating: false, showModal: false })
+        return
+      }
+      
       // 没有更新时直接提示
       if (!data.has_update) {
         showToast('success', '已是最新版本')
@@ -328,47 +384,64 @@ export function Sidebar() {
   const handlePerformUpdate = async () => {
     setUpdateInfo(prev => ({ ...prev, updating: true, updateLog: '正在更新...\n' }))
     
-    try {
-      const response = await systemApi.performUpdate()
-      const output = response.data.output || ''
-      
-      if (response.data.success) {
-        setUpdateInfo(prev => ({ 
-          ...prev, 
-          updating: false,
-          updateLog: output + '\n\n✅ 更新完成！页面将在 3 秒后刷新...'
-        }))
+    const finish = (updateLog: string, reload: boolean) => {
+      setUpdateInfo(prev => ({ ...prev, updating: false, updateLog }))
+      if (reload) {
         setTimeout(() => {
           window.location.reload()
         }, 3000)
-      } else {
-        // 检查是否实际上更新成功了（git pull 输出包含更新信息）
-        const isActuallySuccess = output.includes('->') || output.includes('Already up to date')
+      }
+    }
+    
+    try {
+      const response = await systemApi.performUpdate()
+      if (!response.data.success) {
+        finish('❌ 更新失败:\n' + (response.data.message || '未知错误'), false)
+        return
+      }
+      
+      // 更新在后台执行，轮询任务日志 (任务状态保存在服务器上，重启后仍可查询)
+      let job = response.data.job
+      let output = ''
+      let offset = 0
+      let restarted = false
+      while (true) {
+        try {
+          job = (await systemApi.getUpdateJob(job.id, offset)).data
+        } catch (error: any) {
+          if (!isConnectionError(error)) {
+            finish(output + '\n❌ 无法获取更新进度: ' + (error.response?.data?.detail || error.message), false)
+            return
+          }
+          // 更新脚本最后会重启服务，等待服务恢复后继续查询任务状态
+          if (!(await waitForService())) {
+            finish(output + '\n❌ 服务未能恢复，请检查服务器状态', false)
+            return
+          }
+          restarted = true
+          continue
+        }
         
-        if (isActuallySuccess) {
-          setUpdateInfo(prev => ({ 
-            ...prev, 
-            updating: false,
-            updateLog: output + '\n\n✅ 更新完成！页面将在 3 秒后刷新...'
-          }))
-          setTimeout(() => {
-            window.location.reload()
-          }, 3000)
-        } else {
-          setUpdateInfo(prev => ({ 
-            ...prev, 
-            updating: false,
-            updateLog: '❌ 更新失败:\n' + (response.data.error || response.data.message || '未知错误')
-          }))
+        if (job.log.length) {
+          output += job.log.join('\n') + '\n'
+          setUpdateInfo(prev => ({ ...prev, updateLog: output }))
         }
+        offset = job.offset
+        if (job.status !== 'running') break
+        await new Promise(resolve => setTimeout(resolve, 1000))
       }
-    } catch (error) {
+      
+      if (job.status === 'succeeded') {
+        finish(output + '\n\n✅ ' + (job.message || '更新完成！') + ' 页面将在 3 秒后刷新...', true)
+      } else if (restarted && job.status === 'interrupted') {
+        // 运行任务的进程随服务重启退出，重启是更新脚本的最后一步
+        finish(output + '\n\n✅ 服务已重启！页面将在 3 秒后刷新...', true)
+      } else {
+        finish(output + '\n❌ 更新失败: ' + (job.message || '未知错误'), false)
+      }
+    } catch (error: any) {
       console.error('Failed to perform update:', error)
-      setUpdateInfo(prev => ({ 
-        ...prev, 
-        updating: false,
-        updateLog: '❌ 更新失败，请手动更新'
-      }))
+      finish('❌ 更新失败: ' + (error.response?.data?.detail || '请手动更新'), false)
     }
   }
 
@@ -68,6 +68,11 @@ export const authApi = {
   
   refresh: (refreshToken: string) =>
     api.post('/auth/refresh', { refresh_token: refreshToken }),
+  
+  logout: () => api.post('/auth/logout'),
+  
+  changePassword: (oldPassword: string, newPassword: string) =>
+    api.post('/auth/change-password', { old_password: oldPassword, new_password: newPassword }),
 }
 
 // Files API
@@ -78,9 +83,17 @@ export const filesApi = {
   listTrash: () =>
     api.get('/files/trash'),
   
+  // 增量同步: seq 大于 since 的文件变更 (since=0 返回全部文件)
+  changes: (since: number) =>
+    api.get('/files/changes', { params: { since } }),
+  
   get: (id: number) =>
     api.get(`/files/${id}`),
   
+  // 一次取回多个文件的内容 (恢复多个标签页)，返回 { files, missing }
+  batchGet: (fileIds: number[]) =>
+    api.post('/files/batch-get', { file_ids: fileIds }),
+  
   create: (data: { name: string; path: string; content?: string; language?: string }) =>
     api.post('/files', data),
   
@@ -96,6 +109,23 @@ export const filesApi = {
   restore: (id: number) =>
     api.post(`/files/${id}/restore`),
   
+  // 文件夹 (虚拟路径前缀): 子文件夹及其文件数与大小、直接位于其下的文件
+  listFolder: (path = '/') =>
+    api.get('/files/folders', { params: { path } }),
+  
+  moveFolder: (fromPath: string, toPath: string) =>
+    api.post('/files/folders/move', { from_path: fromPath, to_path: toPath }),
+  
+  // 批量操作: 在一个事务中执行，逐项返回结果
+  batch: (operations: Array<{
+    op: 'delete' | 'restore' | 'purge' | 'move' | 'set_language'
+    file_id: number
+    name?: string
+    path?: string
+    language?: string
+  }>) =>
+    api.post('/files/batch', { operations }),
+  
   reorder: (fileIds: number[]) =>
     api.post('/files/reorder', { file_ids: fileIds }),
   
@@ -105,14 +135,33 @@ export const filesApi = {
   export: (id: number) =>
     api.get(`/files/${id}/export`, { responseType: 'blob' }),
   
-  exportAll: (password?: string) =>
+  // 备份导出: full 全部文件；incremental / differential 只含基准备份之后的变更 (响应头 X-Backup-Id)
+  exportAll: (password?: string, options?: {
+    mode?: 'full' | 'incremental' | 'differential'
+    since_seq?: number
+    since?: string
+    base?: string
+    name?: string
+    include_versions?: boolean
+  }) =>
     api.get('/files/export-all', { 
       responseType: 'blob',
-      params: password ? { password } : undefined
+      params: { ...options, ...(password ? { password } : {}) }
     }),
   
+  backups: (limit = 100) =>
+    api.get('/files/backups', { params: { limit } }),
+  
   import: (data: { files: Array<{ name: string; path: string; content: string; language?: string }> }) =>
     api.post('/files/import', data),
+  
+  // 导入导出的压缩包，可一次上传一条备份链 (完整备份 + 增量 / 差异备份)
+  importArchives: (archives: File[], password?: string) => {
+    const form = new FormData()
+    archives.forEach(archive => form.append('archives', archive))
+    if (password) form.append('password', password)
+    return api.post('/files/import-archive', form)
+  },
 }
 
 // History API
@@ -137,5 +186,8 @@ export const systemApi = {
   
   performUpdate: () => api.post('/update'),
   
+  getUpdateJob: (jobId: string, offset: number) =>
+    api.get(`/update/jobs/${jobId}`, { params: { offset } }),
+  
   verifyTotp: (totpCode: string) => api.post('/auth/verify-totp', { totp_code: totpCode }),
 }
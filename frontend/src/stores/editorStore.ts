@@ -6,6 +6,7 @@ export interface FileItem {
   path: string
   language: string
   is_deleted: boolean
+  sort_order?: number
   updated_at: string
 }
 
@@ -23,7 +23,7 @@ pip install -r requirements.txt -q
 
 # 3. 更新数据库结构
 echo ">>> 更新数据库..."
-python3 -c "from app.models import Base, engine; Base.metadata.create_all(bind=engine)"
+python3 -m app.migrate
 
 # 4. 更新前端依赖并构建
 echo ">>> 构建前端..."